@@ -1,11 +1,20 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, session
 import os
 import pandas as pd
 from werkzeug.utils import secure_filename
 from services.file_handler import FileHandler
 from services.graph_updater import GraphUpdater
-from core.core_data_engine import CoreDataEngine
+from services.profile_cache import ProfileCache
+from services.table_store import TableStore
+from services.job_manager import JobManager
+from services.chunked_upload import ChunkedUploadManager, UploadOffsetMismatch
+from services.table_cache import TableCache
+from services.workspace import WorkspaceManager
+from core.core_data_engine import CoreDataEngine, PROFILER_VERSION
+from core.value_normalizer import ValueNormalizer
+from core.integrity_report import IntegrityChecker
 from utils.graph_utils import GraphUtils
+from utils.metrics import metrics
 import json
 
 app = Flask(__name__)
@@ -13,23 +22,110 @@ app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['NORMALIZE_VALUES'] = False  # match "1001" with 1001, " PRD-01" with "prd-01"
+app.config['TABLE_CACHE_BYTES'] = 512 * 1024 * 1024  # parsed tables kept in memory, shared by all sessions
+app.config['WORKSPACE_TTL'] = 4 * 3600  # idle seconds before a session's workspace and uploads are deleted
 
 # Ensure upload and output directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
+def _delete_workspace_files(workspace_id, filenames):
+    """WorkspaceManager.on_delete: drop an expired workspace's uploads"""
+    chunked_uploads.discard_owner(workspace_id)
+    for filename in filenames:
+        file_handler.delete_file(filename)
+
 # Initialize services
-file_handler = FileHandler(app.config['UPLOAD_FOLDER'])
-graph_updater = GraphUpdater(app.config['OUTPUT_FOLDER'])
-core_engine = CoreDataEngine()
+table_store = TableStore(os.path.join(app.config['UPLOAD_FOLDER'], 'tables'))
+table_cache = TableCache(app.config['TABLE_CACHE_BYTES'])
+file_handler = FileHandler(app.config['UPLOAD_FOLDER'], table_store, table_cache)
+# every session gets its own model folder; profiles are cached by content for all of them
+workspaces = WorkspaceManager(
+    os.path.join(app.config['OUTPUT_FOLDER'], 'workspaces'), app.config['WORKSPACE_TTL'], _delete_workspace_files
+)
+profile_cache = ProfileCache(os.path.join(app.config['OUTPUT_FOLDER'], 'cache'), PROFILER_VERSION)
+core_engine = CoreDataEngine(
+    cache=profile_cache, normalizer=ValueNormalizer() if app.config['NORMALIZE_VALUES'] else None
+)
 graph_utils = GraphUtils()
+job_manager = JobManager()
+chunked_uploads = ChunkedUploadManager(file_handler, core_engine)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def _workspace():
+    """The current session's workspace, created on first use"""
+    workspace = workspaces.get(session.get('workspace_id'))
+    session['workspace_id'] = workspace.id
+    return workspace
+
+def _save_uploaded_csvs(files, workspace):
+    """Save and parse uploaded CSVs; returns (filenames, {filename: df}, {filename: hash})"""
+    processed_files = []
+    all_csv_data = {}
+    table_hashes = {}
+
+    for file in files:
+        if file and file.filename.lower().endswith('.csv'):
+            # Save file
+            filename = file_handler.save_file(file)
+            workspace.add_uploads([filename])
+            
+            # Parse once into the columnar store and read it back memory-mapped
+            csv_data = file_handler.load_table(filename)
+            
+            # Check if CSV is empty
+            if csv_data.empty:
+                flash(f'The uploaded CSV file {file.filename} is empty')
+                continue
+            
+            processed_files.append(filename)
+            all_csv_data[filename] = csv_data
+            table_hashes[filename] = file_handler.content_hash(filename)
+            flash(f'File {file.filename} uploaded successfully')
+
+    return processed_files, all_csv_data, table_hashes
+
+def _render_graph(relationships, all_csv_data):
+    return render_template('graph.html', **_graph_view(relationships, all_csv_data))
+
+def _graph_view(relationships, all_csv_data):
+    """Template context for graph.html"""
+    processed_files = list(all_csv_data)
+
+    # Generate visualization
+    graph_html = graph_utils.create_interactive_graph(relationships)
+    
+    # Calculate combined CSV info
+    total_rows = sum(len(df) for df in all_csv_data.values())
+    total_columns = sum(len(df.columns) for df in all_csv_data.values())
+    all_column_names = []
+    for df in all_csv_data.values():
+        all_column_names.extend(list(df.columns))
+    
+    return dict(graph_html=graph_html,
+                graph_mode=graph_utils.view_mode(relationships),
+                filenames=processed_files,  # Changed to plural
+                relationships=json.dumps(relationships, ensure_ascii=False),
+                csv_info={
+                    'files_count': len(processed_files),
+                    'total_rows': total_rows,
+                    'total_columns': total_columns,
+                    'column_names': all_column_names,
+                    'file_details': {fname: {
+                        'rows': len(all_csv_data[fname]),
+                        'columns': len(all_csv_data[fname].columns),
+                        'column_names': list(all_csv_data[fname].columns)
+                    } for fname in processed_files}
+                })
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
+    workspace = _workspace()
+    graph_updater = workspace.graph_updater
     if 'files' not in request.files:
         flash('No files selected')
         return redirect(request.url)
@@ -40,70 +136,268 @@ def upload_file():
         flash('No files selected')
         return redirect(request.url)
     
-    processed_files = []
-    all_csv_data = {}
+    try:
+        with metrics.analysis_run('upload', profile=_profile_mode()):
+            processed_files, all_csv_data, table_hashes = _save_uploaded_csvs(files, workspace)
+            
+            if not processed_files:
+                flash('No valid CSV files were processed')
+                return redirect(url_for('index'))
+            
+            # Process all data with core engine
+            relationships, state = core_engine.process_incremental(all_csv_data, None, table_hashes)
+            
+            # Save initial relationships; edits of a previous model no longer apply
+            graph_updater.save_initial_relationships(relationships)
+            graph_updater.reset_edits()
+            graph_updater.save_model_state(state)
+            
+            return _render_graph(relationships, all_csv_data)
     
+    except Exception as e:
+        flash(f'Error processing files: {str(e)}')
+        return redirect(url_for('index'))
+
+@app.route('/add_tables', methods=['POST'])
+def add_tables():
+    """Add CSVs to the current model, comparing only pairs that involve them"""
+    workspace = _workspace()
+    graph_updater = workspace.graph_updater
+    files = request.files.getlist('files')
+    if not files or all(f.filename == '' for f in files):
+        flash('No files selected')
+        return redirect(url_for('index'))
+
     try:
-        # Process each file
-        for file in files:
-            if file and file.filename.lower().endswith('.csv'):
-                # Save file
-                filename = file_handler.save_file(file)
-                
-                # Load CSV data
-                csv_data = file_handler.load_csv(filename)
-                
-                # Check if CSV is empty
-                if csv_data.empty:
-                    flash(f'The uploaded CSV file {file.filename} is empty')
-                    continue
-                
-                processed_files.append(filename)
-                all_csv_data[filename] = csv_data
-                flash(f'File {file.filename} uploaded successfully')
-        
+        state = graph_updater.load_model_state()
+        if state is None:
+            flash('No existing model to add tables to')
+            return redirect(url_for('index'))
+
+        all_csv_data = {}
+        table_hashes = {}
+        for filename, content_hash in state['tables'].items():
+            try:
+                all_csv_data[filename] = file_handler.load_table(filename)
+                table_hashes[filename] = content_hash
+            except (FileNotFoundError, ValueError):
+                flash(f'Previously uploaded file {filename} is no longer available')
+
+        processed_files, new_csv_data, new_hashes = _save_uploaded_csvs(files, workspace)
         if not processed_files:
             flash('No valid CSV files were processed')
             return redirect(url_for('index'))
-        
-        # Process all data with core engine
-        relationships = core_engine.process_multiple_data(all_csv_data)
-        
-        # Save initial relationships
-        graph_updater.save_initial_relationships(relationships)
-        
-        # Generate visualization
-        graph_html = graph_utils.create_interactive_graph(relationships)
-        
-        # Calculate combined CSV info
-        total_rows = sum(len(df) for df in all_csv_data.values())
-        total_columns = sum(len(df.columns) for df in all_csv_data.values())
-        all_column_names = []
-        for df in all_csv_data.values():
-            all_column_names.extend(list(df.columns))
-        
-        return render_template('graph.html', 
-                             graph_html=graph_html,
-                             filenames=processed_files,  # Changed to plural
-                             relationships=json.dumps(relationships, ensure_ascii=False),
-                             csv_info={
-                                 'files_count': len(processed_files),
-                                 'total_rows': total_rows,
-                                 'total_columns': total_columns,
-                                 'column_names': all_column_names,
-                                 'file_details': {fname: {
-                                     'rows': len(all_csv_data[fname]),
-                                     'columns': len(all_csv_data[fname].columns),
-                                     'column_names': list(all_csv_data[fname].columns)
-                                 } for fname in processed_files}
-                             })
-    
+        all_csv_data.update(new_csv_data)
+        table_hashes.update(new_hashes)
+
+        detected, state = core_engine.process_incremental(all_csv_data, state, table_hashes)
+        relationships = graph_updater.merge_detected_relationships(detected)
+        graph_updater.save_model_state(state)
+
+        return _render_graph(relationships, all_csv_data)
+
     except Exception as e:
         flash(f'Error processing files: {str(e)}')
         return redirect(url_for('index'))
 
+def _run_upload_analysis(job, workspace, filenames, profile=None):
+    """Background part of /upload_async: parse, analyze, persist and lay out"""
+    with workspace, metrics.analysis_run('upload_async', profile=profile) as run:
+        job.meta['metrics_run_id'] = run.id
+        return _analyze_uploads(job, workspace.graph_updater, filenames)
+
+def _analyze_uploads(job, graph_updater, filenames):
+    job.report('files_total', len(filenames))
+    all_csv_data = {}
+    table_hashes = {}
+    for filename in filenames:
+        csv_data = file_handler.load_table(filename)
+        if not csv_data.empty:
+            all_csv_data[filename] = csv_data
+            table_hashes[filename] = file_handler.content_hash(filename)
+        job.report('files_parsed')
+
+    if not all_csv_data:
+        raise ValueError('No valid CSV files were processed')
+
+    relationships, state = core_engine.process_incremental(all_csv_data, None, table_hashes, progress=job.report)
+    graph_updater.save_initial_relationships(relationships)
+    graph_updater.reset_edits()
+    graph_updater.save_model_state(state)
+    return _graph_view(relationships, all_csv_data)
+
+@app.route('/upload_async', methods=['POST'])
+def upload_async():
+    """Save the files and analyze them in the background; returns a job id"""
+    workspace = _workspace()
+    files = request.files.getlist('files')
+    filenames = []
+    try:
+        for file in files:
+            if file and file.filename.lower().endswith('.csv'):
+                filenames.append(file_handler.save_file(file))
+                workspace.add_uploads(filenames[-1:])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not filenames:
+        return jsonify({'error': 'No valid CSV files were uploaded'}), 400
+
+    job = job_manager.submit('upload', _run_upload_analysis, workspace, filenames, _profile_mode())
+    return jsonify({
+        'job_id': job.id,
+        'progress_url': url_for('job_progress', job_id=job.id),
+        'result_url': url_for('job_result', job_id=job.id)
+    }), 202
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """Start a resumable upload: {"filename": ..., "size": bytes}; chunks go to upload_url"""
+    workspace = _workspace()
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = chunked_uploads.create(data.get('filename', ''), data.get('size'), owner=workspace.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    workspace.add_uploads([upload.filename, upload.part_filename])
+    return jsonify(dict(
+        upload.to_dict(),
+        upload_url=url_for('upload_chunk', upload_id=upload.id),
+        complete_url=url_for('complete_upload', upload_id=upload.id)
+    )), 201
+
+def _owned_upload(upload_id):
+    """The chunked upload if the current session's workspace started it, else None"""
+    upload = chunked_uploads.get(upload_id)
+    return upload if upload is not None and upload.owner == _workspace().id else None
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    upload = _owned_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    return jsonify(upload.to_dict())
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Append the request body at ?offset=N (or Content-Range: bytes N-M/total)"""
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        content_range = request.headers.get('Content-Range', '')
+        try:
+            offset = int(content_range.split()[1].split('-')[0])
+        except (IndexError, ValueError):
+            return jsonify({'error': 'Chunk offset missing'}), 400
+    if _owned_upload(upload_id) is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    try:
+        upload = chunked_uploads.append(upload_id, offset, request.stream)
+    except KeyError:
+        return jsonify({'error': 'Unknown upload'}), 404
+    except UploadOffsetMismatch as e:
+        return jsonify({'error': str(e), 'offset': e.received}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(upload.to_dict())
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    if _owned_upload(upload_id) is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    try:
+        upload = chunked_uploads.abort(upload_id)
+    except KeyError:
+        return jsonify({'error': 'Unknown upload'}), 404
+    return jsonify(upload.to_dict())
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    if _owned_upload(upload_id) is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    try:
+        upload = chunked_uploads.complete(upload_id)
+    except KeyError:
+        return jsonify({'error': 'Unknown upload'}), 404
+    except UploadOffsetMismatch as e:
+        return jsonify({'error': 'Upload is incomplete', 'offset': e.received}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    profile = core_engine._portable_profile(upload.profile) if upload.profile else None
+    return jsonify(dict(upload.to_dict(), profile=profile))
+
+@app.route('/uploads/analyze', methods=['POST'])
+def analyze_uploads():
+    """Analyze completed chunked uploads in the background: {"uploads": [upload ids]}"""
+    workspace = _workspace()
+    data = request.get_json(silent=True) or {}
+    filenames = []
+    for upload_id in data.get('uploads', []):
+        upload = _owned_upload(upload_id)
+        if upload is None or upload.status != 'complete':
+            return jsonify({'error': f'Upload {upload_id} is not complete'}), 400
+        filenames.append(upload.filename)
+    if not filenames:
+        return jsonify({'error': 'No uploads to analyze'}), 400
+
+    job = job_manager.submit('upload', _run_upload_analysis, workspace, filenames, _profile_mode())
+    return jsonify({
+        'job_id': job.id,
+        'progress_url': url_for('job_progress', job_id=job.id),
+        'result_url': url_for('job_result', job_id=job.id)
+    }), 202
+
+@app.route('/jobs/<job_id>')
+def job_progress(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        flash('Analysis job not found or expired')
+        return redirect(url_for('index'))
+    if job.status != 'done':
+        if job.status in ('queued', 'running'):
+            return jsonify(job.to_dict()), 202
+        flash(f'Analysis {job.status}: {job.error}' if job.error else f'Analysis {job.status}')
+        return redirect(url_for('index'))
+    return render_template('graph.html', **job.result)
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+def _profile_mode():
+    """?profile=1 / cprofile / pyinstrument captures a profiler report of the run"""
+    mode = request.args.get('profile')
+    if not mode:
+        return None
+    return mode if mode in ('cprofile', 'pyinstrument') else 'cprofile'
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/runs')
+def metrics_runs():
+    return jsonify(metrics.recent_runs())
+
+@app.route('/metrics/runs/<run_id>/profile')
+def metrics_run_profile(run_id):
+    run = metrics.get_run(run_id)
+    if run is None or run.profile_report is None:
+        return jsonify({'error': 'No profile captured for this run'}), 404
+    return Response(run.profile_report, mimetype='text/plain')
+
 @app.route('/update_graph', methods=['POST'])
 def update_graph():
+    graph_updater = _workspace().graph_updater
     try:
         data = request.get_json()
         relationships = data.get('relationships', [])
@@ -125,8 +419,97 @@ def update_graph():
             'error': str(e)
         }), 500
 
+@app.route('/graph/changes', methods=['POST'])
+def apply_graph_changes():
+    """Apply {"ops": [...]} edge edits (see GraphUpdater.apply_changes); returns the changed vis.js items"""
+    graph_updater = _workspace().graph_updater
+    data = request.get_json(silent=True) or {}
+    try:
+        changes = graph_updater.apply_changes(data.get('ops', []))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify(dict(graph_utils.vis_changes(changes), success=True))
+
+@app.route('/graph/expand')
+def expand_graph_table():
+    """Column nodes and edges replacing ?table=<name>'s cluster; ?expanded=<name> for tables already open"""
+    graph_updater = _workspace().graph_updater
+    table = request.args.get('table')
+    if not table:
+        return jsonify({'error': 'Missing table'}), 400
+    relationships = graph_updater.load_edited_relationships() or []
+    return jsonify(graph_utils.expand_table(relationships, table, request.args.getlist('expanded')))
+
+@app.route('/integrity')
+def integrity_report():
+    """
+    Orphan rows, fan-out and cardinality of every relationship in the
+    current model; reports of unchanged tables come from the cache saved
+    with the relationships.
+    """
+    graph_updater = _workspace().graph_updater
+    relationships = graph_updater.load_edited_relationships() or []
+    state = graph_updater.load_model_state() or {}
+    checker = IntegrityChecker(normalizer=core_engine.normalizer)
+    reports, entries = checker.report(
+        relationships, file_handler.load_columns, state.get('tables'), graph_updater.load_integrity_report(),
+        block_loader=file_handler.iter_columns
+    )
+    graph_updater.save_integrity_report(entries)
+    # the reports are the cache entries themselves: annotate copies
+    reports = [dict(report, id=GraphUpdater.edge_id(rel)) for rel, report in zip(relationships, reports)]
+    return jsonify({'version': graph_updater.latest_version(), 'relationships': reports})
+
+@app.route('/join_path')
+def join_path():
+    """Cheapest ways to join ?from=<table> to ?to=<table> in the current model (?k=N alternatives)"""
+    source, target = request.args.get('from'), request.args.get('to')
+    k = request.args.get('k', default=1, type=int)
+    if not source or not target or k < 1:
+        return jsonify({'error': 'Expected from, to and k >= 1'}), 400
+    workspace = _workspace()
+    graph_updater, join_planner = workspace.graph_updater, workspace.join_planner
+    join_planner.sync(graph_updater.load_edited_relationships() or [], graph_updater.latest_version())
+    try:
+        paths = join_planner.join_paths(source, target, min(k, 20))
+    except KeyError as e:
+        return jsonify({'error': f'Table {e} has no relationships'}), 404
+    return jsonify({'from': source, 'to': target, 'version': join_planner.version, 'paths': paths})
+
+@app.route('/history')
+def relationship_history():
+    """Saved versions of the model, newest first (?limit=N)"""
+    graph_updater = _workspace().graph_updater
+    return jsonify({
+        'latest_version': graph_updater.latest_version(),
+        'versions': graph_updater.get_version_history(request.args.get('limit', type=int))
+    })
+
+@app.route('/history/<int:version>')
+def relationship_version(version):
+    graph_updater = _workspace().graph_updater
+    try:
+        return jsonify(graph_updater.get_version(version))
+    except KeyError:
+        return jsonify({'error': f'Unknown version {version}'}), 404
+
+@app.route('/history/diff')
+def relationship_diff():
+    """Changes between ?from=<version> and ?to=<version> (default: latest)"""
+    graph_updater = _workspace().graph_updater
+    latest = graph_updater.latest_version()
+    from_version = request.args.get('from', type=int)
+    to_version = request.args.get('to', latest, type=int)
+    if from_version is None:
+        return jsonify({'error': 'Missing from version'}), 400
+    try:
+        return jsonify(graph_updater.diff_versions(from_version, to_version))
+    except KeyError as e:
+        return jsonify({'error': f'Unknown version {e.args[0]}'}), 404
+
 @app.route('/get_relationships')
 def get_relationships():
+    graph_updater = _workspace().graph_updater
     try:
         relationships = graph_updater.load_edited_relationships()
         return jsonify(relationships)
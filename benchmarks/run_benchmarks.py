@@ -0,0 +1,176 @@
+"""
+Benchmark the detection pipeline on a synthetic schema.
+
+    python -m benchmarks.run_benchmarks --shape star --tables 20 --rows 100000
+    python -m benchmarks.run_benchmarks --output results.json --baseline baseline.json
+
+Each stage (load_csv, profile, primary keys, foreign keys, graph) reports
+wall time, peak traced memory and throughput; detection is scored against
+the generator's ground truth. With --baseline the run fails (exit code 1)
+when a stage is slower than the baseline by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.schema_generator import SchemaGenerator  # noqa: E402
+from core.core_data_engine import CoreDataEngine  # noqa: E402
+from services.file_handler import FileHandler  # noqa: E402
+from utils.graph_utils import GraphUtils  # noqa: E402
+
+
+class StageTimer:
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def run(self, name, func, rows=0, cells=0):
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        peak = None
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        self.stages[name] = {
+            'seconds': round(elapsed, 4),
+            'peak_memory_mb': round(peak / 2**20, 2) if peak is not None else None,
+            'rows_per_second': round(rows / elapsed, 1) if rows and elapsed else None,
+            'cells_per_second': round(cells / elapsed, 1) if cells and elapsed else None
+        }
+        return result
+
+
+def score(relationships, truth):
+    def key(rel):
+        return (rel['from_table'], rel['from_column'], rel['to_table'], rel['to_column'])
+
+    found = {key(rel) for rel in relationships}
+    expected = {key(rel) for rel in truth}
+    hits = len(found & expected)
+    return {
+        'expected': len(expected),
+        'detected': len(found),
+        'true_positives': hits,
+        'precision': round(hits / len(found), 4) if found else 1.0,
+        'recall': round(hits / len(expected), 4) if expected else 1.0,
+        'missed': sorted(map(list, expected - found)),
+        'spurious': sorted(map(list, found - expected))
+    }
+
+
+def run_benchmark(args):
+    generator = SchemaGenerator(
+        shape=args.shape, tables=args.tables, rows=args.rows, columns=args.columns,
+        key_cardinality=args.key_cardinality, fk_overlap=args.fk_overlap,
+        key_type=args.key_type, seed=args.seed
+    )
+    engine = CoreDataEngine(approximate=args.approximate, workers=args.workers)
+    timer = StageTimer(trace_memory=not args.no_memory)
+
+    with tempfile.TemporaryDirectory() as folder:
+        truth = generator.write_csvs(folder)
+        file_handler = FileHandler(folder)
+        filenames = sorted(f for f in os.listdir(folder) if f.endswith('.csv'))
+        total_bytes = sum(os.path.getsize(os.path.join(folder, f)) for f in filenames)
+
+        df_dict = timer.run('load_csv', lambda: {f: file_handler.load_csv(f) for f in filenames})
+
+    total_rows = sum(len(df) for df in df_dict.values())
+    total_cells = sum(df.size for df in df_dict.values())
+    timer.stages['load_csv']['rows_per_second'] = round(total_rows / max(timer.stages['load_csv']['seconds'], 1e-9), 1)
+
+    profile_data = timer.run('profile', lambda: engine.profile_multiple_dataframes(df_dict),
+                             rows=total_rows, cells=total_cells)
+    table_keys = timer.run('primary_keys', lambda: engine.detect_primary_keys(profile_data))
+    if args.approximate:
+        relationships = timer.run('foreign_keys', lambda: engine.detect_foreign_keys_approximate(
+            profile_data, table_keys, df_dict), rows=total_rows)
+    else:
+        relationships = timer.run('foreign_keys', lambda: engine.detect_foreign_keys_from_dfs(
+            df_dict, profile_data, table_keys), rows=total_rows)
+    if not args.skip_graph:
+        timer.run('graph', lambda: GraphUtils().create_interactive_graph(relationships))
+
+    return {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'parameters': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+        'input': {
+            'tables': len(df_dict),
+            'rows': total_rows,
+            'cells': total_cells,
+            'csv_bytes': total_bytes
+        },
+        'stages': timer.stages,
+        'total_seconds': round(sum(s['seconds'] for s in timer.stages.values()), 4),
+        'accuracy': score(relationships, truth)
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Return a list of human-readable regressions against a baseline run"""
+    regressions = []
+    for stage, stats in result['stages'].items():
+        base = baseline.get('stages', {}).get(stage)
+        if not base or not base['seconds']:
+            continue
+        ratio = stats['seconds'] / base['seconds']
+        if ratio > 1 + tolerance:
+            regressions.append(f"{stage}: {stats['seconds']}s vs {base['seconds']}s baseline ({ratio:.2f}x)")
+    for metric in ('precision', 'recall'):
+        base = baseline.get('accuracy', {}).get(metric)
+        if base is not None and result['accuracy'][metric] < base:
+            regressions.append(f"{metric}: {result['accuracy'][metric]} vs {base} baseline")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shape', choices=SchemaGenerator.shapes, default='star')
+    parser.add_argument('--tables', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=50000, help='rows of the fact / head table')
+    parser.add_argument('--columns', type=int, default=8, help='columns per table')
+    parser.add_argument('--key-cardinality', type=float, default=0.1,
+                        help='rows of referenced tables as a fraction of --rows')
+    parser.add_argument('--fk-overlap', type=float, default=1.0,
+                        help='fraction of foreign-key values that exist in the referenced key')
+    parser.add_argument('--key-type', choices=('string', 'int'), default='string')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--approximate', action='store_true', help='use MinHash/LSH detection')
+    parser.add_argument('--skip-graph', action='store_true')
+    parser.add_argument('--no-memory', action='store_true', help='disable tracemalloc (lower overhead)')
+    parser.add_argument('--output', help='write the JSON result to this file')
+    parser.add_argument('--baseline', help='JSON result of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown vs baseline')
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args)
+    report = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    print(report)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
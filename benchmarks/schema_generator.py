@@ -0,0 +1,96 @@
+import os
+import numpy as np
+import pandas as pd
+
+
+class SchemaGenerator:
+    """
+    Generates synthetic star, snowflake and chain schemas as DataFrames
+    together with their ground-truth foreign-key relationships.
+
+    Table 0 (the fact / chain head) has `rows` rows, every other table
+    rows * key_cardinality. A fraction fk_overlap of each foreign-key value
+    is drawn from the referenced key; the rest are orphans.
+    """
+
+    shapes = ('star', 'snowflake', 'chain')
+
+    def __init__(self, shape='star', tables=5, rows=10000, columns=6,
+                 key_cardinality=0.1, fk_overlap=1.0, key_type='string', seed=0):
+        if shape not in self.shapes:
+            raise ValueError(f"Unknown schema shape {shape}")
+        self.shape = shape
+        self.tables = tables
+        self.rows = rows
+        self.columns = columns
+        self.key_cardinality = key_cardinality
+        self.fk_overlap = fk_overlap
+        self.key_type = key_type
+        self.rng = np.random.default_rng(seed)
+
+    def edges(self):
+        """(from_table_index, to_table_index) pairs of the schema"""
+        if self.shape == 'star':
+            return [(0, i) for i in range(1, self.tables)]
+        if self.shape == 'snowflake':
+            return [((i - 1) // 2, i) for i in range(1, self.tables)]
+        return [(i - 1, i) for i in range(1, self.tables)]
+
+    def table_name(self, i):
+        return f"t{i}.csv"
+
+    def _keys(self, i, n):
+        if self.key_type == 'int':
+            return np.arange(i * 10_000_000, i * 10_000_000 + n)
+        return np.array([f"T{i}-{k:08d}" for k in range(n)], dtype=object)
+
+    def _orphans(self, i, n):
+        if self.key_type == 'int':
+            return self.rng.integers(-10_000_000, -1, n)
+        return np.array([f"X{i}-{k:08d}" for k in self.rng.integers(0, 10**8, n)], dtype=object)
+
+    def generate(self):
+        """Return ({table_name: DataFrame}, [ground-truth relationship dicts])"""
+        n_rows = [self.rows] + [max(10, int(self.rows * self.key_cardinality))] * (self.tables - 1)
+        keys = [self._keys(i, n) for i, n in enumerate(n_rows)]
+        edges = self.edges()
+
+        frames = {}
+        truth = []
+        for i, n in enumerate(n_rows):
+            data = {f"t{i}_id": keys[i]}
+            for from_i, to_i in edges:
+                if from_i != i:
+                    continue
+                col = f"t{to_i}_ref"
+                values = self.rng.choice(keys[to_i], n)
+                orphan = self.rng.random(n) >= self.fk_overlap
+                if orphan.any():
+                    values = values.copy()
+                    values[orphan] = self._orphans(to_i, int(orphan.sum()))
+                data[col] = values
+                truth.append({
+                    "from_table": self.table_name(i),
+                    "from_column": col,
+                    "to_table": self.table_name(to_i),
+                    "to_column": f"t{to_i}_id"
+                })
+
+            for j in range(max(0, self.columns - len(data))):
+                kind = j % 3
+                if kind == 0:
+                    data[f"measure_{j}"] = self.rng.random(n) * 1000
+                elif kind == 1:
+                    data[f"category_{j}"] = self.rng.choice(['red', 'green', 'blue', 'amber'], n)
+                else:
+                    data[f"count_{j}"] = self.rng.integers(0, 50, n)
+            frames[self.table_name(i)] = pd.DataFrame(data)
+        return frames, truth
+
+    def write_csvs(self, folder):
+        """Write the schema to folder; returns the ground-truth relationships"""
+        frames, truth = self.generate()
+        os.makedirs(folder, exist_ok=True)
+        for name, df in frames.items():
+            df.to_csv(os.path.join(folder, name), index=False)
+        return truth
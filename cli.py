@@ -0,0 +1,171 @@
+"""
+Analyze a directory of CSV exports without the web app.
+
+    python cli.py exports/ --output outputs
+    python cli.py "exports/**/*.csv" --workers 4 --profiles profiles.json --timings timings.json
+    python cli.py big_exports/ --sample-rows 200000
+
+Relationships are written to <output>/initial_relationships.json in the
+GraphUpdater format; edits already saved in that folder are kept (see
+GraphUpdater.merge_detected_relationships). The web app keeps its models
+per session under outputs/workspaces/<id>/ and does not read this folder.
+Nothing is rendered.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+
+from core.core_data_engine import CoreDataEngine, PROFILER_VERSION
+from core.value_normalizer import ValueNormalizer
+from core.integrity_report import IntegrityChecker
+from services.file_handler import FileHandler
+from services.graph_updater import GraphUpdater
+from services.profile_cache import ProfileCache
+from utils.metrics import metrics
+
+
+def collect_files(patterns, recursive=False):
+    """CSV paths matched by directories and/or glob patterns, sorted and de-duplicated"""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            if recursive:
+                for folder, _, names in os.walk(pattern):
+                    paths.update(os.path.join(folder, name) for name in names)
+            else:
+                paths.update(os.path.join(pattern, name) for name in os.listdir(pattern))
+        else:
+            paths.update(glob.glob(pattern, recursive=True))
+    return sorted(os.path.abspath(p) for p in paths if os.path.isfile(p) and p.lower().endswith('.csv'))
+
+
+def table_names(paths):
+    """{table name: path}; names are paths relative to the common folder"""
+    root = os.path.commonpath([os.path.dirname(p) for p in paths])
+    return root, {os.path.relpath(p, root).replace(os.sep, '/'): p for p in paths}
+
+
+def load_tables(file_handler, names, sample_rows=None):
+    """Parse every file, skipping unreadable ones; returns (frames, row counts, failures)"""
+    df_dict = {}
+    total_rows = {}
+    failed = {}
+    for name in names:
+        try:
+            if sample_rows:
+                df_dict[name], total_rows[name] = file_handler.sample_csv(name, sample_rows)
+            else:
+                df_dict[name] = file_handler.load_csv(name)
+                total_rows[name] = len(df_dict[name])
+        except Exception as e:
+            failed[name] = str(e)
+            print(f"Error loading file {name}: {e}", file=sys.stderr)
+    return df_dict, total_rows, failed
+
+
+def analyze(engine, file_handler, df_dict, total_rows, sampled=False, use_cache=False):
+    """Returns (relationships, profile_data, table_keys)"""
+    if sampled:
+        return engine.process_sampled(df_dict, total_rows, file_handler.load_columns)
+
+    table_hashes = {name: file_handler.content_hash(name) for name in df_dict} if use_cache else None
+    if not engine.approximate:
+        relationships, state = engine.process_incremental(df_dict, None, table_hashes)
+        return relationships, state['profiles'], state['table_keys']
+
+    profile_data, table_keys = engine.analyze_tables(df_dict, table_hashes)
+    relationships = engine.detect_foreign_keys_approximate(profile_data, table_keys, df_dict)
+    relationships += engine.detect_composite_foreign_keys_approximate(profile_data, table_keys, df_dict)
+    return relationships, profile_data, table_keys
+
+
+def write_json(path, data):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, default=str)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='directories and/or glob patterns of CSV files')
+    parser.add_argument('--recursive', '-r', action='store_true', help='also walk sub-directories')
+    parser.add_argument('--output', default='outputs', help='folder for initial_relationships.json')
+    parser.add_argument('--profiles', help='also write column profiles and keys to this JSON file')
+    parser.add_argument('--timings', help='also write stage timings and counters to this JSON file')
+    parser.add_argument('--workers', type=int, default=1, help='profiling processes (0 = all cores)')
+    parser.add_argument('--approximate', action='store_true', help='use MinHash/LSH detection')
+    parser.add_argument('--verify-top', type=int, default=0,
+                        help='approximate candidates re-checked exactly')
+    parser.add_argument('--sample-rows', type=int,
+                        help='profile a uniform sample of this many rows per file and load only finalist columns in full; '
+                             'composite keys are searched on the sample and verified on all rows')
+    parser.add_argument('--no-prune', action='store_true', help='compare every column/key pair')
+    parser.add_argument('--max-key-width', type=int, default=3, help='widest composite key searched')
+    parser.add_argument('--cache', help='profile cache folder, reused across runs by file content hash')
+    parser.add_argument('--integrity', help='also write orphan rows, fan-out and cardinality per relationship to this JSON file')
+    parser.add_argument('--normalize', action='store_true',
+                        help='match keys after trimming, case folding and unifying numbers ("1001" == 1001)')
+    args = parser.parse_args(argv)
+
+    paths = collect_files(args.inputs, args.recursive)
+    if not paths:
+        parser.error('no CSV files matched')
+    root, names = table_names(paths)
+
+    file_handler = FileHandler(root)
+    cache = ProfileCache(args.cache, PROFILER_VERSION) if args.cache else None
+    engine = CoreDataEngine(
+        approximate=args.approximate, verify_top=args.verify_top, workers=args.workers or None,
+        cache=cache, prune_candidates=not args.no_prune, max_key_width=args.max_key_width,
+        normalizer=ValueNormalizer() if args.normalize else None,
+        # the CLI runs no other threads, so workers can share the tables through fork
+        parallel_start_method='fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+    )
+
+    with metrics.analysis_run('cli') as run:
+        df_dict, total_rows, failed = load_tables(file_handler, names, args.sample_rows)
+        if not df_dict:
+            print('No valid CSV files were processed', file=sys.stderr)
+            return 1
+        relationships, profile_data, table_keys = analyze(
+            engine, file_handler, df_dict, total_rows, bool(args.sample_rows), cache is not None
+        )
+        graph_updater = GraphUpdater(args.output)
+        os.makedirs(args.output, exist_ok=True)
+        graph_updater.merge_detected_relationships(relationships)
+        if args.integrity:
+            checker = IntegrityChecker(normalizer=engine.normalizer)
+            if args.sample_rows:
+                # df_dict holds samples only: read the full columns from the files
+                reports, _ = checker.report(relationships, file_handler.load_columns,
+                                            block_loader=file_handler.iter_columns)
+            else:
+                reports, _ = checker.report(relationships, lambda table, columns: df_dict[table][columns])
+
+    if args.profiles:
+        write_json(args.profiles, {
+            table: dict(engine._portable_profile(profile), keys=table_keys[table])
+            for table, profile in profile_data.items()
+        })
+    if args.integrity:
+        write_json(args.integrity, reports)
+    if args.timings:
+        write_json(args.timings, dict(
+            run.to_dict(),
+            root=root,
+            tables={name: {'rows': total_rows[name], 'columns': len(df.columns)} for name, df in df_dict.items()},
+            failed=failed
+        ))
+
+    print(f"{len(relationships)} relationships between {len(df_dict)} tables "
+          f"in {run.seconds:.1f}s -> {graph_updater.initial_file}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
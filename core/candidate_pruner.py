@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+from core.column_sketch import hash_distinct_values
+
+_NUMERIC_TYPES = {"int", "float", "bool"}
+
+
+class BloomFilter:
+    """Bit-packed Bloom filter over uint64 value hashes (double hashing)."""
+
+    def __init__(self, hashes, bits_per_item=10, num_hashes=7, chunk_size=1_000_000):
+        self.num_bits = max(64, len(hashes) * bits_per_item)
+        self.num_hashes = num_hashes
+        bits = np.zeros(self.num_bits, dtype=bool)
+        for start in range(0, len(hashes), chunk_size):
+            bits[self._positions(hashes[start:start + chunk_size]).ravel()] = True
+        self.bits = np.packbits(bits)
+
+    def _positions(self, hashes):
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+
+    def contains(self, hashes):
+        pos = self._positions(hashes)
+        bytes_ = self.bits[(pos >> np.uint64(3)).astype(np.intp)]
+        bit = (bytes_ >> (np.uint64(7) - (pos & np.uint64(7))).astype(np.uint8)) & 1
+        return bit.all(axis=1)
+
+
+class CandidatePruner:
+    """
+    Rejects (column, key) pairs that cannot reach the containment threshold
+    before any set intersection is computed.
+
+    Filters run cheapest first, and each rejected pair is attributed to the
+    first filter that rejects it:
+
+    - type: values of incompatible types never compare equal
+    - cardinality: containment is at most |key| / |column| distinct values
+    - range: disjoint numeric [min, max] ranges share no value
+    - bloom: a hash sample of the column mostly misses the key's Bloom filter
+
+    Value shapes (regex_pattern) are not a filter: they are inferred from
+    the first values of a column only, so they cannot prove two columns
+    disjoint.
+
+    The bloom sample is the column's smallest value hashes, i.e. a uniform
+    sample of its distinct values; when it covers the whole column the bound
+    is exact, otherwise a pair is only rejected below half the threshold.
+    bloom_sample=0 disables the Bloom probe.
+
+    With value_hashes, a callable returning the normalized distinct value
+    hashes of a (table, column) (see ValueNormalizer), pairs are judged on
+    normalized values: type and range say nothing about those, so
+    only cardinality (on normalized distinct counts) and bloom apply.
+    """
+
+    filters = ("type", "cardinality", "range", "bloom")
+
+    def __init__(self, profile_data, threshold=0.8, bloom_sample=64, value_hashes=None):
+        self.profile_data = profile_data
+        self.threshold = threshold
+        self.bloom_sample = bloom_sample
+        self.value_hashes = value_hashes
+        self.stats = {name: 0 for name in self.filters}
+        self.stats["considered"] = 0
+        self.stats["survived"] = 0
+        self._blooms = {}
+
+    def _profile(self, table, column):
+        return self.profile_data[table]["columns"][column]
+
+    def _cheap_reject(self, from_props, key_props):
+        from_type, key_type = from_props["data_type"], key_props["data_type"]
+        if from_type != key_type and not (from_type in _NUMERIC_TYPES and key_type in _NUMERIC_TYPES):
+            return "type"
+
+        if key_props["num_unique_values"] <= self.threshold * from_props["num_unique_values"]:
+            return "cardinality"
+
+        if "min_value" in from_props and "min_value" in key_props:
+            if from_props["min_value"] > key_props["max_value"] or from_props["max_value"] < key_props["min_value"]:
+                return "range"
+        return None
+
+    def _normalized_reject(self, from_key, key):
+        if len(self.value_hashes(key)) <= self.threshold * len(self.value_hashes(from_key)):
+            return "cardinality"
+        return None
+
+    def _hashable(self, series):
+        # object columns hash through str(), so only pure-text ones are comparable
+        return series.dtype != object or pd.api.types.infer_dtype(series, skipna=True) == "string"
+
+    def _bloom(self, key, key_series):
+        if key not in self._blooms:
+            if self.value_hashes is not None:
+                self._blooms[key] = BloomFilter(self.value_hashes(key))
+            else:
+                values = key_series(key)
+                self._blooms[key] = BloomFilter(hash_distinct_values(values)) if self._hashable(values) else None
+        return self._blooms[key]
+
+    def surviving_keys(self, from_table, from_col, from_series, keys, key_series):
+        """
+        Filter keys, a list of (to_table, to_column), down to those that may
+        contain from_col. key_series(key) returns the key's values and is
+        only called for keys that reach the Bloom probe.
+        """
+        from_props = self._profile(from_table, from_col)
+        candidates = []
+        for key in keys:
+            self.stats["considered"] += 1
+            if self.value_hashes is not None:
+                reason = self._normalized_reject((from_table, from_col), key)
+            else:
+                reason = self._cheap_reject(from_props, self._profile(*key))
+            if reason:
+                self.stats[reason] += 1
+            else:
+                candidates.append(key)
+
+        normalized = self.value_hashes is not None
+        if candidates and self.bloom_sample and (normalized or self._hashable(from_series)):
+            if normalized:
+                from_hashes = self.value_hashes((from_table, from_col))
+                sample = from_hashes[:self.bloom_sample]
+                exact = len(sample) == len(from_hashes)
+            else:
+                sample = hash_distinct_values(from_series)[:self.bloom_sample]
+                exact = len(sample) == from_props["num_unique_values"]
+            min_rate = self.threshold if exact else self.threshold / 2
+            kept = []
+            for key in candidates:
+                bloom = self._bloom(key, key_series)
+                if bloom is not None and len(sample):
+                    hit_rate = bloom.contains(sample).mean()
+                    if (hit_rate <= min_rate) if exact else (hit_rate < min_rate):
+                        self.stats["bloom"] += 1
+                        continue
+                kept.append(key)
+            candidates = kept
+
+        self.stats["survived"] += len(candidates)
+        return candidates
@@ -0,0 +1,127 @@
+import math
+import numpy as np
+import pandas as pd
+
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _mix64(x):
+    # splitmix64 finaliser, vectorised over a uint64 array
+    x = x ^ (x >> np.uint64(30))
+    x = x * _MIX_1
+    x = x ^ (x >> np.uint64(27))
+    x = x * _MIX_2
+    return x ^ (x >> np.uint64(31))
+
+
+def hash_distinct_values(series):
+    """Hash the distinct non-null values of a column into a uint64 array."""
+    values = series.dropna()
+    if pd.api.types.is_float_dtype(values):
+        # 1001.0 and 1001 are the same key value, as in the exact set comparison
+        integral = (values % 1 == 0).to_numpy()
+        return np.unique(np.concatenate([
+            pd.util.hash_array(values[integral].to_numpy().astype("int64")),
+            pd.util.hash_array(values[~integral].to_numpy())
+        ]))
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_datetime64_any_dtype(values):
+        values = values.astype("int64")
+    return np.unique(pd.util.hash_array(values.to_numpy()))
+
+
+class MinHashSketch:
+    """Fixed-size MinHash signature of a column's distinct values."""
+
+    def __init__(self, signature, size):
+        self.signature = signature
+        self.size = size
+
+    @classmethod
+    def from_hashes(cls, hashes, num_perm=128, seed=1):
+        seeds = _mix64(np.arange(seed, seed + num_perm, dtype=np.uint64))
+        signature = np.full(num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        if len(hashes):
+            for i, perm_seed in enumerate(seeds):
+                signature[i] = _mix64(hashes ^ perm_seed).min()
+        return cls(signature, len(hashes))
+
+    @classmethod
+    def from_series(cls, series, num_perm=128, seed=1):
+        return cls.from_hashes(hash_distinct_values(series), num_perm, seed)
+
+    @property
+    def num_perm(self):
+        return len(self.signature)
+
+    def jaccard(self, other):
+        return float(np.mean(self.signature == other.signature))
+
+    def containment(self, other, z=1.96):
+        """
+        Estimate |self & other| / |self| and a z-sigma error bound on it.
+
+        Jaccard is estimated from the signatures and converted to
+        containment with the exact distinct counts of both columns.
+        """
+        if not self.size or not other.size:
+            return 0.0, 0.0
+        j = self.jaccard(other)
+        scale = (self.size + other.size) / self.size
+        estimate = min(1.0, j * scale / (1 + j))
+        j_stderr = math.sqrt(max(j * (1 - j), 1.0 / self.num_perm) / self.num_perm)
+        bound = min(1.0, z * j_stderr * scale / (1 + j) ** 2)
+        return round(estimate, 4), round(bound, 4)
+
+
+class ContainmentLSH:
+    """
+    Locality-sensitive index answering "which keys probably contain this
+    column" in the style of LSH Ensemble.
+
+    Keys are partitioned by distinct-count so that each partition can pick
+    the band width giving the requested recall at the Jaccard threshold
+    implied by the containment threshold and the partition's largest key.
+    """
+
+    band_widths = (8, 4, 2, 1)
+
+    def __init__(self, num_perm=128, threshold=0.8, recall=0.95):
+        self.num_perm = num_perm
+        self.threshold = threshold
+        self.recall = recall
+        self.partitions = {}      # size bucket -> {"max_size", "tables": {r: {band: [ids]}}}
+
+    def add(self, key_id, sketch):
+        bucket = int(math.log2(sketch.size)) if sketch.size else 0
+        partition = self.partitions.setdefault(
+            bucket, {"max_size": 0, "tables": {r: {} for r in self.band_widths}}
+        )
+        partition["max_size"] = max(partition["max_size"], sketch.size)
+        for r, table in partition["tables"].items():
+            for band in self._bands(sketch.signature, r):
+                table.setdefault(band, []).append(key_id)
+
+    def query(self, sketch):
+        candidates = set()
+        if not sketch.size:
+            return candidates
+        for partition in self.partitions.values():
+            r = self._band_width(sketch.size, partition["max_size"])
+            table = partition["tables"][r]
+            for band in self._bands(sketch.signature, r):
+                candidates.update(table.get(band, ()))
+        return candidates
+
+    def _band_width(self, query_size, key_size):
+        t = self.threshold
+        j_min = t * query_size / max(query_size + key_size - t * query_size, 1)
+        for r in self.band_widths:
+            bands = self.num_perm // r
+            if 1 - (1 - j_min ** r) ** bands >= self.recall:
+                return r
+        return 1
+
+    def _bands(self, signature, r):
+        for i in range(0, self.num_perm - r + 1, r):
+            yield i, signature[i:i + r].tobytes()
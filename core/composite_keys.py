@@ -0,0 +1,172 @@
+from itertools import combinations
+import numpy as np
+import pandas as pd
+
+
+class CompositeKeyFinder:
+    """
+    Minimal multi-column unique key discovery, TANE style.
+
+    The search walks the column lattice level by level. A candidate's
+    stripped partition holds the row ids and group ids of rows that still
+    share their value combination with another row; X + A is refined from
+    the cached partition of a sub-combination and the codes of A, and it is
+    a key once no row is left. Keys are removed from the lattice, so only
+    minimal keys are reported.
+
+    On tables larger than sample_size, partitions are first built on a
+    fixed row sample. A duplicate in the sample proves a non-key, so only
+    combinations that are unique on the sample are checked further: on
+    nested samples 8x larger each, then on all rows by refining cached
+    all-row partitions of their column prefixes.
+
+    Pruning:
+    - only complete, non-float columns with 2..n-1 distinct values are used
+      (unique columns are single-column keys already)
+    - a candidate is dropped when even the largest remaining cardinalities
+      cannot make it unique within max_width columns
+    - sample partitions are cached up to max_cached_rows rows per level (and
+      all-row ones up to max_cached_rows in total), then recomputed as needed
+    - at most max_candidates candidates are checked per level; when that cap
+      is hit the search is no longer exhaustive and self.truncated is set
+    """
+
+    def __init__(self, max_width=3, sample_size=20_000, max_candidates=200_000, max_cached_rows=20_000_000, seed=0):
+        self.max_width = max_width
+        self.sample_size = sample_size
+        self.max_candidates = max_candidates
+        self.max_cached_rows = max_cached_rows
+        self.seed = seed
+        self.truncated = False
+
+    def find(self, df):
+        """Return minimal composite keys of df as tuples of column names"""
+        self.truncated = False
+        n = len(df)
+        if n < 2 or self.max_width < 2:
+            return []
+
+        columns = []
+        codes = {}
+        cards = {}
+        for col in df.columns:
+            series = df[col]
+            if pd.api.types.is_float_dtype(series) or pd.api.types.is_bool_dtype(series):
+                continue
+            col_codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            if (col_codes < 0).any() or not 1 < len(uniques) < n:
+                continue
+            columns.append(col)
+            codes[col] = col_codes.astype(np.int32)
+            cards[col] = len(uniques)
+        if len(columns) < 2:
+            return []
+
+        # nested random row samples, each 8x the previous, below the full table
+        order = np.random.default_rng(self.seed).permutation(n) if n > self.sample_size else None
+        self._stages = []
+        size = self.sample_size
+        while size < n:
+            rows = np.sort(order[:size])
+            self._stages.append({col: codes[col][rows] for col in columns})
+            size *= 8
+        sampled = bool(self._stages)
+        sample_codes = self._stages[0] if sampled else codes
+        self._codes = codes
+        self._exact = {}
+        self._exact_rows = 0
+
+        max_card = float(max(cards.values()))
+        position = {col: i for i, col in enumerate(columns)}
+        # candidate -> partition on the sample rows, or None when not cached
+        level = {(col,): self._partition_of((col,), sample_codes) for col in columns}
+        keys = []
+
+        for width in range(2, self.max_width + 1):
+            remaining = self.max_width - width
+            next_level = {}
+            cached_rows = 0
+            checked = 0
+            for prefix in sorted(level, key=lambda cols: [position[c] for c in cols]):
+                if checked >= self.max_candidates:
+                    self.truncated = True
+                    break
+                for col in columns[position[prefix[-1]] + 1:]:
+                    candidate = prefix + (col,)
+                    subsets = list(combinations(candidate, width - 1))
+                    # every sub-combination must be a non-key that survived pruning
+                    if any(sub not in level for sub in subsets):
+                        continue
+                    if np.prod([float(cards[c]) for c in candidate]) * max_card ** remaining < n:
+                        continue
+
+                    checked += 1
+                    cached = [sub for sub in subsets if level[sub] is not None]
+                    if cached:
+                        partition = self._refine_from(candidate, cached, level, sample_codes)
+                    else:
+                        partition = self._partition_of(candidate, sample_codes)
+                    size = len(partition[0])
+                    if not size and (not sampled or self._unique_beyond_sample(candidate)):
+                        keys.append(candidate)
+                    elif remaining:
+                        if cached_rows + size <= self.max_cached_rows:
+                            cached_rows += size
+                        else:
+                            partition = None
+                        next_level[candidate] = partition
+            level = next_level
+            if not level:
+                break
+        self._codes = self._exact = self._stages = None
+        return keys
+
+    def _unique_beyond_sample(self, cols):
+        # larger samples catch most non-keys before the all-row check
+        for stage_codes in self._stages[1:]:
+            if len(self._partition_of(cols, stage_codes)[0]):
+                return False
+        return not len(self._exact_partition(cols)[0])
+
+    def _exact_partition(self, cols):
+        # partition on all rows, refined from the exact partitions of its prefixes
+        if cols in self._exact:
+            return self._exact[cols]
+        if len(cols) == 1:
+            partition = self._partition_of(cols, self._codes)
+        else:
+            partition = self._refine(*self._exact_partition(cols[:-1]), self._codes[cols[-1]])
+        if self._exact_rows + len(partition[0]) <= self.max_cached_rows:
+            self._exact[cols] = partition
+            self._exact_rows += len(partition[0])
+        return partition
+
+    def _refine_from(self, candidate, bases, level, codes):
+        base = min(bases, key=lambda sub: len(level[sub][0]))
+        extra = next(c for c in candidate if c not in base)
+        return self._refine(*level[base], codes[extra])
+
+    def _partition_of(self, candidate, codes):
+        first = codes[candidate[0]]
+        partition = self._strip(np.arange(len(first), dtype=np.int32), first)
+        for col in candidate[1:]:
+            partition = self._refine(*partition, codes[col])
+        return partition
+
+    def _strip(self, rows, group_codes):
+        counts = np.bincount(group_codes)
+        shared = counts > 1
+        keep = shared[group_codes]
+        # renumber the surviving groups 0..k-1 so refined codes stay dense
+        dense = np.cumsum(shared, dtype=np.int64) - 1
+        return rows[keep], dense[group_codes[keep]]
+
+    def _refine(self, rows, prefix_codes, col_codes):
+        if not len(rows):
+            return rows, prefix_codes
+        values = col_codes[rows]
+        combined = prefix_codes * (int(values.max()) + 1) + values
+        # dense codes can be counted directly; hash only sparse combinations
+        if int(combined.max()) >= 4 * len(rows):
+            combined, _ = pd.factorize(combined)
+        return self._strip(rows, combined)
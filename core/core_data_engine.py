@@ -1,12 +1,55 @@
-import math
-import re
-import os
+import string
+import sys
+import numpy as np
 import pandas as pd
-from collections import Counter
+from functools import lru_cache
+from itertools import product
+from core.inclusion_index import InclusionIndex
+from core.value_dictionary import ValueDictionary
+from core.column_sketch import MinHashSketch, ContainmentLSH
+from core.parallel_profiler import ParallelProfiler
+from core.candidate_pruner import CandidatePruner
+from core.composite_keys import CompositeKeyFinder
+from core.sample_profiler import SampleProfiler
+from utils.metrics import metrics
+
+# Bump whenever profile_column / detect_primary_keys output changes so that
+# cached per-table results from older versions are discarded.
+PROFILER_VERSION = "3"
+
+
+@lru_cache(maxsize=1)
+def _regex_shape_table():
+    # str.translate equivalent of \d -> 9, [a-z] -> a, [A-Z] -> A
+    table = {i: "9" for i in range(sys.maxunicode + 1) if chr(i).isdecimal()}
+    table.update({ord(c): "a" for c in string.ascii_lowercase})
+    table.update({ord(c): "A" for c in string.ascii_uppercase})
+    return table
+
 
 class CoreDataEngine:
-    def __init__(self):
-        pass
+    def __init__(self, approximate=False, num_perm=128, verify_top=0, workers=1, parallel_min_cells=2_000_000, cache=None, prune_candidates=True, max_key_width=3, normalizer=None, parallel_start_method=None):
+        # approximate: detect foreign keys from MinHash sketches + LSH instead of exact sets
+        # verify_top: number of best approximate candidates re-checked exactly
+        # workers: profiling processes (None = all cores); inputs below parallel_min_cells run serially
+        self.approximate = approximate
+        self.num_perm = num_perm
+        self.verify_top = verify_top
+        self.workers = workers
+        self.parallel_min_cells = parallel_min_cells
+        # parallel_start_method: multiprocessing start method for the profiling pool;
+        # None picks forkserver/spawn, "fork" is only safe in single-threaded callers
+        self.parallel_start_method = parallel_start_method
+        # cache: object with get(key)/put(key, value), e.g. services.profile_cache.ProfileCache
+        self.cache = cache
+        # prune_candidates: reject impossible column/key pairs from profiles before intersecting
+        self.prune_candidates = prune_candidates
+        self.last_pruning_stats = None
+        # max_key_width: widest composite key searched for (< 2 disables the search)
+        self.max_key_width = max_key_width
+        # normalizer: e.g. core.value_normalizer.ValueNormalizer; exact single-column
+        # detection then compares normalized values (1001 == "1001", "PRD-01" == " prd-01")
+        self.normalizer = normalizer
 
     def infer_data_type(self, series):
         if pd.api.types.is_integer_dtype(series):
@@ -23,41 +66,70 @@ class CoreDataEngine:
     def compute_entropy(self, values):
         if len(values) == 0:
             return 0.0
-        counter = Counter(values)
-        total = len(values)
-        entropy = -sum((count/total) * math.log2(count/total) for count in counter.values())
-        return round(entropy, 4)
+        return self.compute_entropy_from_counts(pd.Series(values).astype(str).value_counts(sort=False))
+
+    def compute_entropy_from_counts(self, counts):
+        counts = np.asarray(counts, dtype=np.float64)
+        total = counts.sum()
+        if total == 0:
+            return 0.0
+        p = counts / total
+        return round(float(-(p * np.log2(p)).sum()), 4)
 
     def infer_regex_pattern(self, values, sample_size=100):
-        def simplify(val):
-            return re.sub(r'[A-Z]', 'A',
-                   re.sub(r'[a-z]', 'a',
-                   re.sub(r'\d', '9', val)))
+        return self.infer_regex_shape(values, sample_size)[0]
 
-        simplified = [simplify(v) for v in values[:sample_size] if isinstance(v, str)]
-        if not simplified:
-            return None
-        pattern_counts = Counter(simplified)
-        most_common_pattern, _ = pattern_counts.most_common(1)[0]
-        return most_common_pattern
+    def infer_regex_shape(self, values, sample_size=100):
+        """Most common value shape and the share of sampled strings having it"""
+        sample = pd.Series(list(values[:sample_size]), dtype=object)
+        sample = sample[sample.map(type) == str]
+        if sample.empty:
+            return None, 0.0
+        pattern_counts = sample.str.translate(_regex_shape_table()).value_counts(sort=False)
+        pattern = pattern_counts.idxmax()
+        return pattern, round(pattern_counts[pattern] / len(sample), 4)
 
     def profile_column(self, series: pd.Series, total_rows: int) -> dict:
-        non_null_series = series.dropna()
-        n_unique = non_null_series.nunique()
+        # One hash pass gives distinct values (in order of appearance), their
+        # frequencies and the non-null count; everything else derives from it.
+        counts = series.value_counts(dropna=True, sort=False)
         data_type = self.infer_data_type(series)
+        head = None
+        if data_type == "string":
+            head = series.iloc[:1000].dropna()
+            if len(head) < 100:
+                head = series.dropna()
+            head = head.iloc[:100]
+        return self.profile_counts(counts, data_type, total_rows, len(series), head)
 
+    def profile_counts(self, counts: pd.Series, data_type: str, total_rows: int, num_values: int, head: pd.Series = None) -> dict:
+        """
+        Profile of a column given its value counts (non-null, in order of
+        first appearance), its length and, for strings, its first 100
+        non-null values; lets profiles be built from accumulated counts.
+        """
+        n_unique = len(counts)
         profile = {
             "data_type": str(data_type),
             "is_unique": bool(n_unique == total_rows),
-            "is_complete": bool(series.isnull().sum() == 0),
+            "is_complete": bool(counts.sum() == num_values),
             "is_categorical": bool((n_unique < 0.1 * total_rows) and (data_type in ["string", "int"])),
             "num_unique_values": float(n_unique),
-            "sample_values": [str(v) for v in non_null_series.unique()[:5]]
+            "sample_values": [str(v) for v in counts.index[:5]]
         }
-        if data_type in ["string", "int"]:
-            profile["entropy"] = self.compute_entropy(non_null_series.astype(str).tolist())
-        if data_type == "string":
-            profile["regex_pattern"] = self.infer_regex_pattern(non_null_series.tolist())
+        if data_type in ["int", "float"] and n_unique:
+            profile["min_value"] = float(counts.index.min())
+            profile["max_value"] = float(counts.index.max())
+        if data_type == "int":
+            profile["entropy"] = self.compute_entropy_from_counts(counts.to_numpy())
+        elif data_type == "string":
+            if counts.index.dtype == object and not all(type(v) is str for v in counts.index):
+                # values with the same text (1 and "1") count as one symbol
+                counts = counts.groupby(counts.index.astype(str), sort=False).sum()
+            profile["entropy"] = self.compute_entropy_from_counts(counts.to_numpy())
+            profile["regex_pattern"], profile["regex_pattern_share"] = self.infer_regex_shape(head)
+        if self.approximate:
+            profile["minhash"] = MinHashSketch.from_series(pd.Series(counts.index), self.num_perm)
 
         return profile
 
@@ -81,6 +153,7 @@ class CoreDataEngine:
     #         result[os.path.basename(file)] = self.profile_table(file)
     #     return result
 
+    @metrics.timed("primary_keys")
     def detect_primary_keys(self, profile_data):
         table_keys = {}
         for table, meta in profile_data.items():
@@ -95,10 +168,20 @@ class CoreDataEngine:
 
             table_keys[table] = {
                 "primary_keys": primary_keys,
-                "candidate_keys": candidate_keys
+                "candidate_keys": candidate_keys,
+                "composite_keys": []
             }
         return table_keys
 
+    @metrics.timed("composite_keys")
+    def detect_composite_keys(self, df_dict, table_keys):
+        """Fill in minimal multi-column keys of tables without a single-column primary key"""
+        finder = CompositeKeyFinder(self.max_key_width)
+        for table, df in df_dict.items():
+            if not table_keys[table]["primary_keys"]:
+                table_keys[table]["composite_keys"] = [list(cols) for cols in finder.find(df)]
+        return table_keys
+
     # def detect_foreign_keys(self, file_paths, profile_data, table_keys):
     #     dataframes = {os.path.basename(file): pd.read_csv(file) for file in file_paths}
     #     relationships = []
@@ -135,59 +218,692 @@ class CoreDataEngine:
     #                         })
     #     return relationships
 
-    def process_multiple_data(self, csv_data_dict: dict) -> list:
+    def process_multiple_data(self, csv_data_dict: dict, table_hashes: dict = None, progress=None) -> list:
         """
         Args:
             csv_data_dict: Dict of {filename: pd.DataFrame}
+            table_hashes: Optional dict of {filename: content hash} used as cache keys
+            progress: Optional callable progress(counter_name, amount) reporting
+                columns_total / columns_profiled / pairs_compared; it may raise
+                to abort the run
         Returns:
             List of relationship dicts
         """
-        profile_data = self.profile_multiple_dataframes(csv_data_dict)
-        table_keys = self.detect_primary_keys(profile_data)
-        relationships = self.detect_foreign_keys_from_dfs(csv_data_dict, profile_data, table_keys)
+        profile_data, table_keys = self.analyze_tables(csv_data_dict, table_hashes, progress)
+        if self.approximate:
+            relationships = self.detect_foreign_keys_approximate(profile_data, table_keys, csv_data_dict, progress=progress)
+            relationships += self.detect_composite_foreign_keys_approximate(
+                profile_data, table_keys, csv_data_dict, progress=progress
+            )
+        else:
+            relationships = self.detect_foreign_keys_from_dfs(csv_data_dict, profile_data, table_keys, progress=progress)
+            relationships += self.detect_composite_foreign_keys(csv_data_dict, profile_data, table_keys, progress=progress)
         return relationships
 
-    def profile_multiple_dataframes(self, df_dict: dict) -> dict:
+    def analyze_tables(self, df_dict: dict, table_hashes: dict = None, progress=None):
+        """Profile tables and detect their keys, reusing cached results by content hash."""
+        table_hashes = table_hashes or {}
+        cached = {}
+        if self.cache is not None:
+            for fname in df_dict:
+                if table_hashes.get(fname):
+                    entry = self.cache.get(self._cache_key(table_hashes[fname]))
+                    if entry is not None and self._profile_fits(entry["profile"], df_dict[fname]):
+                        cached[fname] = entry
+
+        missing = {fname: df for fname, df in df_dict.items() if fname not in cached}
+        new_profiles = self.profile_multiple_dataframes(missing, progress)
+        new_keys = self.detect_composite_keys(missing, self.detect_primary_keys(new_profiles))
+        if self.cache is not None:
+            for fname in missing:
+                if table_hashes.get(fname):
+                    self.cache.put(self._cache_key(table_hashes[fname]), {
+                        "profile": new_profiles[fname],
+                        "keys": new_keys[fname]
+                    })
+
+        profile_data = {}
+        table_keys = {}
+        for fname in df_dict:
+            if fname in cached:
+                profile_data[fname] = dict(cached[fname]["profile"], table_name=fname)
+                table_keys[fname] = cached[fname]["keys"]
+            else:
+                profile_data[fname] = new_profiles[fname]
+                table_keys[fname] = new_keys[fname]
+        return profile_data, table_keys
+
+    def _profile_fits(self, table_profile, df):
+        # The same bytes can parse to different dtypes depending on the reader
+        # (C engine blocks while streaming, pyarrow or the table store when
+        # loading); a cached profile only describes frames with its column types.
+        columns = table_profile["columns"]
+        return list(columns) == list(df.columns) and all(
+            columns[col]["data_type"] == self.infer_data_type(df[col]) for col in df.columns
+        )
+
+    def _cache_key(self, content_hash):
+        variant = f"minhash{self.num_perm}" if self.approximate else "exact"
+        return f"{content_hash}-{variant}"
+
+    def seed_cache(self, content_hash, table_profile):
+        """
+        Store a table profile computed elsewhere (e.g. while the file was
+        streamed in) so that analyze_tables reuses it for loaded frames with
+        the same column types. Tables without a single-column primary key
+        are left out, their composite key search needs the data. Returns
+        whether the profile was stored.
+        """
+        if self.cache is None:
+            return False
+        table = table_profile["table_name"]
+        keys = self.detect_primary_keys({table: table_profile})[table]
+        if not keys["primary_keys"] and self.max_key_width >= 2:
+            return False
+        self.cache.put(self._cache_key(content_hash), {"profile": table_profile, "keys": keys})
+        return True
+
+    @metrics.timed("profile")
+    def profile_multiple_dataframes(self, df_dict: dict, progress=None, total_rows: dict = None) -> dict:
+        """
+        Profile every column. With total_rows ({filename: row count}) the
+        frames are uniform row samples of larger tables and the profiles
+        are estimates, see SampleProfiler.
+        """
+        if total_rows is not None:
+            sampler = SampleProfiler(self)
+            result = {}
+            for fname, df in df_dict.items():
+                if progress:
+                    progress("columns_total", len(df.columns))
+                result[fname] = sampler.profile_table(fname, df, total_rows[fname])
+                if progress:
+                    progress("columns_profiled", len(df.columns))
+                metrics.count("rows_sampled", len(df))
+                metrics.count("columns_profiled", len(df.columns))
+            return result
+
+        profiler = ParallelProfiler(self, self.workers, self.parallel_min_cells, self.parallel_start_method)
+        column_profiles = profiler.profile_columns(df_dict, progress)
         result = {}
         for fname, df in df_dict.items():
-            total_rows = len(df)
             result[fname] = {
                 "table_name": fname,
-                "num_rows": total_rows,
-                "columns": {
-                    col: self.profile_column(df[col], total_rows) for col in df.columns
-                }
+                "num_rows": len(df),
+                "columns": column_profiles[fname]
             }
+            metrics.count("rows_profiled", len(df))
+            metrics.count("columns_profiled", len(df.columns))
         return result
 
-    def detect_foreign_keys_from_dfs(self, df_dict: dict, profile_data: dict, table_keys: dict) -> list:
+    def process_sampled(self, samples: dict, total_rows: dict, column_loader, threshold: float = 0.8, progress=None):
+        """
+        Sampling mode for inputs too large to profile exactly.
+
+        Args:
+            samples: Dict of {filename: uniform row sample}, e.g. from FileHandler.sample_csv
+            total_rows: Dict of {filename: row count of the whole table}
+            column_loader: Callable column_loader(filename, columns) returning
+                the full data of those columns
+            progress: Optional progress callable, see process_multiple_data
+        Returns:
+            (list of relationship dicts, profile_data, table_keys)
+        """
+        profile_data = self.profile_multiple_dataframes(samples, progress, total_rows)
+        frames = self.verify_finalists(profile_data, column_loader, threshold)
+        table_keys = self.detect_primary_keys(profile_data)
+        relationships = self.detect_foreign_keys_from_dfs(frames, profile_data, table_keys, threshold, progress=progress)
+        relationships += self.detect_sampled_composite_foreign_keys(
+            samples, frames, table_keys, column_loader, threshold, progress
+        )
+        return relationships, profile_data, table_keys
+
+    @metrics.timed("composite_foreign_keys")
+    def detect_sampled_composite_foreign_keys(self, samples: dict, frames: dict, table_keys: dict, column_loader, threshold: float = 0.8, progress=None) -> list:
+        """
+        Composite keys and foreign keys in sampling mode, each verified on all rows.
+
+        Composite keys are the minimal ones of each sample (of tables
+        without a single-column key) that are still unique on the full
+        columns; keys needing a column that is unique on the sample alone
+        are not found. Columns whose sampled values are included in a key
+        component at half the threshold stand in for it, and their
+        combinations are checked on the full columns. frames holds the full
+        columns loaded so far and is extended.
+        """
+        finder = CompositeKeyFinder(self.max_key_width)
+
+        def load(table, columns):
+            missing = [col for col in columns if col not in frames[table].columns]
+            if missing:
+                loaded = column_loader(table, missing)
+                frames[table] = pd.concat([frames[table], loaded], axis=1) if len(frames[table].columns) else loaded
+            return frames[table][list(columns)]
+
+        with metrics.stage("composite_keys"):
+            for table, sample in samples.items():
+                if table_keys[table]["primary_keys"]:
+                    continue
+                table_keys[table]["composite_keys"] = []
+                for cols in finder.find(sample):
+                    full = load(table, cols)
+                    if full.notna().all(axis=None) and not full.duplicated().any():
+                        table_keys[table]["composite_keys"].append(list(cols))
+                    else:
+                        metrics.count("composite_keys_rejected")
+
+        composite = [(table, cols) for table in samples for cols in table_keys[table].get("composite_keys", [])]
+        if not composite:
+            return []
+        index = InclusionIndex()
+        for table, col in dict.fromkeys((table, col) for table, cols in composite for col in cols):
+            index.add_key(table, col, load(table, [col])[col].dropna())
+
         relationships = []
+        pairs_compared = 0
+        for from_table, sample in samples.items():
+            to_tables = {table for table, _ in composite if table != from_table}
+            if not to_tables:
+                continue
+            stand_ins = {}
+            for from_col in sample.columns:
+                found = index.find_inclusions(from_table, from_col, sample[from_col].dropna(), threshold / 2, to_tables)
+                for to_table, to_col, _ in found:
+                    stand_ins.setdefault((to_table, to_col), []).append(from_col)
+            for to_table, key_cols in composite:
+                if to_table not in to_tables:
+                    continue
+                for from_cols in product(*(stand_ins.get((to_table, col), []) for col in key_cols)):
+                    if len(set(from_cols)) < len(from_cols):
+                        continue
+                    pairs_compared += 1
+                    overlap_ratio = self._tuple_containment(
+                        load(from_table, from_cols), list(from_cols), load(to_table, key_cols), key_cols
+                    )
+                    if overlap_ratio is not None and overlap_ratio > threshold:
+                        relationships.append(self._composite_relationship(from_table, from_cols, to_table, key_cols, overlap_ratio))
+
+        metrics.count("fk_pairs_compared", pairs_compared)
+        if progress:
+            progress("pairs_compared", pairs_compared)
+        return relationships
+
+    @metrics.timed("verify_finalists")
+    def verify_finalists(self, profile_data: dict, column_loader, threshold: float = 0.8) -> dict:
+        """
+        Replace estimated profiles by exact ones for the columns that matter:
+        columns unique on their sample (primary-key candidates), then columns
+        that could still reference one of the confirmed keys. Only those
+        columns are loaded; returns {filename: DataFrame of loaded columns}.
+        """
+        sampler = SampleProfiler(self)
+        frames = {table: pd.DataFrame() for table in profile_data}
+
+        def verify(table, columns):
+            columns = [col for col in columns if col not in frames[table].columns]
+            if not columns:
+                return
+            loaded = column_loader(table, columns)
+            num_rows = profile_data[table]["num_rows"]
+            for col in columns:
+                profile_data[table]["columns"][col] = sampler.exact_profile(loaded[col], num_rows)
+            frames[table] = pd.concat([frames[table], loaded], axis=1) if len(frames[table].columns) else loaded
+            metrics.count("columns_verified", len(columns))
+
+        for table, meta in profile_data.items():
+            verify(table, [col for col, props in meta["columns"].items() if props["is_unique"]])
+
+        # Key profiles are exact now; a referencing column only needs to pass
+        # the type and cardinality checks, using the lowest distinct count its
+        # sample allows
+        table_keys = self.detect_primary_keys(profile_data)
+        keys = [(table, col) for table in profile_data for col in table_keys[table]["primary_keys"]]
+        conservative = {
+            table: dict(meta, columns={
+                col: {
+                    "data_type": props["data_type"],
+                    "num_unique_values": props.get("bounds", {}).get("num_unique_values", [props["num_unique_values"]])[0]
+                } if not props.get("exact", {}).get("num_unique_values", True) else props
+                for col, props in meta["columns"].items()
+            })
+            for table, meta in profile_data.items()
+        }
+        pruner = CandidatePruner(conservative, threshold, bloom_sample=0)
+        for table, meta in profile_data.items():
+            targets = [key for key in keys if key[0] != table]
+            verify(table, [
+                col for col, props in meta["columns"].items()
+                if not props["is_unique"] and pruner.surviving_keys(table, col, pd.Series(dtype=object), targets, None)
+            ])
+        return frames
+
+    @metrics.timed("foreign_keys")
+    def detect_foreign_keys_from_dfs(self, df_dict: dict, profile_data: dict, table_keys: dict, threshold: float = 0.8, changed_tables: set = None, progress=None) -> list:
+        """
+        Exact foreign-key detection. With changed_tables only pairs that
+        involve at least one of those tables are evaluated. With a
+        normalizer, columns are compared by their normalized value hashes.
+        """
+        all_keys = [(table, pk_col) for table in df_dict for pk_col in table_keys[table]["primary_keys"]]
+        value_hashes = None
+        if self.normalizer is not None:
+            normalized = {}
+
+            def value_hashes(column):
+                if column not in normalized:
+                    with metrics.stage("value_normalization"):
+                        normalized[column] = self.normalizer.hash_distinct(df_dict[column[0]][column[1]])
+                return normalized[column]
+
+        pruner = CandidatePruner(profile_data, threshold, value_hashes=value_hashes) if self.prune_candidates else None
+
+        def key_series(key):
+            return df_dict[key[0]][key[1]].dropna()
+
+        changed_have_keys = changed_tables is not None and any(
+            table_keys[t]["primary_keys"] for t in changed_tables
+        )
+
+        # Plan which (column, key) pairs need an intersection at all
+        plan = []
+        pairs_compared = 0
         for from_table, df_from in df_dict.items():
+            to_tables = None
+            if changed_tables is not None and from_table not in changed_tables:
+                if not changed_have_keys:
+                    continue
+                to_tables = changed_tables
+            targets = [
+                key for key in all_keys
+                if key[0] != from_table and (to_tables is None or key[0] in to_tables)
+            ]
+
             for from_col in df_from.columns:
                 from_profile = profile_data[from_table]["columns"][from_col]
                 if from_profile["is_unique"]:
                     continue
+                allowed = None
+                if pruner is not None:
+                    allowed = set(pruner.surviving_keys(
+                        from_table, from_col, df_from[from_col].dropna(), targets, key_series
+                    ))
+                n_pairs = len(targets) if allowed is None else len(allowed)
+                pairs_compared += n_pairs
+                if progress:
+                    progress("pairs_compared", n_pairs)
+                if n_pairs:
+                    plan.append((from_table, from_col, to_tables, allowed))
+
+        # Index only keys that some column still has to be compared with
+        needed = None
+        if pruner is not None:
+            needed = set().union(*(allowed for _, _, _, allowed in plan))
 
-                from_values = set(df_from[from_col].dropna())
+        # Encode every compared column into one integer code space in a single
+        # pass; the dictionary is dropped afterwards, only the codes are kept
+        columns = list(dict.fromkeys(
+            [key for key in all_keys if needed is None or key in needed]
+            + [(from_table, from_col) for from_table, from_col, _, _ in plan]
+        ))
+        with metrics.stage("value_encoding"):
+            if value_hashes is not None:
+                values = [pd.Series(value_hashes(column)) for column in columns]
+            else:
+                values = [df_dict[t][c] for t, c in columns]
+            encoded = dict(zip(columns, ValueDictionary().add_many(values)))
+        key_index = InclusionIndex.from_dataframes(df_dict, table_keys, needed, codes=encoded)
 
-                for to_table, df_to in df_dict.items():
-                    if from_table == to_table:
+        relationships = []
+        for from_table, from_col, to_tables, allowed in plan:
+            matches = key_index.find_inclusions(
+                from_table, from_col, None, threshold, to_tables, allowed, codes=encoded[(from_table, from_col)]
+            )
+            for to_table, pk_col, overlap_ratio in matches:
+                relationships.append({
+                    "from_table": from_table,
+                    "from_column": from_col,
+                    "to_table": to_table,
+                    "to_column": pk_col,
+                    "confidence": round(overlap_ratio, 4)
+                })
+        metrics.count("fk_pairs_compared", pairs_compared)
+        if pruner is not None:
+            self.last_pruning_stats = dict(pruner.stats)
+            for name in CandidatePruner.filters:
+                metrics.count(f"fk_pairs_pruned_{name}", pruner.stats[name])
+        return relationships
+
+    @metrics.timed("composite_foreign_keys")
+    def detect_composite_foreign_keys(self, df_dict: dict, profile_data: dict, table_keys: dict, threshold: float = 0.8, changed_tables: set = None, progress=None) -> list:
+        """
+        Match column combinations against composite keys.
+
+        Each key component is indexed like a primary key; a column can only
+        stand in for a component it is (mostly) included in, so just the
+        combinations of such columns are checked on whole tuples. Like
+        single-column detection, combinations that are unique in their own
+        table are skipped. The from/to columns are joined with "+" and also
+        listed in from_columns / to_columns.
+        """
+        composite = [
+            (table, cols) for table in df_dict
+            for cols in table_keys[table].get("composite_keys", [])
+        ]
+        if not composite:
+            return []
+
+        components = list(dict.fromkeys((table, col) for table, cols in composite for col in cols))
+        index = InclusionIndex()
+        for table, col in components:
+            index.add_key(table, col, df_dict[table][col].dropna())
+        pruner = CandidatePruner(profile_data, threshold) if self.prune_candidates else None
+
+        def key_series(key):
+            return df_dict[key[0]][key[1]].dropna()
+
+        relationships = []
+        pairs_compared = 0
+        for from_table, df_from in df_dict.items():
+            to_tables = {
+                table for table, _ in composite
+                if table != from_table and (changed_tables is None or from_table in changed_tables or table in changed_tables)
+            }
+            if not to_tables:
+                continue
+            targets = [key for key in components if key[0] in to_tables]
+
+            # which columns may stand in for which key component
+            stand_ins = {}
+            for from_col in df_from.columns:
+                values = df_from[from_col].dropna()
+                allowed = None
+                if pruner is not None:
+                    allowed = set(pruner.surviving_keys(from_table, from_col, values, targets, key_series))
+                    if not allowed:
+                        continue
+                for to_table, to_col, _ in index.find_inclusions(from_table, from_col, values, threshold, to_tables, allowed):
+                    stand_ins.setdefault((to_table, to_col), []).append(from_col)
+
+            for to_table, key_cols in composite:
+                if to_table not in to_tables:
+                    continue
+                for from_cols in product(*(stand_ins.get((to_table, col), []) for col in key_cols)):
+                    if len(set(from_cols)) < len(from_cols):
                         continue
+                    pairs_compared += 1
+                    overlap_ratio = self._tuple_containment(df_from, list(from_cols), df_dict[to_table], key_cols)
+                    if overlap_ratio is not None and overlap_ratio > threshold:
+                        relationships.append(self._composite_relationship(from_table, from_cols, to_table, key_cols, overlap_ratio))
 
-                    for pk_col in table_keys[to_table]["primary_keys"]:
-                        to_values = set(df_to[pk_col].dropna())
-                        if not from_values or not to_values:
-                            continue
-
-                        common = from_values & to_values
-                        overlap_ratio = len(common) / len(from_values)
-
-                        if overlap_ratio > 0.8:
-                            relationships.append({
-                                "from_table": from_table,
-                                "from_column": from_col,
-                                "to_table": to_table,
-                                "to_column": pk_col,
-                                "confidence": round(overlap_ratio, 4)
-                            })
+        metrics.count("fk_pairs_compared", pairs_compared)
+        if progress:
+            progress("pairs_compared", pairs_compared)
         return relationships
+
+    @metrics.timed("composite_foreign_keys")
+    def detect_composite_foreign_keys_approximate(self, profile_data: dict, table_keys: dict, df_dict: dict, threshold: float = 0.8, progress=None) -> list:
+        """
+        Composite foreign keys from MinHash sketches, as in approximate mode.
+
+        Stand-ins for each key component come from LSH over the components'
+        column sketches instead of an exact inclusion index; each
+        combination of stand-ins is then compared by a sketch of its distinct
+        tuples against one of the key's tuples, so every table is hashed once
+        per candidate combination rather than joined. Results carry
+        estimated_confidence / error_bound; the verify_top best are
+        re-checked on the actual tuples.
+        """
+        composite = [
+            (table, cols) for table in df_dict
+            for cols in table_keys[table].get("composite_keys", [])
+        ]
+        if not composite:
+            return []
+
+        components = list(dict.fromkeys((table, col) for table, cols in composite for col in cols))
+        lsh = ContainmentLSH(self.num_perm, threshold)
+        for i, (table, col) in enumerate(components):
+            lsh.add(i, profile_data[table]["columns"][col]["minhash"])
+        key_sketches = {}
+
+        candidates = []
+        pairs_compared = 0
+        for from_table, df_from in df_dict.items():
+            stand_ins = {}
+            for from_col, from_profile in profile_data[from_table]["columns"].items():
+                sketch = from_profile["minhash"]
+                for i in lsh.query(sketch):
+                    to_table, to_col = components[i]
+                    if to_table == from_table:
+                        continue
+                    estimate, bound = sketch.containment(profile_data[to_table]["columns"][to_col]["minhash"])
+                    if estimate + bound > threshold:
+                        stand_ins.setdefault((to_table, to_col), []).append(from_col)
+
+            for to_table, key_cols in composite:
+                if to_table == from_table:
+                    continue
+                for from_cols in product(*(stand_ins.get((to_table, col), []) for col in key_cols)):
+                    if len(set(from_cols)) < len(from_cols):
+                        continue
+                    hashes = self._tuple_hashes(df_from[list(from_cols)])
+                    if not len(hashes) or len(hashes) == len(df_from):
+                        continue  # unique in its own table: a key, not a reference
+                    pairs_compared += 1
+                    key = (to_table, tuple(key_cols))
+                    if key not in key_sketches:
+                        key_sketches[key] = MinHashSketch.from_hashes(
+                            self._tuple_hashes(df_dict[to_table][key_cols]), self.num_perm
+                        )
+                    estimate, bound = MinHashSketch.from_hashes(hashes, self.num_perm).containment(key_sketches[key])
+                    if estimate + bound > threshold:
+                        candidates.append(dict(
+                            self._composite_relationship(from_table, from_cols, to_table, key_cols, estimate),
+                            estimated_confidence=estimate, error_bound=bound, verified=False
+                        ))
+
+        metrics.count("fk_pairs_compared", pairs_compared)
+        if progress:
+            progress("pairs_compared", pairs_compared)
+
+        if self.verify_top:
+            ranked = sorted(candidates, key=lambda rel: rel["estimated_confidence"], reverse=True)
+            for rel in ranked[:self.verify_top]:
+                overlap_ratio = self._tuple_containment(
+                    df_dict[rel["from_table"]], rel["from_columns"], df_dict[rel["to_table"]], rel["to_columns"]
+                )
+                rel["confidence"] = round(overlap_ratio or 0.0, 4)
+                rel["verified"] = True
+        return [rel for rel in candidates if rel["confidence"] > threshold]
+
+    @staticmethod
+    def _tuple_hashes(frame):
+        # distinct uint64 hashes of complete rows; integral floats hash like ints,
+        # as they compare equal in the exact join
+        frame = frame.dropna()
+        for col in frame.columns:
+            if pd.api.types.is_float_dtype(frame[col]) and (frame[col] % 1 == 0).all():
+                frame = frame.astype({col: "int64"})
+        return np.unique(pd.util.hash_pandas_object(frame, index=False).to_numpy())
+
+    @staticmethod
+    def _composite_relationship(from_table, from_cols, to_table, key_cols, overlap_ratio):
+        return {
+            "from_table": from_table,
+            "from_column": "+".join(from_cols),
+            "to_table": to_table,
+            "to_column": "+".join(key_cols),
+            "confidence": round(overlap_ratio, 4),
+            "from_columns": list(from_cols),
+            "to_columns": list(key_cols)
+        }
+
+    def _tuple_containment(self, df_from, from_cols, df_to, key_cols):
+        # share of distinct from_cols tuples present in the key, None if not comparable
+        from_tuples = df_from[from_cols].dropna().drop_duplicates()
+        if from_tuples.empty or len(from_tuples) == len(df_from):
+            return None
+        positions = list(range(len(key_cols)))
+        try:
+            matched = len(from_tuples.set_axis(positions, axis=1).merge(
+                df_to[key_cols].set_axis(positions, axis=1), on=positions, how="inner"
+            ))
+        except (TypeError, ValueError):
+            # e.g. text vs numeric join columns
+            return None
+        return matched / len(from_tuples)
+
+    def process_incremental(self, df_dict: dict, previous_state: dict = None, table_hashes: dict = None, progress=None):
+        """
+        Re-analyse a model after tables were added or replaced.
+
+        Only new or changed tables (unknown name, or a different content hash)
+        are profiled, and only column/key pairs involving them are compared;
+        profiles, keys and relationships of the other tables come from
+        previous_state. The result equals a full process_multiple_data run
+        with exact detection.
+
+        Args:
+            df_dict: Dict of {filename: pd.DataFrame} for every table in the model
+            previous_state: State returned by the previous call, or None
+            table_hashes: Optional dict of {filename: content hash}
+            progress: Optional progress callable, see process_multiple_data
+        Returns:
+            (list of relationship dicts, new state dict)
+        """
+        previous_state = previous_state or {}
+        table_hashes = table_hashes or {}
+        prev_tables = previous_state.get("tables", {})
+        prev_profiles = previous_state.get("profiles", {})
+        prev_keys = previous_state.get("table_keys", {})
+
+        changed = {
+            table for table in df_dict
+            if table not in prev_tables or table not in prev_profiles
+            or (table_hashes.get(table) and table_hashes[table] != prev_tables[table])
+        }
+
+        new_profiles, new_keys = self.analyze_tables(
+            {table: df_dict[table] for table in df_dict if table in changed}, table_hashes, progress
+        )
+        profile_data = {}
+        table_keys = {}
+        for table in df_dict:
+            if table in changed:
+                profile_data[table] = self._portable_profile(new_profiles[table])
+                table_keys[table] = new_keys[table]
+            else:
+                profile_data[table] = prev_profiles[table]
+                table_keys[table] = prev_keys[table]
+
+        kept = [
+            rel for rel in previous_state.get("relationships", [])
+            if rel["from_table"] in df_dict and rel["to_table"] in df_dict
+            and rel["from_table"] not in changed and rel["to_table"] not in changed
+        ]
+        detected = []
+        if changed:
+            detected = self.detect_foreign_keys_from_dfs(
+                df_dict, profile_data, table_keys, changed_tables=changed, progress=progress
+            )
+            detected += self.detect_composite_foreign_keys(
+                df_dict, profile_data, table_keys, changed_tables=changed, progress=progress
+            )
+
+        # same order a full recomputation would produce: single-column
+        # relationships first, then composite ones
+        table_pos = {table: i for i, table in enumerate(df_dict)}
+        column_pos = {table: {col: i for i, col in enumerate(df.columns)} for table, df in df_dict.items()}
+        key_pos = {table: {col: i for i, col in enumerate(keys["primary_keys"])} for table, keys in table_keys.items()}
+        composite_pos = {
+            table: {"+".join(cols): i for i, cols in enumerate(keys.get("composite_keys", []))}
+            for table, keys in table_keys.items()
+        }
+
+        def order(rel):
+            from_table, to_table = rel["from_table"], rel["to_table"]
+            if "from_columns" in rel:
+                return (1, table_pos[from_table], table_pos[to_table],
+                        composite_pos[to_table].get(rel["to_column"], -1),
+                        tuple(column_pos[from_table].get(col, -1) for col in rel["from_columns"]))
+            return (0, table_pos[from_table], column_pos[from_table].get(rel["from_column"], -1),
+                    table_pos[to_table], key_pos[to_table].get(rel["to_column"], -1))
+
+        relationships = sorted(kept + detected, key=order)
+
+        state = {
+            "tables": {table: table_hashes.get(table) or prev_tables.get(table) for table in df_dict},
+            "profiles": profile_data,
+            "table_keys": table_keys,
+            "relationships": relationships
+        }
+        return relationships, state
+
+    def _portable_profile(self, table_profile):
+        # drop in-memory sketches so the state stays JSON-serialisable
+        columns = {
+            col: {k: v for k, v in props.items() if k != "minhash"}
+            for col, props in table_profile["columns"].items()
+        }
+        return dict(table_profile, columns=columns)
+
+    @metrics.timed("foreign_keys_approximate")
+    def detect_foreign_keys_approximate(self, profile_data: dict, table_keys: dict, df_dict: dict = None, threshold: float = 0.8, progress=None) -> list:
+        """
+        Foreign-key discovery from per-column MinHash sketches.
+
+        LSH picks the likely (column, key) pairs, so work grows roughly
+        linearly with the number of columns. Each relationship carries the
+        estimated containment and its error bound; when df_dict is given the
+        verify_top best candidates are re-checked on the actual values.
+        """
+        lsh = ContainmentLSH(self.num_perm, threshold)
+        keys = []
+        for table, meta in profile_data.items():
+            for pk_col in table_keys[table]["primary_keys"]:
+                lsh.add(len(keys), meta["columns"][pk_col]["minhash"])
+                keys.append((table, pk_col))
+
+        candidates = []
+        for from_table, meta in profile_data.items():
+            for from_col, from_profile in meta["columns"].items():
+                if from_profile["is_unique"]:
+                    continue
+                sketch = from_profile["minhash"]
+                key_ids = sorted(lsh.query(sketch))
+                metrics.count("fk_pairs_compared", len(key_ids))
+                if progress:
+                    progress("pairs_compared", len(key_ids))
+                for key_id in key_ids:
+                    to_table, pk_col = keys[key_id]
+                    if to_table == from_table:
+                        continue
+                    key_sketch = profile_data[to_table]["columns"][pk_col]["minhash"]
+                    estimate, bound = sketch.containment(key_sketch)
+                    if estimate + bound > threshold:
+                        candidates.append({
+                            "from_table": from_table,
+                            "from_column": from_col,
+                            "to_table": to_table,
+                            "to_column": pk_col,
+                            "confidence": estimate,
+                            "estimated_confidence": estimate,
+                            "error_bound": bound,
+                            "verified": False
+                        })
+
+        if df_dict is not None and self.verify_top:
+            ranked = sorted(candidates, key=lambda rel: rel["estimated_confidence"], reverse=True)
+            dictionary = ValueDictionary()
+            key_codes = {}
+            for rel in ranked[:self.verify_top]:
+                to_key = (rel["to_table"], rel["to_column"])
+                if to_key not in key_codes:
+                    key_codes[to_key] = dictionary.add(df_dict[rel["to_table"]][rel["to_column"]])
+                n_distinct, from_codes = dictionary.lookup(df_dict[rel["from_table"]][rel["from_column"]])
+                shared = np.isin(from_codes, key_codes[to_key], assume_unique=True).sum()
+                overlap_ratio = shared / n_distinct
+                rel["confidence"] = round(overlap_ratio, 4)
+                rel["verified"] = True
+
+        return [rel for rel in candidates if rel["confidence"] > threshold]
@@ -0,0 +1,111 @@
+import numpy as np
+from collections import Counter
+from core.value_dictionary import ValueDictionary
+
+_OWNER_BITS = 20
+
+
+class InclusionIndex:
+    """
+    Inverted value index over every primary-key column of an upload.
+
+    Key values are dictionary-encoded into one integer code space (see
+    ValueDictionary), so the index is a single sorted int64 array of
+    code << 20 | key id entries. A candidate foreign-key column is counted
+    against all keys at once with searchsorted/bincount on its own codes.
+
+    Keys and columns can be passed pre-encoded (codes=..., sorted distinct
+    codes from the same dictionary); raw values are encoded with the
+    index's dictionary, keys in one batch on the first probe.
+    """
+
+    def __init__(self, dictionary=None):
+        self.dictionary = dictionary if dictionary is not None else ValueDictionary()
+        self.keys = []            # [(table, column)] in registration order
+        self.key_sizes = []       # distinct non-null values per key
+        self._pending = []        # (key id, values) not encoded yet
+        self._entries = np.empty(0, dtype=np.int64)
+
+    def add_key(self, table, column, values=None, codes=None):
+        key_id = len(self.keys)
+        if key_id >= 1 << _OWNER_BITS:
+            raise ValueError("Too many key columns for one inclusion index")
+        self.keys.append((table, column))
+        self.key_sizes.append(0)
+        if codes is None:
+            self._pending.append((key_id, values))
+        else:
+            self._insert([key_id], [codes])
+        return key_id
+
+    def _insert(self, key_ids, encoded):
+        for key_id, codes in zip(key_ids, encoded):
+            self.key_sizes[key_id] = len(codes)
+        entries = [self._entries] + [(codes << _OWNER_BITS) | key_id for key_id, codes in zip(key_ids, encoded)]
+        self._entries = np.concatenate(entries)
+        self._entries.sort()
+
+    def _encode_pending(self):
+        if self._pending:
+            key_ids = [key_id for key_id, _ in self._pending]
+            encoded = self.dictionary.add_many([values for _, values in self._pending])
+            self._pending = []
+            self._insert(key_ids, encoded)
+
+    @classmethod
+    def from_dataframes(cls, df_dict, table_keys, only=None, codes=None):
+        """
+        Index every primary key, or only the (table, column) keys in only.
+        codes: optional {(table, column): codes} of pre-encoded keys.
+        """
+        index = cls()
+        for table, df in df_dict.items():
+            for pk_col in table_keys[table]["primary_keys"]:
+                if only is None or (table, pk_col) in only:
+                    if codes is not None and (table, pk_col) in codes:
+                        index.add_key(table, pk_col, codes=codes[(table, pk_col)])
+                    else:
+                        index.add_key(table, pk_col, df[pk_col])
+        index._encode_pending()
+        return index
+
+    def probe(self, values=None, codes=None):
+        """Return (number of distinct values, {key_id: shared value count})."""
+        self._encode_pending()
+        if codes is None:
+            n_distinct, codes = self.dictionary.lookup(values)
+        else:
+            n_distinct = len(codes)
+        if not len(codes) or not len(self._entries):
+            return n_distinct, Counter()
+        start = np.searchsorted(self._entries, codes << _OWNER_BITS, side="left")
+        stop = np.searchsorted(self._entries, (codes + 1) << _OWNER_BITS, side="left")
+        lengths = stop - start
+        total = int(lengths.sum())
+        if not total:
+            return n_distinct, Counter()
+        # positions of every (value, key) match, i.e. the concatenated [start, stop) ranges
+        positions = np.repeat(start - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        owners = self._entries[positions] & ((1 << _OWNER_BITS) - 1)
+        counts = np.bincount(owners, minlength=len(self.keys))
+        return n_distinct, Counter({int(k): int(counts[k]) for k in np.flatnonzero(counts)})
+
+    def find_inclusions(self, table, column, values=None, threshold=0.8, to_tables=None, keys=None, codes=None):
+        """
+        Yield (to_table, to_column, overlap_ratio) for keys above threshold,
+        optionally only for keys of the tables in to_tables or for the
+        (table, column) keys in keys.
+        """
+        n_distinct, hits = self.probe(values, codes)
+        if not n_distinct:
+            return
+        for key_id, (to_table, to_column) in enumerate(self.keys):
+            if to_table == table or not self.key_sizes[key_id]:
+                continue
+            if to_tables is not None and to_table not in to_tables:
+                continue
+            if keys is not None and (to_table, to_column) not in keys:
+                continue
+            overlap_ratio = hits.get(key_id, 0) / n_distinct
+            if overlap_ratio > threshold:
+                yield to_table, to_column, overlap_ratio
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+from utils.metrics import metrics
+
+# Bump whenever the per-relationship report changes, so cached ones are recomputed.
+REPORT_VERSION = "1"
+
+# fan-out histogram buckets: referencing rows per key value
+_FAN_OUT_EDGES = [0, 1, 2, 10, 100, 1000, np.inf]
+_FAN_OUT_LABELS = ["0", "1", "2-9", "10-99", "100-999", "1000+"]
+
+
+class _KeyLookup:
+    """Position of each referencing value (or tuple) among a key's distinct values"""
+
+    def __init__(self, key_frame, normalizer=None):
+        values = key_frame.dropna()
+        self.rows = len(values)
+        self.normalizer = normalizer if key_frame.shape[1] == 1 else None
+        if key_frame.shape[1] > 1:
+            self.index = pd.MultiIndex.from_frame(values.drop_duplicates())
+        elif self.normalizer is not None:
+            self.index = pd.Index(pd.unique(self.normalizer.hash_values(values.iloc[:, 0])))
+        else:
+            self.index = pd.Index(values.iloc[:, 0].unique())
+
+    def __len__(self):
+        return len(self.index)
+
+    def hashes(self, frame):
+        """uint64 identity of each row, used to count distinct orphans"""
+        if self.normalizer is not None:
+            return self.normalizer.hash_values(frame.iloc[:, 0])
+        return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+    def positions(self, frame):
+        """(positions in the key, -1 if absent; value hashes or None)"""
+        if self.normalizer is not None:
+            hashes = self.normalizer.hash_values(frame.iloc[:, 0])
+            return self.index.get_indexer(hashes), hashes
+        try:
+            if frame.shape[1] > 1:
+                return self.index.get_indexer(pd.MultiIndex.from_frame(frame)), None
+            return self.index.get_indexer(frame.iloc[:, 0]), None
+        except (TypeError, ValueError):
+            # e.g. text vs numeric columns: nothing matches
+            return np.full(len(frame), -1), None
+
+
+class IntegrityChecker:
+    """
+    Row-level referential-integrity report of detected relationships.
+
+    For each relationship the referencing column(s) are matched against
+    the key's distinct values with one vectorized get_indexer per block
+    of chunk_rows rows. With a block_loader the referencing side is read
+    block by block, so besides the key only one block and a counter per
+    distinct key value are in memory. The report gives:
+
+    - null_rows / orphan_rows: referencing rows without a value, or
+      whose value is not in the key; orphan_values counts distinct ones
+      and orphan_samples lists a few
+    - fan_out: referencing rows per key value (statistics over the
+      referenced values, histogram over all of them)
+    - cardinality: "1:1" if every key value is referenced at most once,
+      "1:N" if more often, "N:M" if the key column itself has duplicates
+
+    With a normalizer (see ValueNormalizer), single-column relationships
+    are matched on normalized values, as detection did.
+    """
+
+    def __init__(self, chunk_rows=1_000_000, sample_size=10, normalizer=None):
+        self.chunk_rows = chunk_rows
+        self.sample_size = sample_size
+        self.normalizer = normalizer
+
+    def cache_key(self, rel, table_hashes):
+        """Key of a relationship's report, None when a table's content hash is unknown"""
+        from_hash, to_hash = table_hashes.get(rel["from_table"]), table_hashes.get(rel["to_table"])
+        if not from_hash or not to_hash:
+            return None
+        normalizer = self.normalizer.settings() if self.normalizer is not None else None
+        identity = [REPORT_VERSION, self.sample_size, normalizer, rel["from_table"], self._columns(rel, "from"),
+                    rel["to_table"], self._columns(rel, "to"), from_hash, to_hash]
+        return hashlib.sha1(json.dumps(identity).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _columns(rel, side):
+        return rel.get(f"{side}_columns") or [rel[f"{side}_column"]]
+
+    @metrics.timed("integrity_report")
+    def report(self, relationships, column_loader, table_hashes=None, cached=None, block_loader=None):
+        """
+        Check every relationship.
+
+        column_loader(table, columns) returns a DataFrame of those columns;
+        each key is loaded once for all relationships that reference it.
+        block_loader(table, columns, rows), if given, yields the referencing
+        columns in DataFrames of up to rows rows instead.
+        cached: {cache key: report} from an earlier call, reused for tables
+        whose content hash is unchanged.
+        Returns (reports in relationship order, {cache key: report}).
+        """
+        table_hashes = table_hashes or {}
+        cached = cached or {}
+        results = [None] * len(relationships)
+        entries = {}
+        groups = {}
+        for i, rel in enumerate(relationships):
+            key = self.cache_key(rel, table_hashes)
+            if key is not None and key in cached:
+                results[i] = entries[key] = cached[key]
+                metrics.count("integrity_reports_cached")
+            else:
+                groups.setdefault((rel["to_table"], tuple(self._columns(rel, "to"))), []).append((i, key))
+
+        for (to_table, to_columns), members in groups.items():
+            try:
+                lookup = _KeyLookup(column_loader(to_table, list(to_columns)), self.normalizer)
+            except (KeyError, ValueError, OSError) as e:
+                for i, _ in members:
+                    results[i] = self._describe(relationships[i], error=str(e))
+                continue
+            for i, key in members:
+                rel = relationships[i]
+                try:
+                    if block_loader is not None:
+                        frame = block_loader(rel["from_table"], self._columns(rel, "from"), self.chunk_rows)
+                    else:
+                        frame = column_loader(rel["from_table"], self._columns(rel, "from"))
+                    results[i] = self.check(rel, frame, lookup)
+                except (KeyError, ValueError, OSError) as e:
+                    results[i] = self._describe(rel, error=str(e))
+                    continue
+                if key is not None:
+                    entries[key] = results[i]
+        return results, entries
+
+    def _describe(self, rel, **fields):
+        from_columns, to_columns = self._columns(rel, "from"), self._columns(rel, "to")
+        return dict({
+            "from_table": rel["from_table"],
+            "from_column": "+".join(from_columns),
+            "to_table": rel["to_table"],
+            "to_column": "+".join(to_columns),
+            "confidence": rel.get("confidence")
+        }, **fields)
+
+    def check(self, rel, frame, lookup):
+        """Report of one relationship; frame holds the referencing column(s), or is an iterable of blocks of them"""
+        blocks = frame
+        if isinstance(frame, pd.DataFrame):
+            blocks = (frame.iloc[start:start + self.chunk_rows] for start in range(0, len(frame), self.chunk_rows))
+        refs = np.zeros(len(lookup), dtype=np.int64)
+        rows = null_rows = orphan_rows = 0
+        orphan_hashes = np.empty(0, dtype=np.uint64)
+        samples = []
+        for block in blocks:
+            rows += len(block)
+            complete = block.notna().all(axis=1).to_numpy()
+            null_rows += int((~complete).sum())
+            block = block[complete]
+            if not len(block):
+                continue
+            positions, hashes = lookup.positions(block)
+            matched = positions >= 0
+            refs += np.bincount(positions[matched], minlength=len(lookup))
+
+            orphans = block[~matched]
+            orphan_rows += len(orphans)
+            if len(orphans):
+                hashes = hashes[~matched] if hashes is not None else lookup.hashes(orphans)
+                orphan_hashes = np.union1d(orphan_hashes, hashes)
+                if len(samples) < self.sample_size:
+                    for row in orphans.drop_duplicates().head(self.sample_size).itertuples(index=False):
+                        sample = "+".join(str(v) for v in row)
+                        if sample not in samples and len(samples) < self.sample_size:
+                            samples.append(sample)
+
+        non_null = rows - null_rows
+        referenced = refs[refs > 0]
+        histogram = np.histogram(refs, bins=_FAN_OUT_EDGES)[0] if len(refs) else np.zeros(len(_FAN_OUT_LABELS))
+        if lookup.rows > len(lookup):
+            cardinality = "N:M"
+        else:
+            cardinality = "1:N" if len(referenced) and referenced.max() > 1 else "1:1"
+        return self._describe(
+            rel,
+            rows=rows,
+            null_rows=null_rows,
+            orphan_rows=orphan_rows,
+            orphan_share=round(orphan_rows / non_null, 4) if non_null else 0.0,
+            orphan_values=len(orphan_hashes),
+            orphan_samples=samples,
+            key_rows=lookup.rows,
+            key_values=len(lookup),
+            referenced_keys=len(referenced),
+            unreferenced_keys=int(len(refs) - len(referenced)),
+            fan_out={
+                "min": int(referenced.min()) if len(referenced) else 0,
+                "max": int(referenced.max()) if len(referenced) else 0,
+                "mean": round(float(referenced.mean()), 4) if len(referenced) else 0.0,
+                "median": float(np.median(referenced)) if len(referenced) else 0.0,
+                "p95": float(np.percentile(referenced, 95)) if len(referenced) else 0.0,
+                "histogram": dict(zip(_FAN_OUT_LABELS, (int(n) for n in histogram)))
+            },
+            cardinality=cardinality
+        )
@@ -0,0 +1,95 @@
+import copy
+import multiprocessing
+import os
+
+# Worker-side state. Under "fork" the parent sets these before the pool
+# starts and the children see them copy-on-write, so tasks name columns
+# only. Under "spawn"/"forkserver" nothing is inherited: the initializer
+# receives a pickled engine and each task carries its column.
+_worker_engine = None
+_worker_tables = None
+
+
+def _init_worker(engine):
+    global _worker_engine
+    _worker_engine = engine
+
+
+def _profile_task(task):
+    table, col = task
+    df = _worker_tables[table]
+    return _worker_engine.profile_column(df[col], len(df))
+
+
+def _profile_series_task(task):
+    series, total_rows = task
+    return _worker_engine.profile_column(series, total_rows)
+
+
+def default_start_method():
+    # fork is unsafe once the parent runs threads (the Flask server, job
+    # workers); only single-threaded callers such as the CLI should ask for it
+    methods = multiprocessing.get_all_start_methods()
+    return "forkserver" if "forkserver" in methods else "spawn"
+
+
+class ParallelProfiler:
+    """
+    Spreads per-column profiling over a process pool.
+
+    Results come back in input order. Small uploads or a single worker run
+    serially, since there process start-up costs more than it saves.
+    start_method defaults to "forkserver"/"spawn", which ship each column to
+    its worker once; "fork" shares the tables copy-on-write but is only safe
+    in a process without other threads.
+    """
+
+    def __init__(self, engine, workers=None, min_cells=2_000_000, start_method=None):
+        self.engine = engine
+        self.workers = workers or os.cpu_count() or 1
+        self.min_cells = min_cells
+        self.start_method = start_method or default_start_method()
+
+    def should_parallelize(self, df_dict):
+        total_cells = sum(df.size for df in df_dict.values())
+        return self.workers > 1 and total_cells >= self.min_cells
+
+    def profile_columns(self, df_dict, progress=None):
+        """Return {table: {column: profile}} in the order of df_dict."""
+        global _worker_engine, _worker_tables
+        tasks = [(table, col) for table, df in df_dict.items() for col in df.columns]
+        if progress:
+            progress("columns_total", len(tasks))
+        profiles = []
+        if self.should_parallelize(df_dict):
+            context = multiprocessing.get_context(self.start_method)
+            workers = min(self.workers, len(tasks))
+            chunksize = max(1, len(tasks) // (workers * 4))
+            if self.start_method == "fork":
+                _worker_engine, _worker_tables = self.engine, df_dict
+                pool, func, work = context.Pool(workers), _profile_task, tasks
+            else:
+                # the profile cache holds locks and is only used by the parent
+                engine = copy.copy(self.engine)
+                engine.cache = None
+                pool = context.Pool(workers, initializer=_init_worker, initargs=(engine,))
+                func = _profile_series_task
+                work = ((df_dict[table][col], len(df_dict[table])) for table, col in tasks)
+            try:
+                with pool:
+                    for profile in pool.imap(func, work, chunksize):
+                        profiles.append(profile)
+                        if progress:
+                            progress("columns_profiled")
+            finally:
+                _worker_engine = _worker_tables = None
+        else:
+            for table, col in tasks:
+                profiles.append(self.engine.profile_column(df_dict[table][col], len(df_dict[table])))
+                if progress:
+                    progress("columns_profiled")
+
+        result = {table: {} for table in df_dict}
+        for (table, col), profile in zip(tasks, profiles):
+            result[table][col] = profile
+        return result
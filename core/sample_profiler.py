@@ -0,0 +1,138 @@
+import math
+import numpy as np
+
+
+class SampleProfiler:
+    """
+    Column profiles estimated from a uniform row sample of a larger table.
+
+    Profiles have the same keys as CoreDataEngine.profile_column plus
+    "exact", {statistic: bool}, and "bounds", {statistic: [low, high]} at
+    the given confidence for the estimated statistics (None = unbounded).
+    A duplicate or a null seen in the sample is proof, so is_unique=False
+    and is_complete=False are exact even when sampled.
+
+    - num_unique_values: GEE estimator, bounded by its sqrt(N/n) ratio error
+      and by what the sample already shows
+    - entropy: plug-in estimate with Miller-Madow correction, delta-method
+      interval
+    - null share and regex share: Wilson score intervals
+    """
+
+    def __init__(self, engine, confidence=0.95):
+        self.engine = engine
+        self.z = {0.9: 1.645, 0.95: 1.96, 0.99: 2.576}.get(confidence, 1.96)
+
+    def profile_table(self, table, df, total_rows):
+        return {
+            "table_name": table,
+            "num_rows": total_rows,
+            "sample_rows": len(df),
+            "columns": {col: self.profile_column(df[col], total_rows) for col in df.columns}
+        }
+
+    def profile_column(self, series, total_rows):
+        n = len(series)
+        if n >= total_rows:
+            return self.exact_profile(series, total_rows)
+
+        counts = series.value_counts(dropna=True, sort=False)
+        non_null = int(counts.sum())
+        distinct = len(counts)
+        data_type = self.engine.infer_data_type(series)
+
+        null_low, null_high = self._wilson(n - non_null, n)
+        est_non_null = max(non_null, round(total_rows * (1 - (n - non_null) / n))) if n else 0
+        distinct_est, distinct_low, distinct_high = self._distinct_estimate(counts.to_numpy(), est_non_null)
+
+        profile = {
+            "data_type": str(data_type),
+            "is_unique": bool(distinct == n),
+            "is_complete": bool(non_null == n),
+            "is_categorical": bool((distinct_est < 0.1 * total_rows) and (data_type in ["string", "int"])),
+            "num_unique_values": float(distinct_est),
+            "sample_values": [str(v) for v in counts.index[:5]]
+        }
+        exact = {
+            "data_type": False,
+            "is_unique": not profile["is_unique"],
+            "is_complete": not profile["is_complete"],
+            "is_categorical": False,
+            "num_unique_values": False
+        }
+        bounds = {
+            "null_share": [null_low, null_high],
+            "num_unique_values": [float(distinct_low), float(distinct_high)]
+        }
+
+        if data_type in ["int", "float"] and distinct:
+            # the true range can only be wider than the sampled one
+            profile["min_value"] = float(counts.index.min())
+            profile["max_value"] = float(counts.index.max())
+            exact["min_value"] = exact["max_value"] = False
+            bounds["min_value"] = [None, profile["min_value"]]
+            bounds["max_value"] = [profile["max_value"], None]
+        if data_type in ["int", "string"]:
+            if data_type == "string" and counts.index.dtype == object and not all(type(v) is str for v in counts.index):
+                counts = counts.groupby(counts.index.astype(str), sort=False).sum()
+            entropy, entropy_low, entropy_high = self._entropy_estimate(counts.to_numpy(), distinct_high)
+            profile["entropy"] = entropy
+            exact["entropy"] = False
+            bounds["entropy"] = [entropy_low, entropy_high]
+        if data_type == "string":
+            head = series.dropna()
+            pattern, share = self.engine.infer_regex_shape(head, sample_size=len(head))
+            profile["regex_pattern"], profile["regex_pattern_share"] = pattern, share
+            exact["regex_pattern"] = exact["regex_pattern_share"] = False
+            bounds["regex_pattern_share"] = list(self._wilson(round(share * len(head)), len(head)))
+
+        profile["exact"] = exact
+        profile["bounds"] = bounds
+        return profile
+
+    def exact_profile(self, series, total_rows):
+        """Full-data profile of a column, flagged as exact"""
+        profile = self.engine.profile_column(series, total_rows)
+        profile["exact"] = {stat: True for stat in profile if stat != "sample_values"}
+        profile["bounds"] = {}
+        return profile
+
+    def _wilson(self, successes, n):
+        if not n:
+            return 0.0, 1.0
+        p = successes / n
+        z2 = self.z * self.z
+        center = (p + z2 / (2 * n)) / (1 + z2 / n)
+        half = self.z * math.sqrt(p * (1 - p) / n + z2 / (4 * n * n)) / (1 + z2 / n)
+        return round(max(0.0, center - half), 4), round(min(1.0, center + half), 4)
+
+    def _distinct_estimate(self, counts, population):
+        sampled = int(counts.sum())
+        distinct = len(counts)
+        if not sampled or population <= sampled:
+            return distinct, distinct, distinct
+        singletons = int((counts == 1).sum())
+        ratio = math.sqrt(population / sampled)
+        estimate = ratio * singletons + (distinct - singletons)
+        # every unseen row could be new, but no seen duplicate can be undone
+        most = population - (sampled - distinct)
+        low = min(max(distinct, estimate / ratio), most)
+        high = min(max(distinct, estimate * ratio), most)
+        estimate = min(max(estimate, low), high)
+        return round(estimate), round(low), round(high)
+
+    def _entropy_estimate(self, counts, max_distinct):
+        counts = np.asarray(counts, dtype=np.float64)
+        n = float(counts.sum())
+        if not n:
+            return 0.0, 0.0, 0.0
+        p = counts / n
+        log_p = np.log2(p)
+        plug_in = float(-(p * log_p).sum())
+        estimate = plug_in + (len(counts) - 1) / (2 * n * math.log(2))
+        variance = max(float((p * log_p * log_p).sum()) - plug_in * plug_in, 0.0) / n
+        half = self.z * math.sqrt(variance)
+        ceiling = math.log2(float(max_distinct)) if max_distinct > 1 else 0.0
+        estimate = min(estimate, ceiling)
+        return (round(estimate, 4), round(max(0.0, plug_in - half), 4),
+                round(min(ceiling, estimate + half), 4))
@@ -0,0 +1,158 @@
+import math
+import numpy as np
+import pandas as pd
+from core.column_sketch import hash_distinct_values
+
+
+class _ColumnAccumulator:
+    """Running statistics of one column over successive row blocks"""
+
+    def __init__(self, engine, max_distinct, sketch_size):
+        self.engine = engine
+        self.max_distinct = max_distinct
+        self.sketch_size = sketch_size
+        self.num_values = 0
+        self.nulls = 0
+        self.kinds = set()          # data types of blocks with non-null values
+        self.counts = pd.Series(dtype="int64")  # merged value counts while under max_distinct
+        self.kmv = np.empty(0, dtype=np.uint64)  # k smallest value hashes, once over it
+        self.duplicate_seen = False
+        self.minimum = self.maximum = None
+        self.head = []              # first 100 non-null values
+
+    def update(self, series):
+        values = series.dropna()
+        self.num_values += len(series)
+        self.nulls += len(series) - len(values)
+        if not len(values):
+            return
+        self.kinds.add(self.engine.infer_data_type(series))
+        if len(self.head) < 100:
+            self.head.extend(values.iloc[:100 - len(self.head)].tolist())
+
+        counts = values.value_counts(sort=False)
+        if pd.api.types.is_numeric_dtype(counts.index) and not pd.api.types.is_bool_dtype(counts.index):
+            low, high = counts.index.min(), counts.index.max()
+            self.minimum = low if self.minimum is None else min(self.minimum, low)
+            self.maximum = high if self.maximum is None else max(self.maximum, high)
+
+        if self.counts is not None:
+            merged = pd.concat([self.counts, counts]).groupby(level=0, sort=False).sum() if len(self.counts) else counts
+            if len(merged) <= self.max_distinct:
+                self.counts = merged
+                return
+            # too many distinct values to keep: continue with a KMV sketch
+            self.duplicate_seen = bool((merged > 1).any())
+            self._sketch(merged.index)
+            self.counts = None
+            return
+        self.duplicate_seen = self.duplicate_seen or bool((counts > 1).any())
+        self._sketch(counts.index)
+
+    def _sketch(self, distinct):
+        hashes = hash_distinct_values(pd.Series(distinct))
+        self.kmv = np.unique(np.concatenate([self.kmv, hashes]))[:self.sketch_size]
+
+    def data_type(self):
+        """Type a full read would infer, or None when blocks disagree"""
+        kinds = self.kinds
+        if not kinds:
+            return "float"  # all-null column
+        if kinds <= {"int", "float"}:
+            return "float" if "float" in kinds or self.nulls else "int"
+        return next(iter(kinds)) if len(kinds) == 1 else None
+
+    def distinct_estimate(self, z=1.96):
+        if self.counts is not None:
+            n = len(self.counts)
+            return n, n, n
+        k = len(self.kmv)
+        if k < self.sketch_size:
+            return k, k, k
+        estimate = (k - 1) / (float(self.kmv[-1]) / 2.0 ** 64)
+        error = z / math.sqrt(k - 2)
+        most = self.num_values - self.nulls
+        return (round(min(estimate, most)), round(min(estimate * (1 - error), most)),
+                round(min(estimate * (1 + error), most)))
+
+    def profile(self, total_rows):
+        data_type = self.data_type()
+        if data_type is not None and self.counts is not None:
+            counts = self.counts
+            if data_type == "float" and not pd.api.types.is_float_dtype(counts.index):
+                counts.index = counts.index.astype("float64")
+            head = pd.Series(self.head, dtype=object) if data_type == "string" else None
+            return self.engine.profile_counts(counts, data_type, total_rows, self.num_values, head)
+
+        # estimated profile, in the format of SampleProfiler
+        data_type = data_type or "string"
+        if self.counts is not None:
+            self.duplicate_seen = bool((self.counts > 1).any())
+        estimate, low, high = self.distinct_estimate()
+        non_null = self.num_values - self.nulls
+        profile = {
+            "data_type": data_type,
+            "is_unique": bool(not self.duplicate_seen and high >= non_null == total_rows),
+            "is_complete": bool(self.nulls == 0),
+            "is_categorical": bool((estimate < 0.1 * total_rows) and (data_type in ["string", "int"])),
+            "num_unique_values": float(estimate),
+            "sample_values": [str(v) for v in list(dict.fromkeys(self.head))[:5]],
+            "exact": {
+                "data_type": self.data_type() is not None,
+                "is_unique": self.duplicate_seen or non_null != total_rows,
+                "is_complete": True,
+                "is_categorical": False,
+                "num_unique_values": False
+            },
+            "bounds": {"num_unique_values": [float(low), float(high)]}
+        }
+        if data_type in ["int", "float"] and self.minimum is not None:
+            profile["min_value"] = float(self.minimum)
+            profile["max_value"] = float(self.maximum)
+            profile["exact"]["min_value"] = profile["exact"]["max_value"] = True
+        return profile
+
+
+class StreamingProfiler:
+    """
+    Table profile accumulated block by block while a CSV is still arriving.
+
+    Each column keeps its null count, min/max, first values and merged
+    value counts, so the final profile is the one CoreDataEngine would
+    compute on the whole table. A column whose distinct values outgrow its
+    share of max_distinct keeps a KMV distinct-count sketch instead, and a
+    column whose blocks parse to different types (e.g. "A1" after "17")
+    cannot be reproduced exactly; such columns get estimated profiles
+    flagged like SampleProfiler's, and the table profile is not exact.
+    """
+
+    def __init__(self, engine, max_distinct=4_000_000, sketch_size=4096):
+        self.engine = engine
+        self.max_distinct = max_distinct
+        self.sketch_size = sketch_size
+        self.columns = None
+        self.num_rows = 0
+
+    def update(self, df):
+        """Add a parsed block of rows (same columns as the first block)"""
+        if self.columns is None:
+            per_column = max(10_000, self.max_distinct // max(len(df.columns), 1))
+            self.columns = {
+                col: _ColumnAccumulator(self.engine, per_column, self.sketch_size) for col in df.columns
+            }
+        for col, accumulator in self.columns.items():
+            accumulator.update(df[col])
+        self.num_rows += len(df)
+
+    @property
+    def exact(self):
+        return self.columns is not None and all(
+            acc.counts is not None and acc.data_type() is not None for acc in self.columns.values()
+        )
+
+    def profile(self, table):
+        return {
+            "table_name": table,
+            "num_rows": self.num_rows,
+            "columns": {col: acc.profile(self.num_rows) for col, acc in (self.columns or {}).items()}
+        }
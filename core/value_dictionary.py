@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+# Values only ever compare equal within one domain, as in a Python set:
+# 1, 1.0 and True are one value, "1" is another.
+_DOMAINS = ("int", "float", "datetime", "str", "object")
+
+
+def _split_domains(values):
+    """Distinct non-null values of a Series, grouped by comparison domain"""
+    values = values.dropna()
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_integer_dtype(values):
+        return {"int": values.unique().astype("int64")}
+    if pd.api.types.is_float_dtype(values):
+        distinct = values.unique().astype("float64")
+        integral = (distinct % 1 == 0) & (np.abs(distinct) < 2.0 ** 63)
+        return {"int": np.unique(distinct[integral].astype("int64")), "float": distinct[~integral]}
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return {"datetime": pd.DatetimeIndex(values.unique()).as_unit("ns").asi8}
+
+    distinct = pd.Series(values.unique(), dtype=object)
+    if pd.api.types.infer_dtype(distinct, skipna=True) == "string":
+        return {"str": distinct.to_numpy()}
+    # mixed object column: route every value the way its Python type compares
+    kinds = distinct.map(lambda v: (
+        "int" if isinstance(v, (bool, int, np.integer, np.bool_)) else
+        "float" if isinstance(v, (float, np.floating)) else
+        "str" if isinstance(v, str) else "object"
+    ))
+    parts = {}
+    for kind, group in distinct.groupby(kinds, sort=False):
+        split = _split_domains(group.astype("float64" if kind == "float" else "int64")) \
+            if kind in ("int", "float") else {kind: group.to_numpy()}
+        # integral floats join the int group's domain: merge, don't replace
+        for domain, part in split.items():
+            parts[domain] = np.unique(np.concatenate([parts[domain], part])) if domain in parts else part
+    return parts
+
+
+class ValueDictionary:
+    """
+    One integer code space over the distinct values of many columns.
+
+    Each value is stored once, in a per-domain pandas Index; its code is
+    its position there interleaved with the domain number, so codes stay
+    stable as values are appended. Columns added together are encoded in
+    one factorize pass per domain, and once every column of interest is
+    encoded the dictionary itself can be dropped: overlaps only need the
+    codes.
+    """
+
+    def __init__(self):
+        self._values = {domain: None for domain in _DOMAINS}
+
+    def __len__(self):
+        return sum(len(index) for index in self._values.values() if index is not None)
+
+    def add_many(self, columns):
+        """Encode several Series at once; returns one sorted code array per Series"""
+        splits = [_split_domains(series) for series in columns]
+        codes = [[] for _ in columns]
+        for d, domain in enumerate(_DOMAINS):
+            parts = [split.get(domain) for split in splits]
+            sizes = [0 if part is None else len(part) for part in parts]
+            if not sum(sizes):
+                continue
+            combined = np.concatenate([part for part in parts if part is not None])
+            known = self._values[domain]
+            if known is None:
+                local, uniques = pd.factorize(combined)
+                self._values[domain] = pd.Index(uniques)
+            else:
+                local = known.get_indexer(combined)
+                unseen = local < 0
+                if unseen.any():
+                    new_local, new_values = pd.factorize(combined[unseen])
+                    local[unseen] = len(known) + new_local
+                    self._values[domain] = known.append(pd.Index(new_values))
+            offset = 0
+            for i, size in enumerate(sizes):
+                if size:
+                    codes[i].append(local[offset:offset + size].astype(np.int64) * len(_DOMAINS) + d)
+                    offset += size
+        return [np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64) for parts in codes]
+
+    def add(self, series):
+        return self.add_many([series])[0]
+
+    def lookup(self, series):
+        """(number of distinct values, sorted codes of those already in the dictionary)"""
+        n_distinct = 0
+        found = []
+        for domain, values in _split_domains(series).items():
+            n_distinct += len(values)
+            index = self._values[domain]
+            if index is None or not len(values):
+                continue
+            local = index.get_indexer(values)
+            local = local[local >= 0]
+            found.append(local.astype(np.int64) * len(_DOMAINS) + _DOMAINS.index(domain))
+        codes = np.sort(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+        return n_distinct, codes
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+_LEADING_ZERO = r"[+-]?0\d+"
+_DECIMAL = r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?"
+
+
+def _hash_numbers(values):
+    # hash of each number; integral floats hash like the int (1001.0 == 1001)
+    values = np.asarray(values)
+    if values.dtype.kind in "bmM":
+        values = values.astype("int64")
+    if values.dtype.kind != "f":
+        return pd.util.hash_array(values.astype("int64"))
+    hashes = np.empty(len(values), dtype=np.uint64)
+    integral = (values % 1 == 0) & (np.abs(values) < 2.0 ** 63)
+    hashes[integral] = pd.util.hash_array(values[integral].astype("int64"))
+    hashes[~integral] = pd.util.hash_array(values[~integral])
+    return hashes
+
+
+class ValueNormalizer:
+    """
+    Canonical uint64 hashes of key-like values, so that e.g. 1001, "1001"
+    and " 01001" or "PRD-01" and " prd-01" compare equal.
+
+    - trim: strip surrounding whitespace
+    - casefold: compare text case-insensitively
+    - unify_numeric: text that parses as a number hashes like that number
+      in a numeric column (integral values as integers, as 1001.0 == 1001)
+    - strip_leading_zeros: with unify_numeric, "007" is the number 7;
+      otherwise digit strings with leading zeros stay text (zip codes)
+
+    Only the distinct values of a column are normalized, and numbers are
+    hashed straight from their int64/float64 arrays, so no normalized
+    string is built per row.
+    """
+
+    def __init__(self, trim=True, casefold=True, unify_numeric=True, strip_leading_zeros=True):
+        self.trim = trim
+        self.casefold = casefold
+        self.unify_numeric = unify_numeric
+        self.strip_leading_zeros = strip_leading_zeros
+
+    def settings(self):
+        return {
+            "trim": self.trim, "casefold": self.casefold,
+            "unify_numeric": self.unify_numeric, "strip_leading_zeros": self.strip_leading_zeros
+        }
+
+    def hash_distinct(self, series):
+        """Sorted distinct uint64 hashes of the normalized non-null values"""
+        values = series.dropna()
+        return np.unique(self._hash_distinct_values(pd.Series(values.unique(), dtype=values.dtype)))
+
+    def hash_values(self, series):
+        """uint64 hash of every value of a Series without nulls, aligned with it"""
+        codes, uniques = pd.factorize(series)
+        return self._hash_distinct_values(pd.Series(uniques))[codes]
+
+    def _hash_distinct_values(self, distinct):
+        if distinct.dtype != object and not pd.api.types.is_string_dtype(distinct):
+            return _hash_numbers(distinct.to_numpy())
+        distinct = distinct.astype(object)
+        if pd.api.types.infer_dtype(distinct, skipna=True) == "string":
+            return self._hash_text(distinct)
+
+        # numbers and other objects stored in an object column
+        hashes = np.empty(len(distinct), dtype=np.uint64)
+        is_number = distinct.map(lambda v: isinstance(v, (int, float, np.integer, np.floating))
+                                 and not isinstance(v, (bool, np.bool_))).to_numpy(dtype=bool)
+        if is_number.any():
+            hashes[is_number] = _hash_numbers(pd.to_numeric(distinct[is_number]).to_numpy())
+        others = distinct[~is_number]
+        hashes[~is_number] = self._hash_text(others.map(lambda v: v if isinstance(v, str) else str(v)))
+        return hashes
+
+    def _hash_text(self, text):
+        hashes = np.empty(len(text), dtype=np.uint64)
+        if not len(text):
+            return hashes
+        text = text.astype(object)
+        if self.trim:
+            text = text.str.strip()
+        numeric = np.zeros(len(text), dtype=bool)
+        if self.unify_numeric:
+            # up to 18 decimal digits always fit int64; longer ones take the
+            # float path below, which leaves them text if they lose digits
+            digits = (text.str.isdecimal() & (text.str.len() <= 18)).to_numpy(dtype=bool, copy=True)
+            if not self.strip_leading_zeros:
+                digits &= ~text.str.startswith("0").to_numpy(dtype=bool) | (text.str.len() == 1).to_numpy()
+            hashes[digits] = _hash_numbers(text[digits].to_numpy(dtype=object).astype(np.int64))
+            numeric |= digits
+
+            # signs, decimals and exponents ("-3", "12.50", "1e3"), except
+            # where the float would lose integer digits
+            rest = np.flatnonzero(~digits)
+            candidates = text.iloc[rest]
+            number = candidates.str.fullmatch(_DECIMAL).to_numpy(dtype=bool, copy=True)
+            if not self.strip_leading_zeros:
+                number &= ~candidates.str.fullmatch(_LEADING_ZERO).to_numpy(dtype=bool)
+            parsed = pd.to_numeric(candidates[number], errors="coerce").astype("float64").to_numpy()
+            exact = np.isfinite(parsed) & (np.abs(parsed) < 2.0 ** 53)
+            positions = rest[number][exact]
+            hashes[positions] = _hash_numbers(parsed[exact])
+            numeric[positions] = True
+        text = text[~numeric]
+        if self.casefold:
+            text = text.str.casefold()
+        hashes[~numeric] = pd.util.hash_array(text.to_numpy(dtype=object))
+        return hashes
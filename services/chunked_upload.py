@@ -0,0 +1,242 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+import pandas as pd
+from werkzeug.utils import secure_filename
+from core.streaming_profiler import StreamingProfiler
+from utils.metrics import metrics
+
+
+class UploadOffsetMismatch(Exception):
+    """A chunk did not start where the received bytes end"""
+
+    def __init__(self, received):
+        super().__init__(f"Upload continues at byte {received}")
+        self.received = received
+
+
+def _record_end(data, quote, first=False):
+    """
+    Offset just past the first (or last) line break that is outside quotes,
+    0 if there is none. A quote count that is even before the break means
+    the break ends a record; escaped "" pairs keep the parity.
+    """
+    if first:
+        quotes = 0
+        start = 0
+        pos = data.find(b'\n')
+        while pos >= 0:
+            quotes += data.count(quote, start, pos)
+            if quotes % 2 == 0:
+                return pos + 1
+            start = pos
+            pos = data.find(b'\n', pos + 1)
+        return 0
+    quotes = data.count(quote)
+    end = len(data)
+    pos = data.rfind(b'\n')
+    while pos >= 0:
+        quotes -= data.count(quote, pos, end)
+        if quotes % 2 == 0:
+            return pos + 1
+        end = pos
+        pos = data.rfind(b'\n', 0, pos)
+    return 0
+
+
+class ChunkedUpload:
+    def __init__(self, original_filename, filename, total_size, profiler, owner=None):
+        self.id = str(uuid.uuid4())
+        self.owner = owner
+        self.original_filename = original_filename
+        self.filename = filename
+        self.part_filename = f"{filename}.part"
+        self.total_size = total_size
+        self.received = 0
+        self.status = 'receiving'
+        self.updated_at = time.time()
+        self.profiler = profiler
+        self.profile = None
+        self.profile_error = None
+        self.profile_cached = False
+        self._sha256 = hashlib.sha256()
+        self._pending = b''
+        self._header = None
+        self._dialect = None
+        self._lock = threading.Lock()
+
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'filename': self.original_filename,
+            'stored_as': self.filename if self.status == 'complete' else None,
+            'status': self.status,
+            'offset': self.received,
+            'size': self.total_size,
+            'rows_profiled': self.profiler.num_rows if self.profiler is not None else
+                             (self.profile or {}).get('num_rows', 0),
+            'profile_error': self.profile_error,
+            'profile_cached': self.profile_cached
+        }
+
+
+class ChunkedUploadManager:
+    """
+    Resumable uploads of large CSVs, sent as consecutive byte ranges.
+
+    Bytes are appended to "<stored name>.part" in the upload folder as
+    they arrive, and every run of complete records is parsed right away
+    and added to a StreamingProfiler, so only the unparsed tail of the
+    last chunk is held in memory. A client that lost a chunk asks for the
+    current offset and continues from there. On completion the file is
+    renamed to its final name and, when the streamed profile is exact, it
+    is put into the engine's profile cache under the file's content hash,
+    so the analysis does not profile the table again unless its loader
+    parses a column to another type than the streamed blocks did.
+    """
+
+    def __init__(self, file_handler, engine, read_size=1024 * 1024, ttl=24 * 3600):
+        self.file_handler = file_handler
+        self.engine = engine
+        self.read_size = read_size
+        self.ttl = ttl
+        self.uploads = {}
+        self._lock = threading.Lock()
+
+    def create(self, original_filename, total_size=None, owner=None):
+        """Start an upload; owner (e.g. a workspace id) is checked by the caller"""
+        if not self.file_handler.allowed_file(original_filename):
+            raise ValueError("Invalid file type")
+        self._purge_expired()
+        filename = f"{uuid.uuid4()}_{secure_filename(original_filename)}"
+        upload = ChunkedUpload(original_filename, filename, total_size, StreamingProfiler(self.engine), owner)
+        open(self._path(upload.part_filename), 'wb').close()
+        with self._lock:
+            self.uploads[upload.id] = upload
+        return upload
+
+    def get(self, upload_id):
+        with self._lock:
+            return self.uploads.get(upload_id)
+
+    def _path(self, filename):
+        return os.path.join(self.file_handler.upload_folder, filename)
+
+    def append(self, upload_id, offset, stream):
+        """Write the bytes of stream starting at offset; returns the upload"""
+        upload = self._require(upload_id)
+        with upload._lock:
+            if upload.status != 'receiving':
+                raise ValueError(f"Upload is {upload.status}")
+            if offset != upload.received:
+                raise UploadOffsetMismatch(upload.received)
+            with open(self._path(upload.part_filename), 'ab') as f:
+                for data in iter(lambda: stream.read(self.read_size), b''):
+                    if upload.total_size is not None and upload.received + len(data) > upload.total_size:
+                        raise ValueError("More bytes than the announced upload size")
+                    f.write(data)
+                    f.flush()
+                    upload._sha256.update(data)
+                    upload.received += len(data)
+                    upload.updated_at = time.time()
+                    self._feed(upload, data)
+            metrics.count('chunked_upload_bytes', upload.received - offset)
+        return upload
+
+    def _feed(self, upload, data, final=False):
+        """Parse and profile the complete records received so far"""
+        if upload.profiler is None:
+            return
+        upload._pending += data
+        try:
+            if upload._dialect is None:
+                if upload.received < self.file_handler.sniff_bytes and not final:
+                    return
+                # same head bytes as load_csv will sniff on the finished file
+                upload._dialect = self.file_handler.sniff_csv(upload.part_filename)
+            quote = upload._dialect['quotechar'].encode('utf-8')
+            if upload._header is None:
+                end = _record_end(upload._pending, quote, first=True) or (len(upload._pending) if final else 0)
+                if not end:
+                    return
+                upload._header, upload._pending = upload._pending[:end], upload._pending[end:]
+            end = len(upload._pending) if final else _record_end(upload._pending, quote)
+            block, upload._pending = upload._pending[:end], upload._pending[end:]
+            if block.strip():
+                with metrics.stage('profile_streaming'):
+                    upload.profiler.update(self.file_handler.parse_csv_block(upload._header + block, upload._dialect))
+        except (UnicodeDecodeError, pd.errors.ParserError, ValueError) as e:
+            # e.g. non-UTF-8 bytes: the analysis parses and profiles the file itself
+            upload.profiler = None
+            upload.profile_error = str(e)
+            upload._pending = b''
+
+    def complete(self, upload_id):
+        """Finish an upload: flush the last record, store the file and its profile"""
+        upload = self._require(upload_id)
+        with upload._lock:
+            if upload.status != 'receiving':
+                raise ValueError(f"Upload is {upload.status}")
+            if upload.total_size is not None and upload.received != upload.total_size:
+                raise UploadOffsetMismatch(upload.received)
+            self._feed(upload, b'', final=True)
+            os.replace(self._path(upload.part_filename), self._path(upload.filename))
+            digest = upload._sha256.hexdigest()
+            self.file_handler.set_content_hash(upload.filename, digest)
+
+            profiler, upload.profiler = upload.profiler, None
+            if profiler is not None and profiler.num_rows:
+                upload.profile = profiler.profile(upload.filename)
+                if profiler.exact:
+                    upload.profile_cached = self.engine.seed_cache(digest, upload.profile)
+            upload.status = 'complete'
+            upload.updated_at = time.time()
+            metrics.count('chunked_uploads_completed')
+        return upload
+
+    def abort(self, upload_id):
+        upload = self._require(upload_id)
+        with upload._lock:
+            if upload.status == 'receiving':
+                self._discard(upload)
+        return upload
+
+    def _discard(self, upload):
+        upload.status = 'aborted'
+        upload.profiler = None
+        upload._pending = b''
+        try:
+            os.remove(self._path(upload.part_filename))
+        except FileNotFoundError:
+            pass
+
+    def _require(self, upload_id):
+        upload = self.get(upload_id)
+        if upload is None:
+            raise KeyError(upload_id)
+        return upload
+
+    def discard_owner(self, owner):
+        """Forget the owner's uploads, deleting unfinished parts"""
+        with self._lock:
+            owned = [upload for upload in self.uploads.values() if upload.owner == owner]
+            for upload in owned:
+                del self.uploads[upload.id]
+        for upload in owned:
+            with upload._lock:
+                if upload.status == 'receiving':
+                    self._discard(upload)
+
+    def _purge_expired(self):
+        """Forget uploads idle for longer than ttl, deleting unfinished parts"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [upload for upload in self.uploads.values() if upload.updated_at < cutoff]
+            for upload in expired:
+                del self.uploads[upload.id]
+        for upload in expired:
+            with upload._lock:
+                if upload.status == 'receiving':
+                    self._discard(upload)
@@ -1,12 +1,37 @@
+import codecs
+import csv
+import hashlib
+import io
+import numpy as np
 import os
 import pandas as pd
+import threading
+from collections import OrderedDict
 from werkzeug.utils import secure_filename
 import uuid
+from utils.metrics import metrics
+
+try:
+    import pyarrow
+    _HAS_PYARROW = True
+except ImportError:
+    _HAS_PYARROW = False
 
 class FileHandler:
-    def __init__(self, upload_folder):
+    def __init__(self, upload_folder, table_store=None, table_cache=None, metadata_cache_size=1024):
         self.upload_folder = upload_folder
+        self.table_store = table_store
+        # table_cache: services.table_cache.TableCache of parsed tables by content hash, so
+        # sessions uploading the same file share one copy
+        self.table_cache = table_cache
         self.allowed_extensions = {'csv'}
+        self.separators = [',', ';', '\t', '|']
+        self.sniff_bytes = 64 * 1024
+        # dialects and content hashes by (path, size, mtime), least recently used dropped first
+        self.metadata_cache_size = metadata_cache_size
+        self._dialect_cache = OrderedDict()
+        self._hash_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
     
     def allowed_file(self, filename):
         return '.' in filename and filename.rsplit('.', 1)[1].lower() in self.allowed_extensions
@@ -24,30 +49,136 @@ class FileHandler:
         
         raise ValueError("Invalid file type")
     
-    def load_csv(self, filename):
-        """Load CSV file and return pandas DataFrame with better error handling"""
+    def sniff_csv(self, filename):
+        """Detect encoding, delimiter, quoting and header from the head of the file"""
+        filepath = os.path.join(self.upload_folder, filename)
+        stat = os.stat(filepath)
+        cache_key = (filepath, stat.st_size, stat.st_mtime_ns)
+        dialect = self._cached(self._dialect_cache, cache_key)
+        if dialect is not None:
+            return dialect
+
+        with open(filepath, 'rb') as f:
+            head = f.read(self.sniff_bytes)
+
+        encoding, text = self._detect_encoding(head)
+        lines = text.splitlines()
+        if len(head) == self.sniff_bytes and len(lines) > 1:
+            lines = lines[:-1]  # last line is probably cut off
+        sample = '\n'.join(lines[:200])
+
+        dialect = {
+            'encoding': encoding,
+            'sep': self._detect_separator(lines[:50]),
+            'quotechar': '"',
+            'doublequote': True,
+            'header': True
+        }
+        sniffer = csv.Sniffer()
+        try:
+            sniffed = sniffer.sniff(sample, delimiters=dialect['sep'])
+            if sniffed.quotechar in sample:
+                dialect['quotechar'] = sniffed.quotechar
+                dialect['doublequote'] = sniffed.doublequote
+        except csv.Error:
+            pass
+        try:
+            dialect['header'] = sniffer.has_header(sample)
+        except csv.Error:
+            pass
+
+        self._remember(self._dialect_cache, cache_key, dialect)
+        return dialect
+
+    def _detect_encoding(self, head):
+        if head.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig', head[len(codecs.BOM_UTF8):].decode('utf-8', errors='replace')
+        try:
+            # incremental decode so a multi-byte char split at the sample edge is not an error
+            return 'utf-8', codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        except UnicodeDecodeError:
+            return 'latin-1', head.decode('latin-1')
+
+    def _detect_separator(self, lines):
+        # First separator (in the historical preference order) that splits the
+        # header into more than one field and gives a consistent field count
+        lines = [line for line in lines if line.strip()]
+        if not lines:
+            return ','
+        fallback = None
+        for sep in self.separators:
+            widths = [len(row) for row in csv.reader(lines, delimiter=sep)]
+            if widths[0] > 1:
+                if all(w == widths[0] for w in widths):
+                    return sep
+                fallback = fallback or sep
+        return fallback or ','
+
+    def _csv_options(self, dialect, header):
+        return {
+            'encoding': dialect['encoding'],
+            'sep': dialect['sep'],
+            'quotechar': dialect['quotechar'],
+            'doublequote': dialect['doublequote'],
+            'header': 0 if header else None
+        }
+
+    def _read_csv(self, filepath, dialect, header):
+        options = self._csv_options(dialect, header)
+        if _HAS_PYARROW:
+            try:
+                df = pd.read_csv(filepath, engine='pyarrow', **options)
+            except (ValueError, TypeError, NotImplementedError, pyarrow.ArrowException):
+                # e.g. ragged rows, which only the C engine can skip
+                pass
+            else:
+                return self._as_c_engine(df, filepath, options)
+        return pd.read_csv(filepath, on_bad_lines='skip', low_memory=False, **options)
+
+    def _as_c_engine(self, df, filepath, options):
+        """Give columns pyarrow parsed as dates or times the text the C engine (and every other reader) keeps"""
+        temporal = [
+            col for col in df.columns
+            if df[col].dtype.kind in 'mM' or (df[col].dtype == object and
+                                              pd.api.types.infer_dtype(df[col], skipna=True) in ('date', 'time', 'datetime'))
+        ]
+        if not temporal:
+            return df
+        metrics.count('csv_temporal_rereads')
+        try:
+            text = pd.read_csv(filepath, on_bad_lines='skip', low_memory=False, usecols=temporal, **options)
+        except ValueError:
+            text = None  # e.g. duplicate column names
+        if text is None or len(text) != len(df):
+            return pd.read_csv(filepath, on_bad_lines='skip', low_memory=False, **options)
+        for col in temporal:
+            df[col] = text[col].to_numpy()
+        return df
+
+    def load_csv(self, filename, has_header=True):
+        """Load CSV file and return pandas DataFrame with better error handling
+
+        The dialect is sniffed from the first few KB so the file is parsed
+        only once. has_header=None uses the sniffed header guess.
+        """
         filepath = os.path.join(self.upload_folder, filename)
         
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"File {filename} not found")
         
         try:
-            # Try different encodings and separators
-            encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-            separators = [',', ';', '\t', '|']
-            
-            df = None
-            for encoding in encodings:
-                for sep in separators:
-                    try:
-                        df = pd.read_csv(filepath, encoding=encoding, sep=sep, 
-                                       on_bad_lines='skip', low_memory=False)
-                        if not df.empty and len(df.columns) > 1:
-                            break
-                    except (UnicodeDecodeError, pd.errors.ParserError):
-                        continue
-                if df is not None and not df.empty and len(df.columns) > 1:
-                    break
+            with metrics.stage('csv_sniff'):
+                dialect = self.sniff_csv(filename)
+            header = dialect['header'] if has_header is None else has_header
+
+            with metrics.stage('csv_parse'):
+                try:
+                    df = self._read_csv(filepath, dialect, header)
+                except UnicodeDecodeError:
+                    # non-UTF-8 bytes past the sniffed sample
+                    metrics.count('csv_encoding_retries')
+                    dialect['encoding'] = 'latin-1'
+                    df = self._read_csv(filepath, dialect, header)
             
             if df is None or df.empty:
                 raise ValueError("Could not parse CSV file or file is empty")
@@ -61,14 +192,171 @@ class FileHandler:
             if df.empty:
                 raise ValueError("CSV file contains no data after cleaning")
             
+            metrics.count('csv_files_parsed')
+            metrics.count('csv_rows_parsed', len(df))
             return df
             
         except Exception as e:
             raise ValueError(f"Error reading CSV file: {str(e)}")
     
+    def sample_csv(self, filename, sample_rows=100_000, chunksize=250_000, seed=0):
+        """Stream a CSV once and keep a uniform sample of its rows
+
+        Every row gets a random priority and the sample_rows lowest ones are
+        kept (a bottom-k reservoir), so memory stays bounded by
+        sample_rows + chunksize rows. Returns (sample DataFrame in file
+        order, total number of non-empty rows).
+        """
+        filepath = os.path.join(self.upload_folder, filename)
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"File {filename} not found")
+
+        dialect = self.sniff_csv(filename)
+        with metrics.stage('csv_sample'):
+            try:
+                reservoir, total_rows = self._sample_rows(filepath, dialect, sample_rows, chunksize, seed)
+            except UnicodeDecodeError:
+                metrics.count('csv_encoding_retries')
+                dialect['encoding'] = 'latin-1'
+                reservoir, total_rows = self._sample_rows(filepath, dialect, sample_rows, chunksize, seed)
+
+        if reservoir is None or reservoir.empty:
+            raise ValueError("CSV file contains no data after cleaning")
+        sample = reservoir.drop(columns='__priority').sort_index().reset_index(drop=True)
+        sample.columns = sample.columns.astype(str).str.strip()
+        metrics.count('csv_rows_sampled', len(sample))
+        return sample, total_rows
+
+    def _sample_rows(self, filepath, dialect, sample_rows, chunksize, seed):
+        rng = np.random.default_rng(seed)
+        reservoir = None
+        total_rows = 0
+        reader = pd.read_csv(filepath, on_bad_lines='skip', low_memory=False, chunksize=chunksize,
+                             **self._csv_options(dialect, True))
+        for chunk in reader:
+            chunk = chunk.dropna(how='all')
+            chunk.index = pd.RangeIndex(total_rows, total_rows + len(chunk))
+            total_rows += len(chunk)
+            chunk['__priority'] = rng.random(len(chunk))
+            pool = chunk if reservoir is None else pd.concat([reservoir, chunk])
+            reservoir = pool.nsmallest(sample_rows, '__priority') if len(pool) > sample_rows else pool
+        return reservoir, total_rows
+
+    def parse_csv_block(self, data, dialect):
+        """Parse bytes holding a header line and whole records, cleaned like load_csv"""
+        df = pd.read_csv(io.BytesIO(data), on_bad_lines='skip', low_memory=False,
+                         **self._csv_options(dialect, True))
+        df.columns = df.columns.astype(str).str.strip()
+        return df.dropna(how='all')
+
+    def load_columns(self, filename, columns):
+        """Full data of some columns only, from the table cache or columnar store when present"""
+        if self.table_cache is not None:
+            df = self.table_cache.get(self.content_hash(filename))
+            if df is not None:
+                return df[list(columns)]
+        if self.table_store is not None and self.table_store.has(filename):
+            return self.table_store.read(filename, columns)
+
+        filepath = os.path.join(self.upload_folder, filename)
+        dialect = self.sniff_csv(filename)
+        wanted = set(columns)
+
+        def read():
+            return pd.read_csv(filepath, on_bad_lines='skip', low_memory=False,
+                               usecols=lambda col: str(col).strip() in wanted,
+                               **self._csv_options(dialect, True))
+
+        with metrics.stage('csv_parse'):
+            try:
+                df = read()
+            except UnicodeDecodeError:
+                metrics.count('csv_encoding_retries')
+                dialect['encoding'] = 'latin-1'
+                df = read()
+        df.columns = df.columns.astype(str).str.strip()
+        return df[list(columns)]
+
+    def iter_columns(self, filename, columns, chunk_rows):
+        """Some columns in blocks of up to chunk_rows rows, so a large table is never held whole"""
+        columns = list(columns)
+        if self.table_cache is not None:
+            df = self.table_cache.get(self.content_hash(filename))
+            if df is not None:
+                for start in range(0, len(df), chunk_rows):
+                    yield df[columns].iloc[start:start + chunk_rows]
+                return
+        if self.table_store is not None and self.table_store.has(filename):
+            yield from self.table_store.read_blocks(filename, columns, chunk_rows)
+            return
+
+        filepath = os.path.join(self.upload_folder, filename)
+        dialect = self.sniff_csv(filename)
+        wanted = set(columns)
+        reader = pd.read_csv(filepath, on_bad_lines='skip', low_memory=False, chunksize=chunk_rows,
+                             usecols=lambda col: str(col).strip() in wanted,
+                             **self._csv_options(dialect, True))
+        with reader:
+            for chunk in reader:
+                chunk.columns = chunk.columns.astype(str).str.strip()
+                yield chunk[columns]
+
+    def load_table(self, filename, columns=None):
+        """Load an upload from the table cache or columnar store, converting it on first use"""
+        if self.table_cache is not None:
+            df = self.table_cache.get_or_load(self.content_hash(filename), lambda: self._load_table(filename))
+            return df if columns is None else df[columns]
+        return self._load_table(filename, columns)
+
+    def _load_table(self, filename, columns=None):
+        if self.table_store is None:
+            df = self.load_csv(filename)
+            return df if columns is None else df[columns]
+
+        if not self.table_store.has(filename):
+            self.table_store.write(filename, self.load_csv(filename))
+        return self.table_store.read(filename, columns)
+
+    def content_hash(self, filename):
+        """SHA-256 of the file's bytes, memoised per (path, size, mtime)"""
+        filepath = os.path.join(self.upload_folder, filename)
+        stat = os.stat(filepath)
+        cache_key = (filepath, stat.st_size, stat.st_mtime_ns)
+        cached = self._cached(self._hash_cache, cache_key)
+        if cached is not None:
+            return cached
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        self._remember(self._hash_cache, cache_key, digest.hexdigest())
+        return digest.hexdigest()
+
+    def set_content_hash(self, filename, digest):
+        """Record a hash computed while the file was written, e.g. by a streamed upload"""
+        filepath = os.path.join(self.upload_folder, filename)
+        stat = os.stat(filepath)
+        self._remember(self._hash_cache, (filepath, stat.st_size, stat.st_mtime_ns), digest)
+
+    def _cached(self, cache, key):
+        with self._cache_lock:
+            if key not in cache:
+                return None
+            cache.move_to_end(key)
+            return cache[key]
+
+    def _remember(self, cache, key, value):
+        with self._cache_lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.metadata_cache_size:
+                cache.popitem(last=False)
+
     def delete_file(self, filename):
         """Delete uploaded file"""
         filepath = os.path.join(self.upload_folder, filename)
+        if self.table_store is not None:
+            self.table_store.delete(filename)
         if os.path.exists(filepath):
             os.remove(filepath)
             return True
@@ -1,62 +1,531 @@
 import json
+import logging
 import os
+import re
+import threading
+from collections import Counter
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:  # Windows: appends are serialized within one process only
+    fcntl = None
+
+_IDENTITY = ('from_table', 'from_column', 'to_table', 'to_column')
+_SNAPSHOT_NAME = re.compile(r'^snapshot-(\d+)\.json$')
+
+logger = logging.getLogger(__name__)
+
+
+def _write_atomic(path, data, indent=None):
+    """Write JSON under a temporary name and rename it over path"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # own name per writer
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class _ModelState:
+    """The relationship models as of one journal version"""
+
+    def __init__(self):
+        self.version = 0
+        self.initial = None   # detected relationships, None before any analysis
+        self.edited = None    # {edge id: relationship}, None while there are no edits
+        self.history = []     # one summary per version since the last snapshot
+
+    def current(self):
+        if self.edited is not None:
+            return list(self.edited.values())
+        return list(self.initial or [])
+
+    def apply(self, entry):
+        kind = entry['kind']
+        if kind == 'initial':
+            self.initial = entry['relationships']
+        elif kind == 'replace':
+            self.edited = {GraphUpdater.edge_id(rel): rel for rel in entry['relationships']}
+        elif kind == 'reset':
+            self.edited = None
+        elif kind == 'changes':
+            if self.edited is None:
+                self.edited = {GraphUpdater.edge_id(rel): rel for rel in self.initial or []}
+            for op in entry['ops']:
+                if op['op'] == 'put':
+                    self.edited[GraphUpdater.edge_id(op['relationship'])] = op['relationship']
+                else:
+                    self.edited.pop(op['id'], None)
+        self.version = entry['version']
+        summary = {
+            'version': entry['version'],
+            'kind': kind,
+            'at': entry['at'],
+            'relationship_count': len(self.edited) if self.edited is not None else len(self.initial or [])
+        }
+        if kind == 'changes':
+            summary['changed_edges'] = len(entry['ops'])
+        self.history.append(summary)
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'initial': self.initial,
+            'edited': None if self.edited is None else list(self.edited.values()),
+            'history': self.history
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        state.version = data['version']
+        state.initial = data['initial']
+        if data['edited'] is not None:
+            state.edited = {GraphUpdater.edge_id(rel): rel for rel in data['edited']}
+        # the snapshot's history ends at its version; GraphUpdater reads it from the file when asked
+        return state
+
+
 class GraphUpdater:
-    def __init__(self, output_folder):
+    """
+    Detected and user-edited relationship models of one output folder.
+
+    Every save appends one version to history/journal.jsonl: the detected
+    relationships ("initial"), a whole edited model ("replace"), edge
+    edits ("changes") or dropping the edits ("reset"), so an edit costs a
+    line of its size. Appends hold an flock on the journal, so processes
+    sharing the folder add their versions one after the other. Every
+    snapshot_every versions the current models are written to
+    history/snapshot-<version>.json together with the journal offset they
+    cover and the version summaries since the previous snapshot; loading
+    reads the newest snapshot and replays the journal from there. The
+    models are cached in memory and a journal that another process
+    appended to is caught up on the next call. Snapshots,
+    initial_relationships.json (kept for other readers), the model state
+    and the integrity report cache are written under a temporary name and
+    renamed into place.
+    """
+
+    def __init__(self, output_folder, snapshot_every=200, keep_snapshots=5):
         self.output_folder = output_folder
         self.initial_file = os.path.join(output_folder, 'initial_relationships.json')
-        self.edited_file = os.path.join(output_folder, 'edited_model.json')
-    
+        self.edited_file = os.path.join(output_folder, 'edited_model.json')  # read once, to migrate it
+        self.state_file = os.path.join(output_folder, 'model_state.json')
+        self.integrity_file = os.path.join(output_folder, 'integrity_report.json')
+        self.history_folder = os.path.join(output_folder, 'history')
+        self.journal_file = os.path.join(self.history_folder, 'journal.jsonl')
+        self.snapshot_every = snapshot_every
+        self.keep_snapshots = keep_snapshots
+        self._lock = threading.RLock()
+        self._state = None
+        self._journal_end = 0
+        self._since_snapshot = 0
+        self._node_refs = None
+
+    @staticmethod
+    def edge_id(rel):
+        """Stable id of a relationship, also its vis.js edge id"""
+        return f"{rel['from_table']}:{rel['from_column']}->{rel['to_table']}:{rel['to_column']}"
+
+    @staticmethod
+    def node_keys(rel):
+        return (rel['from_table'], rel['from_column']), (rel['to_table'], rel['to_column'])
+
+    # -- journal ---------------------------------------------------------
+
+    def _sync(self):
+        """Load the models, or catch up with versions appended by another process"""
+        if self._state is None:
+            self._load()
+            return self._state
+        try:
+            size = os.path.getsize(self.journal_file)
+        except FileNotFoundError:
+            size = 0
+        if size < self._journal_end:
+            self._load()
+        elif size > self._journal_end:
+            applied = self._state.version
+            self._journal_end = self._replay(self._state, self._journal_end)
+            self._since_snapshot += self._state.version - applied
+            self._node_refs = None
+            if self._since_snapshot >= self.snapshot_every:
+                # bounds the in-memory history of processes that only read
+                self._write_snapshot(self._state)
+        return self._state
+
+    def _load(self):
+        state, offset = self._snapshot_at(None)
+        snapshot_version = state.version
+        self._state = state
+        self._journal_end = offset
+        self._node_refs = None
+        if offset == 0 and not os.path.exists(self.journal_file):
+            self._since_snapshot = 0
+            self._migrate_legacy_files()
+        else:
+            self._journal_end = self._replay(state, offset)
+            self._since_snapshot = state.version - snapshot_version
+
+    def _snapshot_versions(self):
+        if not os.path.isdir(self.history_folder):
+            return []
+        return sorted(int(m.group(1)) for m in map(_SNAPSHOT_NAME.match, os.listdir(self.history_folder)) if m)
+
+    def _snapshot_at(self, version):
+        """(state, journal offset) of the newest snapshot at or before version (None = latest)"""
+        for snapshot_version in reversed(self._snapshot_versions()):
+            if version is None or snapshot_version <= version:
+                path = os.path.join(self.history_folder, f"snapshot-{snapshot_version:08d}.json")
+                try:
+                    with open(path, 'r') as f:
+                        data = json.load(f)
+                except FileNotFoundError:
+                    continue  # dropped by another process meanwhile
+                return _ModelState.from_dict(data), data['journal_offset']
+        return _ModelState(), 0
+
+    def _replay(self, state, offset, until=None):
+        """Apply journal entries after offset (up to version until); returns the end offset"""
+        if not os.path.exists(self.journal_file):
+            return offset
+        with open(self.journal_file, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # torn write of a crashed process; overwritten by the next append
+                entry = json.loads(line)
+                if until is not None and entry['version'] > until:
+                    break
+                state.apply(entry)
+                offset += len(line)
+        return offset
+
+    def _append(self, kind, **data):
+        """Add one version to the journal and to the cached models"""
+        self._sync()  # loads (and migrates) before the journal is locked
+        os.makedirs(self.history_folder, exist_ok=True)
+        try:
+            with open(self.journal_file, 'ab') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)  # released when f is closed
+                # versions another process appended while we waited come first
+                state = self._sync()
+                entry = {'version': state.version + 1, 'kind': kind, 'at': datetime.now().isoformat(), **data}
+                line = (json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8')
+                f.seek(0, os.SEEK_END)
+                if f.tell() != self._journal_end:
+                    # only a torn last line can be left past the synced end
+                    f.truncate(self._journal_end)
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError:
+            self._state = None
+            raise
+        self._journal_end += len(line)
+        state.apply(entry)
+        if kind != 'changes':
+            self._node_refs = None
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.snapshot_every:
+            self._write_snapshot(state)
+        return entry['version']
+
+    def snapshot(self):
+        """Write the current models as a snapshot and drop the oldest ones"""
+        with self._lock:
+            self._write_snapshot(self._sync())
+
+    def _write_snapshot(self, state):
+        os.makedirs(self.history_folder, exist_ok=True)
+        path = os.path.join(self.history_folder, f"snapshot-{state.version:08d}.json")
+        if not os.path.exists(path):
+            # an existing one (e.g. by another process) already holds this history
+            _write_atomic(path, dict(state.to_dict(), journal_offset=self._journal_end))
+        state.history = []
+        self._since_snapshot = 0
+        for version in self._snapshot_versions()[:-self.keep_snapshots]:
+            try:
+                os.remove(os.path.join(self.history_folder, f"snapshot-{version:08d}.json"))
+            except FileNotFoundError:
+                pass
+
+    def _migrate_legacy_files(self):
+        # models saved before the journal existed become its first versions
+        for path, kind in ((self.initial_file, 'initial'), (self.edited_file, 'replace')):
+            if not os.path.exists(path) or not os.path.getsize(path):
+                continue  # e.g. the empty placeholders shipped in outputs/
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+            except ValueError:
+                logger.warning("Skipping unreadable legacy model %s", path)
+                continue
+            if not isinstance(data, dict) or 'relationships' not in data:
+                logger.warning("Skipping legacy model %s without relationships", path)
+                continue
+            self._append(kind, relationships=data['relationships'] or [])
+
+    # -- models ----------------------------------------------------------
+
     def save_initial_relationships(self, relationships):
         """Save initial auto-generated relationships"""
-        data = {
-            'relationships': relationships,
-            'created_at': datetime.now().isoformat(),
-            'version': 'initial'
-        }
-        
-        with open(self.initial_file, 'w') as f:
-            json.dump(data, f, indent=2)
-    
+        with self._lock:
+            self._append('initial', relationships=relationships)
+            _write_atomic(self.initial_file, {
+                'relationships': relationships,
+                'created_at': datetime.now().isoformat(),
+                'version': 'initial'
+            }, indent=2)
+
     def save_edited_relationships(self, relationships):
         """Save user-edited relationships"""
-        data = {
-            'relationships': relationships,
-            'updated_at': datetime.now().isoformat(),
-            'version': 'edited'
-        }
-        
-        with open(self.edited_file, 'w') as f:
-            json.dump(data, f, indent=2)
-    
+        with self._lock:
+            self._append('replace', relationships=relationships)
+
+    def reset_edits(self):
+        """Discard user edits, e.g. when a new model replaces the current one"""
+        with self._lock:
+            if self._sync().edited is not None:
+                self._append('reset')
+
+    def has_edits(self):
+        with self._lock:
+            return self._sync().edited is not None
+
     def load_initial_relationships(self):
         """Load initial relationships"""
-        if os.path.exists(self.initial_file):
-            with open(self.initial_file, 'r') as f:
-                data = json.load(f)
-                return data.get('relationships', {})
-        return {}
-    
+        with self._lock:
+            initial = self._sync().initial
+            return list(initial) if initial is not None else {}
+
     def load_edited_relationships(self):
         """Load edited relationships, fallback to initial if not found"""
-        if os.path.exists(self.edited_file):
-            with open(self.edited_file, 'r') as f:
-                data = json.load(f)
-                return data.get('relationships', {})
-        
-        return self.load_initial_relationships()
-    
-    def get_version_history(self):
-        history = []
-        for fpath, label in [(self.initial_file, 'initial'), (self.edited_file, 'edited')]:
-            if os.path.exists(fpath):
-                with open(fpath, 'r') as f:
-                    data = json.load(f)
-                    rels = data.get('relationships', [])
-                    history.append({
-                        'version': label,
-                        'created_at' if label == 'initial' else 'updated_at': data.get('created_at' if label == 'initial' else 'updated_at'),
-                        'relationship_count': len(rels)
-                    })
-        return history
+        with self._lock:
+            state = self._sync()
+            if state.edited is None and state.initial is None:
+                return {}
+            return state.current()
+
+    def latest_version(self):
+        with self._lock:
+            return self._sync().version
+
+    def apply_changes(self, ops):
+        """
+        Apply edge operations to the edited model and save it.
+
+        ops: list of {"op": "add", "relationship": {...}},
+        {"op": "remove", "id": edge id} or
+        {"op": "update", "id": edge id, "relationship": {fields to change}}.
+        The ops are applied all or nothing (ValueError names the first bad
+        one). Returns {"edges": {"add", "update", "remove"}, "nodes": {"add",
+        "remove"}, "counts"} with the added/updated relationships, removed
+        edge ids, the (table, column) nodes that appeared or lost their last
+        edge and the model's node and edge counts.
+        """
+        with self._lock:
+            state = self._sync()
+            # a copy of the initial model becomes the edited one only once the changes are journaled
+            edges = state.edited if state.edited is not None else \
+                {self.edge_id(rel): rel for rel in state.initial or []}
+            if self._node_refs is None:
+                self._node_refs = Counter(key for rel in edges.values() for key in self.node_keys(rel))
+            applied = []
+            nodes_before = {}
+            try:
+                for i, op in enumerate(ops):
+                    applied.append(self._apply_op(edges, op, i, nodes_before))
+            except (KeyError, TypeError, ValueError) as e:
+                # nothing was journaled yet: reload the models
+                self._state = None
+                raise ValueError(str(e).strip('"'))
+
+            # net effect of the ops, per edge and per node
+            changes = {'edges': {'add': [], 'update': [], 'remove': []}, 'nodes': {'add': [], 'remove': []}}
+            before = {}
+            for edge_id, previous in applied:
+                before.setdefault(edge_id, previous)
+            for edge_id, previous in before.items():
+                current = edges.get(edge_id)
+                if previous is None and current is not None:
+                    changes['edges']['add'].append(current)
+                elif previous is not None and current is None:
+                    changes['edges']['remove'].append(edge_id)
+                elif previous != current:
+                    changes['edges']['update'].append(current)
+            for key, count in nodes_before.items():
+                if not count and self._node_refs[key]:
+                    changes['nodes']['add'].append(key)
+                elif count and not self._node_refs[key]:
+                    changes['nodes']['remove'].append(key)
+
+            changes['counts'] = {'nodes': len(self._node_refs), 'edges': len(edges)}
+
+            if before:
+                self._append('changes', ops=[
+                    {'op': 'put', 'relationship': edges[edge_id]} if edge_id in edges else {'op': 'delete', 'id': edge_id}
+                    for edge_id in before
+                ])
+            return changes
+
+    def _apply_op(self, edges, op, index, nodes_before):
+        """Apply one op; returns (edge id, relationship before)"""
+        kind = op.get('op')
+        if kind == 'add':
+            rel = self._validated(op.get('relationship'))
+            edge_id = self.edge_id(rel)
+            if edge_id in edges:
+                raise ValueError(f"op {index}: relationship {edge_id} already exists")
+            self._put_edge(edges, edge_id, rel, nodes_before)
+            return edge_id, None
+        edge_id = op.get('id')
+        if edge_id not in edges:
+            raise ValueError(f"op {index}: unknown relationship {edge_id}")
+        previous = edges[edge_id]
+        if kind == 'remove':
+            self._put_edge(edges, edge_id, None, nodes_before)
+            return edge_id, previous
+        if kind == 'update':
+            rel = self._validated(dict(previous, **(op.get('relationship') or {})))
+            if self.edge_id(rel) != edge_id:
+                raise ValueError(f"op {index}: update cannot change the columns of {edge_id}, remove and add instead")
+            self._put_edge(edges, edge_id, rel, nodes_before)
+            return edge_id, previous
+        raise ValueError(f"op {index}: unknown op {kind!r}")
+
+    def _put_edge(self, edges, edge_id, rel, nodes_before):
+        """
+        Set or (rel=None) delete one edge, keeping node reference counts;
+        nodes_before collects the count of every node before its first change.
+        """
+        previous = edges.pop(edge_id, None) if rel is None else edges.get(edge_id)
+        if rel is not None:
+            edges[edge_id] = rel
+        for keys, step in ((self.node_keys(previous) if previous else (), -1),
+                           (self.node_keys(rel) if rel else (), 1)):
+            for key in keys:
+                nodes_before.setdefault(key, self._node_refs[key])
+                self._node_refs[key] += step
+                if self._node_refs[key] <= 0:
+                    del self._node_refs[key]
+
+    def _validated(self, rel):
+        if not isinstance(rel, dict) or any(not isinstance(rel.get(field), str) or not rel.get(field) for field in _IDENTITY):
+            raise ValueError(f"a relationship needs {', '.join(_IDENTITY)}")
+        rel = dict(rel)
+        rel['confidence'] = float(rel.get('confidence', 1.0))
+        return rel
+
+    def save_model_state(self, state):
+        """Save profiles, keys and table hashes needed for incremental analysis"""
+        os.makedirs(self.output_folder, exist_ok=True)
+        _write_atomic(self.state_file, state)
+
+    def load_model_state(self):
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        return None
+
+    def save_integrity_report(self, entries):
+        """Save {cache key: relationship report} (see IntegrityChecker.report)"""
+        os.makedirs(self.output_folder, exist_ok=True)
+        _write_atomic(self.integrity_file, entries)
+
+    def load_integrity_report(self):
+        if os.path.exists(self.integrity_file):
+            with open(self.integrity_file, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def merge_detected_relationships(self, relationships):
+        """
+        Replace the auto-detected relationships while keeping user edits.
+
+        Relationships the user deleted from the initial set stay deleted,
+        user-added or modified relationships are kept as saved, and newly
+        detected ones are added. Returns the merged edited model.
+        """
+        def rel_key(rel):
+            return (rel['from_table'], rel['from_column'], rel['to_table'], rel['to_column'])
+
+        previous_initial = self.load_initial_relationships() or []
+        self.save_initial_relationships(relationships)
+        if not self.has_edits():
+            return relationships
+
+        edited = self.load_edited_relationships() or []
+        initial_keys = {rel_key(rel) for rel in previous_initial}
+        edited_by_key = {rel_key(rel): rel for rel in edited}
+        user_removed = initial_keys - set(edited_by_key)
+
+        merged = []
+        for rel in relationships:
+            key = rel_key(rel)
+            if key in user_removed:
+                continue
+            merged.append(edited_by_key.pop(key, rel))
+        # user-added edges that detection did not produce
+        merged.extend(rel for key, rel in edited_by_key.items() if key not in initial_keys)
+
+        self.save_edited_relationships(merged)
+        return merged
+
+    def get_version_history(self, limit=None):
+        """Newest first: version number, kind, time and relationship count of each save"""
+        with self._lock:
+            state = self._sync()
+            wanted = state.version if limit is None else min(limit, state.version)
+            history = state.history[::-1]
+            # older summaries: from the snapshots, each ending where the next one's start
+            next_version = history[-1]['version'] - 1 if history else state.version
+            for snapshot_version in reversed(self._snapshot_versions()):
+                if len(history) >= wanted or next_version < 1 or snapshot_version < next_version:
+                    break
+                if snapshot_version == next_version:
+                    path = os.path.join(self.history_folder, f"snapshot-{snapshot_version:08d}.json")
+                    try:
+                        with open(path, 'r') as f:
+                            chunk = json.load(f)['history']
+                    except FileNotFoundError:
+                        break
+                    if not chunk:
+                        break
+                    history.extend(reversed(chunk))
+                    next_version = chunk[0]['version'] - 1
+            if len(history) < wanted and next_version >= 1:
+                # beyond the kept snapshots: replay the journal from the start
+                past = _ModelState()
+                self._replay(past, 0, until=next_version)
+                history.extend(reversed(past.history))
+            return [dict(summary) for summary in history[:wanted]]
+
+    def get_version(self, version):
+        """Relationships of the edited model (or initial, without edits) at a version"""
+        with self._lock:
+            state = self._sync()
+            if not 1 <= version <= state.version:
+                raise KeyError(version)
+            if version == state.version:
+                return state.current()
+            past, offset = self._snapshot_at(version)
+            self._replay(past, offset, until=version)
+            return past.current()
+
+    def diff_versions(self, from_version, to_version):
+        """Relationships added, removed and changed between two versions"""
+        before = {self.edge_id(rel): rel for rel in self.get_version(from_version)}
+        after = {self.edge_id(rel): rel for rel in self.get_version(to_version)}
+        return {
+            'from_version': from_version,
+            'to_version': to_version,
+            'added': [rel for edge_id, rel in after.items() if edge_id not in before],
+            'removed': [rel for edge_id, rel in before.items() if edge_id not in after],
+            'changed': [
+                {'before': before[edge_id], 'after': rel}
+                for edge_id, rel in after.items() if edge_id in before and before[edge_id] != rel
+            ]
+        }
@@ -0,0 +1,109 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, name):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.status = 'queued'
+        self.progress = {}
+        self.meta = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def report(self, counter, amount=1):
+        """Progress callback handed to the pipeline; also the cancellation point"""
+        with self._lock:
+            self.progress[counter] = self.progress.get(counter, 0) + amount
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        self._cancel.set()
+        if self.status == 'queued':
+            self.status = 'cancelled'
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def to_dict(self):
+        with self._lock:
+            progress = dict(self.progress)
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'progress': progress,
+            'meta': dict(self.meta),
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobManager:
+    """
+    Runs long analyses on a small local thread pool so requests return at
+    once. Finished jobs are kept for result_ttl seconds.
+    """
+
+    def __init__(self, max_workers=2, result_ttl=3600):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dme-job')
+        self.result_ttl = result_ttl
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name, func, *args, **kwargs):
+        """Run func(job, *args, **kwargs) in the background and return the job"""
+        self._purge_expired()
+        job = Job(name)
+        with self._lock:
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        if job.cancelled:
+            job.status = 'cancelled'
+            job.finished_at = time.time()
+            return
+        job.status = 'running'
+        try:
+            job.result = func(job, *args, **kwargs)
+            job.status = 'done'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def _purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for job_id in [j.id for j in self.jobs.values()
+                           if j.finished_at and now - j.finished_at > self.result_ttl]:
+                del self.jobs[job_id]
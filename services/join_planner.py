@@ -0,0 +1,146 @@
+import math
+import threading
+from itertools import islice
+import networkx as nx
+from services.graph_updater import GraphUpdater
+from utils.metrics import metrics
+
+
+class JoinPlanner:
+    """
+    Answers "how do I join table A to table F" over a relationship model.
+
+    Tables are nodes of an undirected networkx graph with one edge per
+    related table pair, costing one per join plus -log(confidence) of the
+    pair's most confident relationship, so paths prefer few joins and
+    then reliable ones. The path index is one Dijkstra predecessor tree
+    per source table, built on its first query; a path is then read off
+    the tree in O(path length).
+
+    sync() brings the graph to a new model version by diffing table
+    pairs, and drops only the trees an edit can change: a pair that got
+    dearer or disappeared invalidates the trees that use it, one that got
+    cheaper or appeared those in which it shortens a distance. Cached
+    k-alternative paths are dropped on any change.
+    """
+
+    def __init__(self):
+        self.graph = nx.Graph()
+        self.version = None
+        self._pairs = {}     # (table, table) sorted -> {edge id: relationship}
+        self._trees = {}     # source -> (predecessors, distances)
+        self._k_paths = {}   # (source, target, k) -> [tables]
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def weight(confidence):
+        return 1.0 - math.log(min(max(float(confidence), 1e-6), 1.0))
+
+    @staticmethod
+    def _pair(rel):
+        return tuple(sorted((rel['from_table'], rel['to_table'])))
+
+    def _pair_weight(self, rels):
+        return min(self.weight(rel.get('confidence', 1.0)) for rel in rels.values()) if rels else None
+
+    def sync(self, relationships, version=None):
+        """Update the graph to these relationships; a no-op for the version already loaded"""
+        with self._lock:
+            if version is not None and version == self.version:
+                return
+            pairs = {}
+            for rel in relationships:
+                if rel['from_table'] != rel['to_table']:
+                    pairs.setdefault(self._pair(rel), {})[GraphUpdater.edge_id(rel)] = rel
+
+            changed = [pair for pair in set(pairs) | set(self._pairs) if pairs.get(pair) != self._pairs.get(pair)]
+            for u, v in changed:
+                old, new = self._pair_weight(self._pairs.get((u, v))), self._pair_weight(pairs.get((u, v)))
+                if new is None:
+                    self.graph.remove_edge(u, v)
+                else:
+                    self.graph.add_edge(u, v, weight=new)
+                if old != new:
+                    self._invalidate(u, v, old, new)
+            for table in [node for node in self.graph if not self.graph.degree(node)]:
+                self.graph.remove_node(table)
+                self._trees.pop(table, None)
+            if changed:
+                self._k_paths.clear()
+            metrics.count('join_pairs_changed', len(changed))
+            self._pairs = pairs
+            self.version = version
+
+    def _invalidate(self, u, v, old, new):
+        for source, (pred, dist) in list(self._trees.items()):
+            if old is not None and (new is None or new > old):
+                stale = u in pred.get(v, ()) or v in pred.get(u, ())
+            else:
+                du, dv = dist.get(u), dist.get(v)
+                stale = (du is not None and (dv is None or du + new < dv)) or \
+                        (dv is not None and (du is None or dv + new < du))
+            if stale:
+                del self._trees[source]
+
+    def _tree(self, source):
+        if source not in self._trees:
+            with metrics.stage('join_path_index'):
+                self._trees[source] = nx.dijkstra_predecessor_and_distance(self.graph, source, weight='weight')
+        return self._trees[source]
+
+    def _require(self, table):
+        if table not in self.graph:
+            raise KeyError(table)
+
+    def join_path(self, source, target):
+        """Cheapest join path as a dict (see _describe), None if the tables are not connected"""
+        with self._lock:
+            self._require(source)
+            self._require(target)
+            pred, dist = self._tree(source)
+            if target not in dist:
+                return None
+            tables = [target]
+            while tables[-1] != source:
+                tables.append(pred[tables[-1]][0])
+            return self._describe(tables[::-1])
+
+    def join_paths(self, source, target, k=1):
+        """Up to k cheapest loop-free join paths, cheapest first"""
+        if k <= 1:
+            path = self.join_path(source, target)
+            return [path] if path else []
+        with self._lock:
+            self._require(source)
+            self._require(target)
+            if (source, target, k) not in self._k_paths:
+                try:
+                    paths = list(islice(nx.shortest_simple_paths(self.graph, source, target, weight='weight'), k))
+                except nx.NetworkXNoPath:
+                    paths = []
+                self._k_paths[(source, target, k)] = paths
+            return [self._describe(tables) for tables in self._k_paths[(source, target, k)]]
+
+    def _describe(self, tables):
+        """Tables in join order with, per step, the relationship to join on"""
+        joins = []
+        confidence = 1.0
+        for left, right in zip(tables, tables[1:]):
+            rel = max(self._pairs[tuple(sorted((left, right)))].values(), key=lambda r: r.get('confidence', 1.0))
+            from_columns = rel.get('from_columns') or [rel['from_column']]
+            to_columns = rel.get('to_columns') or [rel['to_column']]
+            if rel['from_table'] != left:
+                from_columns, to_columns = to_columns, from_columns
+            joins.append({
+                'left_table': left,
+                'right_table': right,
+                'on': [list(cols) for cols in zip(from_columns, to_columns)],
+                'relationship': rel
+            })
+            confidence *= rel.get('confidence', 1.0)
+        return {
+            'tables': tables,
+            'joins': joins,
+            'cost': round(sum(self.graph[a][b]['weight'] for a, b in zip(tables, tables[1:])), 6),
+            'confidence': round(confidence, 4)
+        }
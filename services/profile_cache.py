@@ -0,0 +1,70 @@
+import os
+import pickle
+import threading
+
+
+class ProfileCache:
+    """
+    Persistent, size-bounded LRU cache of per-table analysis results keyed by
+    the content hash of the uploaded CSV.
+
+    Entries are pickle files named "<version>-<key>.pkl"; anything written by
+    a different profiler version is dropped on start-up. Access time is the
+    file mtime, so recency survives restarts.
+    """
+
+    def __init__(self, cache_folder, version, max_bytes=256 * 1024 * 1024):
+        self.cache_folder = cache_folder
+        self.version = str(version)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_folder, exist_ok=True)
+        self._purge_other_versions()
+
+    def _path(self, key):
+        return os.path.join(self.cache_folder, f"{self.version}-{key}.pkl")
+
+    def _purge_other_versions(self):
+        prefix = f"{self.version}-"
+        for name in os.listdir(self.cache_folder):
+            if name.endswith('.pkl') and not name.startswith(prefix):
+                os.remove(os.path.join(self.cache_folder, name))
+
+    def get(self, key):
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                return None
+            os.utime(path)
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_folder):
+            if name.endswith('.pkl'):
+                stat = os.stat(os.path.join(self.cache_folder, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_folder, name))
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.cache_folder):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.cache_folder, name))
@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from utils.metrics import metrics
+
+
+class TableCache:
+    """
+    Process-wide LRU cache of parsed tables, bounded by their memory size.
+
+    Entries are keyed by e.g. the file's content hash and sized with
+    DataFrame.memory_usage(deep=True) once, when they are added; tables
+    larger than max_bytes are not cached. Every reader gets a shallow copy,
+    so renaming or adding columns stays private while the values are
+    shared: callers must not modify them in place. Concurrent misses on
+    one key wait for a single load instead of each parsing the file.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (DataFrame, bytes)
+        self._loading = {}             # key -> Future of the load in progress
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        metrics.count('table_cache_hits')
+        return entry[0].copy(deep=False)
+
+    def get_or_load(self, key, loader):
+        """Cached table for key, else loader() added to the cache"""
+        df = self.get(key)
+        if df is not None:
+            return df
+        with self._lock:
+            entry = self._entries.get(key)
+            future = self._loading.get(key)
+            owner = entry is None and future is None
+            if owner:
+                future = self._loading[key] = Future()
+        if entry is not None:  # put by a load that finished since get()
+            return entry[0].copy(deep=False)
+        if not owner:
+            # waiters share the owner's result, even a table too large to cache
+            return future.result().copy(deep=False)
+        try:
+            metrics.count('table_cache_misses')
+            df = loader()
+            self.put(key, df)
+            future.set_result(df)
+            return df.copy(deep=False)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            # the future is only dropped once it is resolved, so no caller can
+            # start a second load of the key while this one runs
+            with self._lock:
+                self._loading.pop(key, None)
+
+    def put(self, key, df):
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (df, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+                metrics.count('table_cache_evictions')
@@ -0,0 +1,167 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from utils.metrics import metrics
+
+
+class TableStore:
+    """
+    Columnar on-disk copy of every parsed upload.
+
+    Each table is a directory holding one .npy file per column plus a
+    meta.json. Numeric, boolean and datetime columns are stored natively;
+    everything else is dictionary-encoded as int32 codes (-1 = null) and a
+    UTF-8 blob + offsets of the distinct values, or, when they are not all
+    text (e.g. True/False in an object column with nulls), a JSON list of
+    them. meta.json records each column's dtype, which reads restore, so a
+    table reads back with the types it was written with. All files are
+    opened memory-mapped, so readers only page in the columns they touch.
+    """
+
+    def __init__(self, store_folder):
+        self.store_folder = store_folder
+        os.makedirs(store_folder, exist_ok=True)
+
+    def _table_dir(self, table):
+        return os.path.join(self.store_folder, table)
+
+    def has(self, table):
+        return os.path.exists(os.path.join(self._table_dir(table), 'meta.json'))
+
+    @metrics.timed('table_store_write')
+    def write(self, table, df):
+        """Convert a parsed DataFrame to the columnar layout"""
+        table_dir = self._table_dir(table)
+        tmp_dir = f"{table_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        columns = []
+        for i, col in enumerate(df.columns):
+            series = df[col]
+            prefix = os.path.join(tmp_dir, f"col_{i}")
+            meta = {'name': str(col), 'dtype': str(series.dtype)}
+            if (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series)
+                    or pd.api.types.is_datetime64_any_dtype(series)) \
+                    and not isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+                np.save(f"{prefix}.npy", series.to_numpy())
+                columns.append(dict(meta, encoding='plain'))
+            elif isinstance(series.dtype, pd.DatetimeTZDtype):
+                # UTC instants; the tz comes back from the dtype
+                np.save(f"{prefix}.npy", series.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy())
+                columns.append(dict(meta, encoding='plain'))
+            else:
+                codes, uniques = pd.factorize(series, use_na_sentinel=True)
+                np.save(f"{prefix}.npy", codes.astype(np.int32))
+                uniques = [v.item() if isinstance(v, np.generic) else v for v in uniques]
+                if all(isinstance(v, str) for v in uniques) or \
+                        not all(isinstance(v, (str, bool, int, float)) for v in uniques):
+                    self._write_text(prefix, uniques)
+                    columns.append(dict(meta, encoding='dictionary'))
+                else:
+                    with open(f"{prefix}.values.json", 'w') as f:
+                        json.dump(uniques, f)
+                    columns.append(dict(meta, encoding='dictionary', values='json'))
+
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump({'num_rows': len(df), 'columns': columns}, f)
+
+        shutil.rmtree(table_dir, ignore_errors=True)
+        os.replace(tmp_dir, table_dir)
+
+    @staticmethod
+    def _write_text(prefix, uniques):
+        blobs = [str(v).encode('utf-8') for v in uniques]
+        offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in blobs], out=offsets[1:])
+        np.save(f"{prefix}.offsets.npy", offsets)
+        with open(f"{prefix}.dict", 'wb') as f:
+            f.write(b''.join(blobs))
+
+    def _meta(self, table):
+        with open(os.path.join(self._table_dir(table), 'meta.json'), 'r') as f:
+            return json.load(f)
+
+    def columns(self, table):
+        return [c['name'] for c in self._meta(table)['columns']]
+
+    def num_rows(self, table):
+        return self._meta(table)['num_rows']
+
+    def read_column(self, table, column, meta=None):
+        meta = meta or self._meta(table)
+        names = [c['name'] for c in meta['columns']]
+        i = names.index(column)
+        prefix = os.path.join(self._table_dir(table), f"col_{i}")
+        values = np.load(f"{prefix}.npy", mmap_mode='r')
+        column_meta = meta['columns'][i]
+        if column_meta['encoding'] == 'plain':
+            return self._restore(pd.Series(values, name=column, copy=False), column_meta)
+
+        return self._restore(pd.Series(self._lookup(prefix, column_meta)[np.asarray(values)], name=column), column_meta)
+
+    @staticmethod
+    def _restore(series, column_meta):
+        """Back to the written dtype (tables stored before dtypes were recorded stay as read)"""
+        dtype = column_meta.get('dtype')
+        if dtype is None or dtype == str(series.dtype):
+            return series
+        dtype = pd.api.types.pandas_dtype(dtype)
+        if isinstance(dtype, pd.DatetimeTZDtype):
+            return series.dt.tz_localize('UTC').dt.tz_convert(dtype.tz)
+        return series.astype(dtype)
+
+    def _lookup(self, prefix, column_meta):
+        if column_meta.get('values') == 'json':
+            with open(f"{prefix}.values.json", 'r') as f:
+                values = json.load(f)
+            lookup = np.empty(len(values) + 1, dtype=object)
+            lookup[:-1] = values
+            lookup[-1] = np.nan
+            return lookup
+        offsets = np.load(f"{prefix}.offsets.npy")
+        if len(offsets) > 1:
+            blob = np.memmap(f"{prefix}.dict", dtype=np.uint8, mode='r')
+            categories = [blob[offsets[j]:offsets[j + 1]].tobytes().decode('utf-8')
+                          for j in range(len(offsets) - 1)]
+        else:
+            categories = []
+        # one trailing NaN slot so code -1 decodes to a null
+        return np.array(categories + [np.nan], dtype=object)
+
+    @metrics.timed('table_store_read')
+    def read(self, table, columns=None):
+        """Load a table (or only the requested columns) as a DataFrame"""
+        meta = self._meta(table)
+        names = columns if columns is not None else [c['name'] for c in meta['columns']]
+        return pd.DataFrame(
+            {name: self.read_column(table, name, meta) for name in names},
+            copy=False
+        )
+
+    def read_blocks(self, table, columns, rows):
+        """Yield the columns as DataFrames of up to rows rows, decoding one block at a time"""
+        meta = self._meta(table)
+        names = [c['name'] for c in meta['columns']]
+        arrays = {}
+        for name in columns:
+            i = names.index(name)
+            prefix = os.path.join(self._table_dir(table), f"col_{i}")
+            column_meta = meta['columns'][i]
+            lookup = self._lookup(prefix, column_meta) if column_meta['encoding'] != 'plain' else None
+            arrays[name] = (np.load(f"{prefix}.npy", mmap_mode='r'), lookup, column_meta)
+        for start in range(0, meta['num_rows'], rows):
+            stop = min(start + rows, meta['num_rows'])
+            index = pd.RangeIndex(start, stop)
+            yield pd.DataFrame({
+                name: self._restore(pd.Series(
+                    values[start:stop] if lookup is None else lookup[np.asarray(values[start:stop])],
+                    index=index, name=name
+                ), column_meta)
+                for name, (values, lookup, column_meta) in arrays.items()
+            }, index=index)
+
+    def delete(self, table):
+        shutil.rmtree(self._table_dir(table), ignore_errors=True)
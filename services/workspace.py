@@ -0,0 +1,135 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from services.graph_updater import GraphUpdater, _write_atomic
+from services.join_planner import JoinPlanner
+from utils.metrics import metrics
+
+_WORKSPACE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class Workspace:
+    """One analyst's model: its own GraphUpdater folder and join planner"""
+
+    def __init__(self, workspace_id, folder):
+        self.id = workspace_id
+        self.folder = folder
+        self.uploads_file = os.path.join(folder, 'uploads.json')
+        self.graph_updater = GraphUpdater(folder)
+        self.join_planner = JoinPlanner()
+        self.last_used = time.time()
+        self.active = 0  # requests or jobs currently using the workspace
+        self._lock = threading.Lock()
+
+    def touch(self):
+        now = time.time()
+        if now - self.last_used > 60:
+            # the folder's mtime carries the idle time across restarts
+            try:
+                os.utime(self.folder)
+            except FileNotFoundError:
+                pass
+        self.last_used = now
+
+    def uploads(self):
+        """Every upload saved for this workspace, analyzed or not"""
+        try:
+            with open(self.uploads_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def add_uploads(self, filenames):
+        """Record files saved for this workspace, so that expiry deletes them"""
+        with self._lock:
+            uploads = self.uploads()
+            uploads.extend(name for name in filenames if name not in uploads)
+            _write_atomic(self.uploads_file, uploads)
+
+    def __enter__(self):
+        with self._lock:
+            self.active += 1
+        self.touch()
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.active -= 1
+        self.touch()
+
+
+class WorkspaceManager:
+    """
+    Session-scoped workspaces under <root>/<workspace id>/.
+
+    Each workspace keeps its relationship models, history, model state and
+    integrity cache in its own folder, so concurrent analysts no longer
+    overwrite each other's outputs. A workspace unused for longer than ttl
+    seconds, and not held by a request or job ("with workspace:"), is
+    deleted together with every upload recorded by add_uploads or listed
+    in its model state; on_delete(workspace id, filenames) removes those.
+    Workspaces left on disk by a previous process are reopened on their
+    next request.
+    """
+
+    def __init__(self, root, ttl=4 * 3600, on_delete=None, purge_interval=300):
+        self.root = root
+        self.ttl = ttl
+        self.on_delete = on_delete
+        self.purge_interval = purge_interval
+        self.workspaces = {}
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        os.makedirs(root, exist_ok=True)
+
+    def get(self, workspace_id=None):
+        """The workspace with this id, reopened or created; a new one if the id is missing or malformed"""
+        self.purge_expired()
+        if not workspace_id or not _WORKSPACE_ID.match(workspace_id):
+            workspace_id = uuid.uuid4().hex
+        with self._lock:
+            workspace = self.workspaces.get(workspace_id)
+            if workspace is None:
+                folder = os.path.join(self.root, workspace_id)
+                if not os.path.isdir(folder):
+                    os.makedirs(folder)
+                    metrics.count('workspaces_created')
+                workspace = self.workspaces[workspace_id] = Workspace(workspace_id, folder)
+        workspace.touch()
+        return workspace
+
+    def purge_expired(self, force=False):
+        """Delete idle workspaces; runs at most every purge_interval seconds unless forced"""
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_purge < self.purge_interval:
+                return []
+            self._last_purge = now
+            expired = []
+            for workspace_id in os.listdir(self.root):
+                folder = os.path.join(self.root, workspace_id)
+                if not _WORKSPACE_ID.match(workspace_id) or not os.path.isdir(folder):
+                    continue
+                workspace = self.workspaces.get(workspace_id)
+                if workspace is not None and workspace.active:
+                    continue
+                last_used = workspace.last_used if workspace is not None else os.path.getmtime(folder)
+                if last_used < now - self.ttl:
+                    # deleted under the lock, so get() cannot reopen it meanwhile
+                    self.workspaces.pop(workspace_id, None)
+                    self._delete(folder, workspace)
+                    expired.append(workspace_id)
+        return expired
+
+    def _delete(self, folder, workspace):
+        if workspace is None:
+            workspace = Workspace(os.path.basename(folder), folder)
+        state = workspace.graph_updater.load_model_state() or {}
+        if self.on_delete is not None:
+            self.on_delete(workspace.id, sorted(set(workspace.uploads()) | set(state.get('tables', {}))))
+        shutil.rmtree(folder, ignore_errors=True)
+        metrics.count('workspaces_expired')
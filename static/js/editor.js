@@ -1,12 +1,18 @@
 // Graph editor functionality
+//
+// The embedded PyVis script declares the globals `network`, `nodes` and
+// `edges` (vis.DataSet); edits go to /graph/changes as edge ops and only the
+// changed items that come back are applied to those DataSets.
 
-let network;
-let nodes, edges;
 let originalRelationships;
+let pendingOps = [];
+let inFlight = null;
+// large models start as one cluster node per table (graphMode 'tables');
+// double-clicking a cluster replaces it by the table's columns
+const CLUSTER_PREFIX = 'table::';
+const expandedTables = new Set();
 
 document.addEventListener('DOMContentLoaded', function() {
-    const graphData = buildGraphFromFlatRelationships(currentRelationships);
-    currentRelationships = graphData;
     originalRelationships = JSON.parse(JSON.stringify(currentRelationships));
     updateGraphStats();
     setupEventListeners();
@@ -18,12 +24,12 @@ function setupEventListeners() {
     document.getElementById('layout-select').addEventListener('change', function() {
         changeLayout(this.value);
     });
-    
+
     // Node size change
     document.getElementById('node-size').addEventListener('input', function() {
         changeNodeSize(this.value);
     });
-    
+
     // Edge width change
     document.getElementById('edge-width').addEventListener('input', function() {
         changeEdgeWidth(this.value);
@@ -31,19 +37,102 @@ function setupEventListeners() {
 }
 
 function initializeNetwork() {
-    // This function can be used to initialize vis.js network if needed
-    // For now, PyVis handles the network creation
-    console.log('Network initialized');
+    if (typeof network === 'undefined' || !network) {
+        return;
+    }
+    network.setOptions({
+        manipulation: {
+            enabled: false,
+            addEdge: function(data, callback) {
+                callback(null); // the server's answer adds the edge
+                const from = nodes.get(data.from);
+                const to = nodes.get(data.to);
+                if (from && to && from.id !== to.id) {
+                    addEdge({
+                        from_table: from.table, from_column: from.column,
+                        to_table: to.table, to_column: to.column,
+                        confidence: 1.0
+                    });
+                }
+            }
+        }
+    });
+    network.on('selectNode', params => showNodeInfo(params.nodes[0]));
+    network.on('doubleClick', params => {
+        const node = params.nodes.length ? nodes.get(params.nodes[0]) : null;
+        if (node && node.cluster) {
+            expandTable(node.table);
+        }
+    });
+    network.on('selectEdge', params => {
+        if (!params.nodes.length) {
+            showEdgeInfo(params.edges[0]);
+        }
+    });
 }
 
-function updateGraphStats() {
-    const nodeCount = currentRelationships.nodes ? currentRelationships.nodes.length : 0;
-    const edgeCount = currentRelationships.edges ? currentRelationships.edges.length : 0;
-    
+function updateGraphStats(counts) {
+    const nodeCount = counts ? counts.nodes : (typeof nodes !== 'undefined' && nodes ? nodes.length : 0);
+    const edgeCount = counts ? counts.edges : (typeof edges !== 'undefined' && edges ? edges.length : 0);
+
     document.getElementById('node-count').textContent = nodeCount;
     document.getElementById('edge-count').textContent = edgeCount;
 }
 
+function showNodeInfo(nodeId) {
+    const node = nodes.get(nodeId);
+    if (!node) {
+        return;
+    }
+    const info = document.getElementById('node-info');
+    info.innerHTML = '<h5>Node Information</h5>';
+    info.insertAdjacentHTML('beforeend', '<p><strong></strong><br><small></small></p>');
+    info.querySelector('strong').textContent = node.table;
+    info.querySelector('small').textContent = node.cluster ? node.title : node.column;
+    if (node.cluster) {
+        return;
+    }
+
+    const button = document.createElement('button');
+    button.className = 'btn btn-sm btn-outline-primary';
+    button.textContent = 'Add relationship from here';
+    button.onclick = () => {
+        network.selectNodes([nodeId]);
+        network.addEdgeMode();
+        showNotification('Drag from this node to the referenced column', 'success');
+    };
+    info.appendChild(button);
+}
+
+function showEdgeInfo(edgeId) {
+    const edge = edges.get(edgeId);
+    if (!edge) {
+        return;
+    }
+    const info = document.getElementById('edge-info');
+    info.innerHTML = '<h5>Edge Information</h5><p><small></small></p>';
+    info.querySelector('small').textContent = edge.title;
+
+    const confidence = document.createElement('input');
+    confidence.type = 'number';
+    confidence.min = '0';
+    confidence.max = '1';
+    confidence.step = '0.01';
+    confidence.value = edge.label;
+    confidence.className = 'form-control form-control-sm mb-2';
+    confidence.onchange = () => updateEdge(edgeId, { confidence: parseFloat(confidence.value) });
+    info.appendChild(confidence);
+
+    const remove = document.createElement('button');
+    remove.className = 'btn btn-sm btn-outline-danger';
+    remove.textContent = 'Delete relationship';
+    remove.onclick = () => {
+        removeEdge(edgeId);
+        info.innerHTML = '<h5>Edge Information</h5><p class="text-muted">Click on an edge to see details</p>';
+    };
+    info.appendChild(remove);
+}
+
 function changeLayout(layoutType) {
     console.log('Changing layout to:', layoutType);
     // Layout change logic would go here
@@ -60,24 +149,33 @@ function changeEdgeWidth(width) {
     // Edge width change logic would go here
 }
 
-function saveGraph() {
-    // Get current graph state
-    const updatedRelationships = getCurrentGraphState();
-    
-    fetch('/update_graph', {
+// Edge ops are sent in order, one request at a time; ops queued while a
+// request is in flight go out together in the next one
+function queueChanges(ops) {
+    pendingOps.push(...ops);
+    if (!inFlight) {
+        flushChanges();
+    }
+    return inFlight;
+}
+
+function flushChanges() {
+    if (!pendingOps.length) {
+        return Promise.resolve();
+    }
+    const ops = pendingOps;
+    pendingOps = [];
+    inFlight = fetch('/graph/changes', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
         },
-        body: JSON.stringify({
-            relationships: updatedRelationships
-        })
+        body: JSON.stringify({ ops: ops })
     })
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            showNotification('Graph saved successfully!', 'success');
-            currentRelationships = updatedRelationships;
+            applyVisChanges(data);
         } else {
             showNotification('Error saving graph: ' + data.error, 'error');
         }
@@ -85,7 +183,64 @@ function saveGraph() {
     .catch(error => {
         console.error('Error:', error);
         showNotification('Error saving graph', 'error');
+    })
+    .finally(() => {
+        inFlight = null;
+        if (pendingOps.length) {
+            flushChanges();
+        }
+    });
+    return inFlight;
+}
+
+function applyVisChanges(changes) {
+    // column items of collapsed tables attach to the table's cluster node
+    const shown = node => graphMode !== 'tables' || expandedTables.has(node.table);
+    const attach = edge => Object.assign({}, edge, {
+        from: expandedTables.has(edge.from_table) || graphMode !== 'tables' ? edge.from : CLUSTER_PREFIX + edge.from_table,
+        to: expandedTables.has(edge.to_table) || graphMode !== 'tables' ? edge.to : CLUSTER_PREFIX + edge.to_table
+    });
+    applyItems({
+        nodes: { add: changes.nodes.add.filter(shown), remove: changes.nodes.remove },
+        edges: {
+            add: changes.edges.add.map(attach),
+            update: changes.edges.update.map(attach),
+            remove: changes.edges.remove
+        }
     });
+    updateGraphStats(changes.counts);
+}
+
+function applyItems(changes) {
+    // nodes first, so added edges find their ends
+    nodes.add(changes.nodes.add);
+    edges.remove(changes.edges.remove);
+    edges.update(changes.edges.update);
+    edges.add(changes.edges.add);
+    nodes.remove(changes.nodes.remove);
+}
+
+function expandTable(table) {
+    const params = new URLSearchParams({ table: table });
+    expandedTables.forEach(name => params.append('expanded', name));
+    fetch('/graph/expand?' + params.toString())
+    .then(response => response.json())
+    .then(data => {
+        if (data.error) {
+            throw new Error(data.error);
+        }
+        expandedTables.add(table);
+        applyItems(data);
+        updateGraphStats();
+    })
+    .catch(error => showNotification('Error expanding table: ' + error.message, 'error'));
+}
+
+function saveGraph() {
+    // every edit is saved as it is made; wait for the ones still on their way
+    (inFlight || Promise.resolve())
+    .then(flushChanges)
+    .then(() => showNotification('Graph saved successfully!', 'success'));
 }
 
 function resetGraph() {
@@ -95,12 +250,6 @@ function resetGraph() {
     }
 }
 
-function getCurrentGraphState() {
-    // This would extract the current state from the vis.js network
-    // For now, return the current relationships
-    return currentRelationships;
-}
-
 function showNotification(message, type) {
     const alertClass = type === 'success' ? 'alert-success' : 'alert-danger';
     const alertHtml = `
@@ -109,11 +258,11 @@ function showNotification(message, type) {
             <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
         </div>
     `;
-    
+
     // Insert at the top of the container
     const container = document.querySelector('.container');
     container.insertAdjacentHTML('afterbegin', alertHtml);
-    
+
     // Auto-dismiss after 5 seconds
     setTimeout(() => {
         const alert = container.querySelector('.alert');
@@ -124,86 +273,14 @@ function showNotification(message, type) {
 }
 
 // Additional utility functions
-function addNode(nodeData) {
-    currentRelationships.nodes.push(nodeData);
-    updateGraphStats();
+function addEdge(relationship) {
+    return queueChanges([{ op: 'add', relationship: relationship }]);
 }
 
-function removeNode(nodeId) {
-    currentRelationships.nodes = currentRelationships.nodes.filter(node => node.id !== nodeId);
-    currentRelationships.edges = currentRelationships.edges.filter(edge => 
-        edge.from !== nodeId && edge.to !== nodeId
-    );
-    updateGraphStats();
-}
-
-function addEdge(edgeData) {
-    currentRelationships.edges.push(edgeData);
-    updateGraphStats();
+function updateEdge(edgeId, fields) {
+    return queueChanges([{ op: 'update', id: edgeId, relationship: fields }]);
 }
 
 function removeEdge(edgeId) {
-    currentRelationships.edges = currentRelationships.edges.filter(edge => edge.id !== edgeId);
-    updateGraphStats();
+    return queueChanges([{ op: 'remove', id: edgeId }]);
 }
-
-// Update the save function to handle multiple files
-function saveGraph() {
-    const updatedRelationships = getCurrentGraphState();
-    
-    fetch('/update_graph', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-            relationships: updatedRelationships,
-            filenames: currentFilenames // Add this variable to track filenames
-        })
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            showNotification('Graph saved successfully!', 'success');
-            currentRelationships = updatedRelationships;
-        } else {
-            showNotification('Error saving graph: ' + data.error, 'error');
-        }
-    })
-    .catch(error => {
-        console.error('Error:', error);
-        showNotification('Error saving graph', 'error');
-    });
-}
-
-function buildGraphFromFlatRelationships(flatRelationships) {
-    const nodeMap = {};
-    const nodes = [];
-    const edges = [];
-
-    flatRelationships.forEach((rel, index) => {
-        const fromLabel = `${rel.from_table}:${rel.from_column}`;
-        const toLabel = `${rel.to_table}:${rel.to_column}`;
-
-        if (!nodeMap[fromLabel]) {
-            nodeMap[fromLabel] = nodes.length;
-            nodes.push({ id: nodeMap[fromLabel], label: fromLabel });
-        }
-
-        if (!nodeMap[toLabel]) {
-            nodeMap[toLabel] = nodes.length;
-            nodes.push({ id: nodeMap[toLabel], label: toLabel });
-        }
-
-        edges.push({
-            from: nodeMap[fromLabel],
-            to: nodeMap[toLabel],
-            label: `Conf: ${rel.confidence}`,
-            title: `FK: ${fromLabel} → ${toLabel}`,
-            width: rel.confidence * 5
-        });
-    });
-
-    return { nodes, edges };
-}
-
@@ -0,0 +1,171 @@
+// Background upload: submit files to /upload_async and poll the job for progress
+
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.getElementById('upload-form');
+    if (!form || !window.fetch) {
+        return; // plain form post to /upload still works
+    }
+
+    form.addEventListener('submit', function(event) {
+        event.preventDefault();
+        if (form.dataset.chunkedAction && window.Blob && Blob.prototype.slice) {
+            startChunkedUpload(form);
+        } else {
+            startUpload(form);
+        }
+    });
+});
+
+const CHUNK_SIZE = 8 * 1024 * 1024;  // below the server's request size limit
+const CHUNK_RETRIES = 5;
+
+function startUpload(form) {
+    const panel = document.getElementById('upload-progress');
+    const submitButton = form.querySelector('button[type="submit"]');
+    submitButton.disabled = true;
+    panel.classList.remove('d-none');
+    setProgressText('Uploading files...');
+
+    fetch(form.dataset.asyncAction, {
+        method: 'POST',
+        body: new FormData(form)
+    })
+    .then(response => response.json().then(data => ({ ok: response.ok, data: data })))
+    .then(({ ok, data }) => {
+        if (!ok) {
+            throw new Error(data.error || 'Upload failed');
+        }
+        document.getElementById('cancel-job').onclick = () => cancelJob(data.job_id);
+        pollJob(data.progress_url, data.result_url);
+    })
+    .catch(error => {
+        submitButton.disabled = false;
+        setProgressText('Error: ' + error.message);
+    });
+}
+
+// Resumable upload: each file goes to /uploads in CHUNK_SIZE pieces; after a
+// failed chunk the server's offset says where to continue
+function startChunkedUpload(form) {
+    const panel = document.getElementById('upload-progress');
+    const submitButton = form.querySelector('button[type="submit"]');
+    submitButton.disabled = true;
+    panel.classList.remove('d-none');
+
+    const files = Array.from(form.querySelector('input[type="file"]').files)
+        .filter(file => file.name.toLowerCase().endsWith('.csv'));
+    const totalBytes = files.reduce((sum, file) => sum + file.size, 0);
+    let sentBefore = 0;
+
+    (async function() {
+        const uploadIds = [];
+        for (const file of files) {
+            const upload = await postJson(form.dataset.chunkedAction, { filename: file.name, size: file.size });
+            await sendChunks(file, upload, sent => {
+                const percent = totalBytes ? 50 * (sentBefore + sent) / totalBytes : 50;
+                document.getElementById('upload-progress-bar').style.width = `${Math.round(percent)}%`;
+                setProgressText(`Uploading ${file.name}: ${Math.round(100 * sent / Math.max(file.size, 1))}%`);
+            });
+            await postJson(upload.complete_url, {});
+            sentBefore += file.size;
+            uploadIds.push(upload.upload_id);
+        }
+        return postJson(form.dataset.analyzeAction, { uploads: uploadIds });
+    })()
+    .then(job => {
+        document.getElementById('cancel-job').onclick = () => cancelJob(job.job_id);
+        pollJob(job.progress_url, job.result_url);
+    })
+    .catch(error => {
+        submitButton.disabled = false;
+        setProgressText('Error: ' + error.message);
+    });
+}
+
+async function sendChunks(file, upload, onProgress) {
+    let offset = 0;
+    let failures = 0;
+    while (offset < file.size) {
+        try {
+            const response = await fetch(`${upload.upload_url}?offset=${offset}`, {
+                method: 'PUT',
+                body: file.slice(offset, offset + CHUNK_SIZE)
+            });
+            const data = await response.json();
+            if (!response.ok && response.status !== 409) {
+                throw new Error(data.error || 'Upload failed');
+            }
+            offset = data.offset;
+            failures = 0;
+        } catch (error) {
+            if (++failures > CHUNK_RETRIES) {
+                throw error;
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+            const status = await fetch(upload.upload_url).then(response => response.json());
+            offset = status.offset;
+        }
+        onProgress(offset);
+    }
+}
+
+function postJson(url, body) {
+    return fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
+    })
+    .then(response => response.json().then(data => {
+        if (!response.ok) {
+            throw new Error(data.error || 'Request failed');
+        }
+        return data;
+    }));
+}
+
+function pollJob(progressUrl, resultUrl) {
+    fetch(progressUrl)
+    .then(response => response.json())
+    .then(job => {
+        renderProgress(job);
+        if (job.status === 'done') {
+            window.location.href = resultUrl;
+        } else if (job.status === 'queued' || job.status === 'running') {
+            setTimeout(() => pollJob(progressUrl, resultUrl), 1000);
+        } else {
+            setProgressText(`Analysis ${job.status}${job.error ? ': ' + job.error : ''}`);
+            document.querySelector('#upload-form button[type="submit"]').disabled = false;
+        }
+    })
+    .catch(() => setTimeout(() => pollJob(progressUrl, resultUrl), 2000));
+}
+
+function renderProgress(job) {
+    const p = job.progress || {};
+    const filesDone = p.files_parsed || 0;
+    const filesTotal = p.files_total || 0;
+    const columnsDone = p.columns_profiled || 0;
+    const columnsTotal = p.columns_total || 0;
+
+    // parsing counts for the first half of the bar, profiling for the second
+    let percent = filesTotal ? 50 * filesDone / filesTotal : 0;
+    if (columnsTotal) {
+        percent = 50 + 50 * columnsDone / columnsTotal;
+    }
+    const bar = document.getElementById('upload-progress-bar');
+    bar.style.width = `${Math.round(percent)}%`;
+
+    setProgressText(
+        `Files parsed: ${filesDone}/${filesTotal} · ` +
+        `Columns profiled: ${columnsDone}/${columnsTotal} · ` +
+        `Pairs compared: ${p.pairs_compared || 0}`
+    );
+}
+
+function setProgressText(text) {
+    document.getElementById('upload-progress-text').textContent = text;
+}
+
+function cancelJob(jobId) {
+    fetch(`/jobs/${jobId}/cancel`, { method: 'POST' });
+}
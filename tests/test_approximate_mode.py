@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+from core.core_data_engine import CoreDataEngine
+
+
+def test_approximate_mode_finds_composite_foreign_keys_from_sketches():
+    rng = np.random.default_rng(0)
+    lines = pd.DataFrame({
+        "order_id": np.repeat(np.arange(2000), 5),
+        "line_no": np.tile(np.arange(1, 6), 2000),
+        "qty": rng.integers(1, 9, 10000),
+    })
+    picked = rng.choice(len(lines), 6000)
+    shipments = pd.DataFrame({
+        "shipment_id": np.arange(6000),
+        "order_ref": lines["order_id"].to_numpy()[picked].astype(float),
+        "line_ref": lines["line_no"].to_numpy()[picked],
+    })
+    shipments.loc[5, "order_ref"] = np.nan
+    engine = CoreDataEngine(approximate=True, verify_top=5)
+    engine.detect_composite_foreign_keys = None  # the exact search must not run in this mode
+
+    relationships = engine.process_multiple_data({"lines.csv": lines, "shipments.csv": shipments})
+    composite = [r for r in relationships if "from_columns" in r]
+    assert [(r["from_columns"], r["to_columns"], r["confidence"], r["verified"]) for r in composite] == \
+        [(["order_ref", "line_ref"], ["order_id", "line_no"], 1.0, True)]
@@ -0,0 +1,19 @@
+import pandas as pd
+from core.core_data_engine import CoreDataEngine
+
+
+def _rel_keys(relationships):
+    return sorted((r["from_table"], r["from_column"], r["to_table"], r["to_column"]) for r in relationships)
+
+
+def test_pruning_keeps_key_whose_shape_changes_after_the_first_values():
+    # the key's first 100 values all look like "K000", the referencing ones are digits
+    ids = [f"K{i:03d}" for i in range(150)] + [str(100000 + i) for i in range(850)]
+    dfs = {
+        "keys.csv": pd.DataFrame({"id": ids}),
+        "refs.csv": pd.DataFrame({"ref_id": ids[150:] * 2, "n": range(1700)}),
+    }
+    unpruned = CoreDataEngine(prune_candidates=False).process_multiple_data(dfs)
+    pruned = CoreDataEngine(prune_candidates=True).process_multiple_data(dfs)
+    assert ("refs.csv", "ref_id", "keys.csv", "id") in _rel_keys(unpruned)
+    assert _rel_keys(pruned) == _rel_keys(unpruned)
@@ -0,0 +1,23 @@
+import json
+import os
+import shutil
+import pandas as pd
+import cli
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_cli_runs_against_shipped_outputs_folder(tmp_path):
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    pd.DataFrame({"id": range(1, 51), "name": [f"c{i}" for i in range(1, 51)]}).to_csv(exports / "customers.csv", index=False)
+    pd.DataFrame({"order_id": range(200), "customer_id": [i % 50 + 1 for i in range(200)]}).to_csv(exports / "orders.csv", index=False)
+    output = tmp_path / "outputs"
+    shutil.copytree(os.path.join(REPO, "outputs"), output)
+
+    assert cli.main([str(exports), "--output", str(output)]) == 0
+
+    with open(output / "initial_relationships.json") as f:
+        relationships = json.load(f)["relationships"]
+    assert [(r["from_table"], r["from_column"], r["to_table"], r["to_column"]) for r in relationships] == \
+        [("orders.csv", "customer_id", "customers.csv", "id")]
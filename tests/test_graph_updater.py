@@ -0,0 +1,23 @@
+import json
+from services.graph_updater import GraphUpdater
+
+REL = {"from_table": "orders.csv", "from_column": "customer_id",
+       "to_table": "customers.csv", "to_column": "id", "confidence": 1.0}
+
+
+def test_empty_legacy_files_are_not_migrated(tmp_path):
+    (tmp_path / "initial_relationships.json").write_text("")
+    (tmp_path / "edited_model.json").write_text("")
+    updater = GraphUpdater(str(tmp_path))
+    assert updater.latest_version() == 0
+    assert updater.merge_detected_relationships([REL]) == [REL]
+    assert GraphUpdater(str(tmp_path)).load_edited_relationships() == [REL]
+
+
+def test_unreadable_legacy_file_is_skipped_and_valid_one_migrated(tmp_path):
+    (tmp_path / "initial_relationships.json").write_text(json.dumps({"relationships": [REL]}))
+    (tmp_path / "edited_model.json").write_text("{not json")
+    updater = GraphUpdater(str(tmp_path))
+    assert updater.latest_version() == 1
+    assert updater.load_edited_relationships() == [REL]
+    assert not updater.has_edits()
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+from core.core_data_engine import CoreDataEngine
+from core.parallel_profiler import ParallelProfiler
+from services.profile_cache import ProfileCache
+
+
+def _tables():
+    rng = np.random.default_rng(0)
+    return {
+        "a.csv": pd.DataFrame({"id": np.arange(500), "code": rng.choice(["x", "y", "z"], 500)}),
+        "b.csv": pd.DataFrame({"a_id": rng.integers(0, 500, 800), "amount": rng.random(800)}),
+    }
+
+
+def test_pool_profiles_match_serial_profiles(tmp_path):
+    # the cache holds a lock, so the engine is shipped to workers without it
+    engine = CoreDataEngine(cache=ProfileCache(str(tmp_path), "test"))
+    tables = _tables()
+    serial = ParallelProfiler(engine, workers=1).profile_columns(tables)
+    for method in ("spawn", "fork"):
+        pooled = ParallelProfiler(engine, workers=2, min_cells=0, start_method=method).profile_columns(tables)
+        assert pooled == serial
+    assert engine.cache is not None
+
+
+def test_default_start_method_is_not_fork():
+    assert ParallelProfiler(CoreDataEngine()).start_method in ("forkserver", "spawn")
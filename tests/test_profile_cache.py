@@ -0,0 +1,30 @@
+import pandas as pd
+from core.core_data_engine import CoreDataEngine
+from core.streaming_profiler import StreamingProfiler
+from services.profile_cache import ProfileCache
+
+
+def _seeded_engine(tmp_path, streamed):
+    engine = CoreDataEngine(cache=ProfileCache(str(tmp_path), "test"))
+    profiler = StreamingProfiler(engine)
+    profiler.update(streamed)
+    assert profiler.exact and engine.seed_cache("digest", profiler.profile("t.csv"))
+    return engine
+
+
+def test_seeded_profile_is_reused_for_the_same_column_types(tmp_path):
+    streamed = pd.DataFrame({"id": [1, 2, 3], "code": [10, 20, 20]})
+    engine = _seeded_engine(tmp_path, streamed)
+    engine.cache.put(engine._cache_key("digest"), dict(
+        engine.cache.get(engine._cache_key("digest")), keys={"primary_keys": ["marker"]}
+    ))
+    _, table_keys = engine.analyze_tables({"t.csv": streamed.copy()}, {"t.csv": "digest"})
+    assert table_keys["t.csv"]["primary_keys"] == ["marker"]
+
+
+def test_seeded_profile_is_not_reused_when_the_loader_parses_other_types(tmp_path):
+    engine = _seeded_engine(tmp_path, pd.DataFrame({"id": [1, 2, 3], "code": [10, 20, 20]}))
+    loaded = pd.DataFrame({"id": [1, 2, 3], "code": ["010", "20", "020"]})
+    profiles, _ = engine.analyze_tables({"t.csv": loaded}, {"t.csv": "digest"})
+    assert profiles["t.csv"]["columns"]["code"]["data_type"] == "string"
+    assert profiles["t.csv"]["columns"]["code"]["num_unique_values"] == 3
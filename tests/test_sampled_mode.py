@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+from core.core_data_engine import CoreDataEngine
+
+
+def test_sampled_mode_finds_composite_foreign_keys():
+    rng = np.random.default_rng(0)
+    lines = pd.DataFrame({
+        "order_id": np.repeat(np.arange(2000), 5),
+        "line_no": np.tile(np.arange(1, 6), 2000),
+        "qty": rng.integers(1, 9, 10000),
+    })
+    picked = rng.choice(len(lines), 6000)
+    shipments = pd.DataFrame({
+        "shipment_id": np.arange(6000),
+        "order_ref": lines["order_id"].to_numpy()[picked],
+        "line_ref": lines["line_no"].to_numpy()[picked],
+    })
+    full = {"lines.csv": lines, "shipments.csv": shipments}
+    samples = {name: df.sample(1500, random_state=1).reset_index(drop=True) for name, df in full.items()}
+
+    relationships, _, table_keys = CoreDataEngine().process_sampled(
+        samples, {name: len(df) for name, df in full.items()}, lambda table, columns: full[table][columns]
+    )
+    assert table_keys["lines.csv"]["composite_keys"] == [["order_id", "line_no"]]
+    composite = [r for r in relationships if "from_columns" in r]
+    assert [(r["from_columns"], r["to_columns"], r["confidence"]) for r in composite] == \
+        [(["order_ref", "line_ref"], ["order_id", "line_no"], 1.0)]
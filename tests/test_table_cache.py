@@ -0,0 +1,35 @@
+import threading
+import time
+import pandas as pd
+from services.file_handler import FileHandler
+from services.table_cache import TableCache
+
+
+def test_concurrent_misses_share_one_load_even_when_the_table_is_not_cached():
+    cache = TableCache(max_bytes=0)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.2)
+        return pd.DataFrame({"id": [1, 2, 3]})
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert [df["id"].tolist() for df in results] == [[1, 2, 3]] * 8
+    assert len(cache) == 0 and not cache._loading
+
+
+def test_file_metadata_caches_are_bounded(tmp_path):
+    handler = FileHandler(str(tmp_path), metadata_cache_size=2)
+    for i in range(4):
+        (tmp_path / f"t{i}.csv").write_text(f"id,name\n{i},a\n")
+        handler.content_hash(f"t{i}.csv")
+        handler.sniff_csv(f"t{i}.csv")
+    assert len(handler._hash_cache) == len(handler._dialect_cache) == 2
+    assert handler.content_hash("t3.csv") == handler._hash_cache[next(reversed(handler._hash_cache))]
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as tm
+from services.table_store import TableStore
+
+
+def _frame():
+    return pd.DataFrame({
+        "n": [1, 2, 3, 4],
+        "x": [0.5, np.nan, 2.0, 3.5],
+        "text": ["a", np.nan, "c", "a"],
+        "flag": pd.Series([True, np.nan, False, True], dtype=object),
+        "mixed": pd.Series([1, "b", 2.5, np.nan], dtype=object),
+        "nullable_int": pd.array([1, None, 3, 3], dtype="Int64"),
+        "nullable_bool": pd.array([True, None, False, True], dtype="boolean"),
+        "category": pd.Categorical(["x", "y", "x", None]),
+        "at": pd.to_datetime(["2024-01-05", None, "2024-03-01", "2024-03-01"]).tz_localize("Europe/Berlin"),
+    })
+
+
+def test_columns_read_back_with_their_dtypes_and_values(tmp_path):
+    store = TableStore(str(tmp_path))
+    df = _frame()
+    store.write("t.csv", df)
+    tm.assert_frame_equal(store.read("t.csv").copy(), df, check_categorical=False)
+    assert store.read("t.csv")["flag"].tolist()[0] is True
+
+
+def test_blocks_match_the_whole_table(tmp_path):
+    store = TableStore(str(tmp_path))
+    df = _frame()
+    store.write("t.csv", df)
+    blocks = list(store.read_blocks("t.csv", list(df.columns), 3))
+    assert [len(block) for block in blocks] == [3, 1]
+    for block in blocks:
+        tm.assert_frame_equal(block, df.loc[block.index], check_categorical=False)
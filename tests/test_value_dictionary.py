@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+from core.inclusion_index import InclusionIndex
+from core.value_dictionary import _split_domains
+
+
+def test_mixed_object_column_keeps_ints_next_to_integral_floats():
+    parts = _split_domains(pd.Series([1, 2, 3, 2.5, 4.0], dtype=object))
+    assert sorted(parts) == ["float", "int"]
+    assert np.array_equal(np.sort(parts["int"]), [1, 2, 3, 4])
+    assert np.array_equal(parts["float"], [2.5])
+
+
+def test_mixed_object_column_is_found_included_in_int_key():
+    index = InclusionIndex()
+    index.add_key("keys.csv", "id", pd.Series([1, 2, 3, 4]))
+    found = list(index.find_inclusions("refs.csv", "ref", pd.Series([1, 2, 3, 2.5, 4.0], dtype=object), threshold=0.7))
+    assert found == [("keys.csv", "id", 0.8)]
@@ -1,42 +1,237 @@
 from pyvis.network import Network
+import hashlib
 import json
+import logging
+import math
+import threading
+from collections import OrderedDict
+import networkx as nx
+from services.graph_updater import GraphUpdater
+from utils.metrics import metrics
+
+CLUSTER_PREFIX = "table::"
+
+logger = logging.getLogger(__name__)
+
 
 class GraphUtils:
-    def __init__(self):
+    """
+    Renders relationship models for vis.js.
+
+    Models with up to detail_max_nodes columns are drawn column by column;
+    larger ones as one cluster node per table with aggregated edges, whose
+    columns expand_table adds on demand. Node positions are precomputed
+    with networkx and cached per graph topology, and vis.js physics is
+    only on for graphs of up to physics_max_nodes nodes.
+    """
+
+    def __init__(self, detail_max_nodes=400, physics_max_nodes=150, layout_cache_size=16):
+        self.detail_max_nodes = detail_max_nodes
+        self.physics_max_nodes = physics_max_nodes
+        self.layout_cache_size = layout_cache_size
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
         self.default_options = {
             "physics": {"enabled": True},
             "interaction": {"hover": True, "selectConnectedEdges": True},
             "manipulation": {"enabled": False}
         }
 
+    def view_mode(self, relationships):
+        """"columns" or, for large models, "tables\""""
+        columns = {key for rel in relationships for key in GraphUpdater.node_keys(rel)}
+        return "tables" if len(columns) > self.detail_max_nodes else "columns"
+
+    @metrics.timed("graph_render")
     def create_interactive_graph(self, relationships):
-        net = Network(height="600px", width="100%", bgcolor="#222222", font_color="white")
+        # directed: an undirected pyvis Network drops a B->A edge when A->B exists
+        net = Network(height="600px", width="100%", bgcolor="#222222", font_color="white", directed=True)
 
-        seen_nodes = {}
+        # node ids are the "table:column" labels (or cluster ids) and edge
+        # ids the relationship ids, so deltas from /graph/changes address them
+        if self.view_mode(relationships) == "tables":
+            nodes, edges = self.table_items(relationships)
+        else:
+            nodes, edges = self.column_items(relationships)
+        positions = self.layout([node["id"] for node in nodes], [(edge["from"], edge["to"]) for edge in edges])
+        for item in nodes:
+            item = dict(item)
+            item["x"], item["y"] = positions[item["id"]]
+            net.add_node(item.pop("id"), **item)
+        for item in edges:
+            item = dict(item)
+            net.add_edge(item.pop("from"), item.pop("to"), **item)
+
+        net.set_options(json.dumps(self.options(len(nodes))))
+        return self._clean_html_for_embedding(net.generate_html())
 
-        def add_node(label):
-            if label not in seen_nodes:
-                node_id = len(seen_nodes)
-                net.add_node(node_id, label=label, title=label, color="#97C2FC")
-                seen_nodes[label] = node_id
-            return seen_nodes[label]
+    def options(self, num_nodes):
+        options = json.loads(json.dumps(self.default_options))
+        if num_nodes > self.physics_max_nodes:
+            # positions come from the server; skip vis.js' O(n^2) layout work
+            options["physics"] = {"enabled": False}
+            options["layout"] = {"improvedLayout": False}
+            options["edges"] = {"smooth": False}
+        return options
 
+    def column_items(self, relationships):
+        nodes = {}
+        edges = []
         for rel in relationships:
-            from_label = f"{rel['from_table']}:{rel['from_column']}"
-            to_label = f"{rel['to_table']}:{rel['to_column']}"
-            from_id = add_node(from_label)
-            to_id = add_node(to_label)
-
-            net.add_edge(
-                from_id,
-                to_id,
-                label=f"{rel['confidence']:.2f}",
-                title=f"FK: {from_label} → {to_label}",
-                width=rel['confidence'] * 5
-            )
-
-        net.set_options(json.dumps(self.default_options))
-        return self._clean_html_for_embedding(net.generate_html())
+            for table, column in GraphUpdater.node_keys(rel):
+                label = f"{table}:{column}"
+                if label not in nodes:
+                    nodes[label] = self.node_item(table, column)
+            edges.append(self.edge_item(rel))
+        return list(nodes.values()), edges
+
+    def table_items(self, relationships):
+        """One node per table, one edge per referencing table pair weighted by its relationships"""
+        columns = {}
+        pairs = {}
+        for rel in relationships:
+            for table, column in GraphUpdater.node_keys(rel):
+                columns.setdefault(table, set()).add(column)
+            pairs.setdefault((rel["from_table"], rel["to_table"]), []).append(rel)
+        nodes = [self.cluster_item(table, len(cols)) for table, cols in columns.items()]
+        edges = [self.aggregate_item(from_table, to_table, rels)
+                 for (from_table, to_table), rels in pairs.items() if from_table != to_table]
+        return nodes, edges
+
+    def node_item(self, table, column):
+        label = f"{table}:{column}"
+        return {"id": label, "label": label, "title": label, "color": "#97C2FC", "shape": "dot",
+                "font": {"color": "white"}, "table": table, "column": column}
+
+    def cluster_item(self, table, num_columns):
+        return {
+            "id": CLUSTER_PREFIX + table,
+            "label": table,
+            "title": f"{table}: {num_columns} related columns (double-click to expand)",
+            "color": "#F5B041",
+            "shape": "box",
+            "font": {"color": "black"},
+            "table": table,
+            "cluster": True
+        }
+
+    def edge_item(self, rel, from_node=None, to_node=None):
+        from_label = f"{rel['from_table']}:{rel['from_column']}"
+        to_label = f"{rel['to_table']}:{rel['to_column']}"
+        return {
+            "id": GraphUpdater.edge_id(rel),
+            "from": from_node or from_label,
+            "to": to_node or to_label,
+            "from_table": rel["from_table"],
+            "to_table": rel["to_table"],
+            "label": f"{rel['confidence']:.2f}",
+            "title": f"FK: {from_label} → {to_label}",
+            "width": rel['confidence'] * 5
+        }
+
+    def aggregate_item(self, from_table, to_table, rels):
+        return {
+            "id": f"{CLUSTER_PREFIX}{from_table}=>{to_table}",
+            "from": CLUSTER_PREFIX + from_table,
+            "to": CLUSTER_PREFIX + to_table,
+            "label": str(len(rels)),
+            "title": f"{len(rels)} relationship(s) {from_table} → {to_table}",
+            "width": 1 + 2 * math.log2(1 + sum(rel["confidence"] for rel in rels)),
+            "arrows": "to"
+        }
+
+    def layout(self, node_ids, pairs):
+        """{node id: (x, y)} in vis.js pixels; the same graph always gets the same layout"""
+        key = hashlib.sha1(json.dumps([sorted(node_ids), sorted(map(list, pairs))]).encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._layouts:
+                self._layouts.move_to_end(key)
+                return self._layouts[key]
+
+        with metrics.stage("graph_layout"):
+            graph = nx.Graph()
+            graph.add_nodes_from(sorted(node_ids))
+            graph.add_edges_from(pair for pair in pairs if pair[0] != pair[1])
+            try:
+                positions = nx.spring_layout(graph, seed=0, iterations=50)
+            except ModuleNotFoundError as e:
+                # networkx needs scipy (see requirements.txt) for 500+ nodes
+                if e.name != "scipy":
+                    raise
+                logger.warning("scipy is not installed; using a circular layout for %d nodes", len(node_ids))
+                metrics.count("graph_layout_fallbacks")
+                positions = nx.circular_layout(graph)
+            scale = 120 * math.sqrt(max(len(node_ids), 1))
+            positions = {node: (round(float(x) * scale), round(float(y) * scale)) for node, (x, y) in positions.items()}
+
+        with self._lock:
+            self._layouts[key] = positions
+            while len(self._layouts) > self.layout_cache_size:
+                self._layouts.popitem(last=False)
+        return positions
+
+    def expand_table(self, relationships, table, expanded=()):
+        """
+        vis.js changes replacing a table's cluster node by its column nodes.
+
+        expanded: tables already shown as columns. Relationships of the
+        table's columns are drawn to the other table's column nodes if it is
+        expanded, else to its cluster node; the aggregated edges they
+        replace are removed. Columns are placed in a ring around the
+        cluster's position.
+        """
+        expanded = set(expanded) - {table}
+        nodes, edges = self.table_items(relationships)
+        center = self.layout([node["id"] for node in nodes], [(edge["from"], edge["to"]) for edge in edges]) \
+            .get(CLUSTER_PREFIX + table, (0, 0))
+
+        def endpoint(other_table, column):
+            if other_table == table or other_table in expanded:
+                return f"{other_table}:{column}"
+            return CLUSTER_PREFIX + other_table
+
+        columns = {}
+        changes = {"nodes": {"add": [], "remove": [CLUSTER_PREFIX + table]},
+                   "edges": {"add": [], "update": [], "remove": []}}
+        for rel in relationships:
+            if table not in (rel["from_table"], rel["to_table"]):
+                continue
+            for rel_table, column in GraphUpdater.node_keys(rel):
+                if rel_table == table:
+                    columns.setdefault(column, None)
+            item = self.edge_item(rel, endpoint(rel["from_table"], rel["from_column"]),
+                                  endpoint(rel["to_table"], rel["to_column"]))
+            other = rel["to_table"] if rel["from_table"] == table else rel["from_table"]
+            # edges to an expanded table exist already, drawn to this cluster
+            changes["edges"]["update" if other in expanded else "add"].append(item)
+
+        radius = 40 + 12 * len(columns)
+        for i, column in enumerate(columns):
+            item = self.node_item(table, column)
+            angle = 2 * math.pi * i / max(len(columns), 1)
+            item["x"] = round(center[0] + radius * math.cos(angle))
+            item["y"] = round(center[1] + radius * math.sin(angle))
+            changes["nodes"]["add"].append(item)
+        changes["edges"]["remove"] = [
+            edge["id"] for edge in edges
+            if CLUSTER_PREFIX + table in (edge["from"], edge["to"])
+        ]
+        return changes
+
+    def vis_changes(self, changes):
+        """vis.js DataSet items for the changes returned by GraphUpdater.apply_changes"""
+        return {
+            "nodes": {
+                "add": [self.node_item(table, column) for table, column in changes["nodes"]["add"]],
+                "remove": [f"{table}:{column}" for table, column in changes["nodes"]["remove"]]
+            },
+            "edges": {
+                "add": [self.edge_item(rel) for rel in changes["edges"]["add"]],
+                "update": [self.edge_item(rel) for rel in changes["edges"]["update"]],
+                "remove": changes["edges"]["remove"]
+            },
+            "counts": changes["counts"]
+        }
 
     def _clean_html_for_embedding(self, html):
         start = html.find('<div id="mynetwork"')
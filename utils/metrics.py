@@ -0,0 +1,221 @@
+import contextvars
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    from pyinstrument import Profiler as _PyinstrumentProfiler
+except ImportError:
+    _PyinstrumentProfiler = None
+
+_current_run = contextvars.ContextVar('dme_current_run', default=None)
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where unsupported"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class AnalysisRun:
+    """Stage timings and counters of one analysis (e.g. one upload)"""
+
+    def __init__(self, name):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.started_at = time.time()
+        self.seconds = None
+        self.stages = {}
+        self.counters = {}
+        self.max_rss_bytes = current_rss_bytes()
+        self.profile_report = None
+
+    def sample_rss(self):
+        rss = current_rss_bytes()
+        if rss is not None and (self.max_rss_bytes is None or rss > self.max_rss_bytes):
+            self.max_rss_bytes = rss
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'seconds': self.seconds,
+            'stages': {k: round(v, 6) for k, v in self.stages.items()},
+            'counters': dict(self.counters),
+            'max_rss_bytes': self.max_rss_bytes,
+            'has_profile': self.profile_report is not None
+        }
+
+
+class MetricsRegistry:
+    """
+    Process-wide registry of pipeline timings and counters.
+
+    Stages and counters are recorded into the registry totals and, when
+    inside analysis_run(), into that run as well. render_prometheus()
+    produces the text exposition format served by /metrics.
+    """
+
+    def __init__(self, keep_runs=20):
+        self._lock = threading.Lock()
+        self.stage_seconds = {}
+        self.stage_calls = {}
+        self.counters = {}
+        self.runs = deque(maxlen=keep_runs)
+        self.runs_total = 0
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + elapsed
+                self.stage_calls[name] = self.stage_calls.get(name, 0) + 1
+            run = _current_run.get()
+            if run is not None:
+                run.stages[name] = run.stages.get(name, 0.0) + elapsed
+                run.sample_rss()
+
+    def timed(self, name):
+        """Decorator form of stage()"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+        run = _current_run.get()
+        if run is not None:
+            run.counters[name] = run.counters.get(name, 0) + amount
+
+    @contextmanager
+    def analysis_run(self, name, profile=None):
+        """
+        Collect everything recorded in this thread into one AnalysisRun.
+
+        profile: None, 'cprofile' or 'pyinstrument' (if installed) to also
+        capture a profiler report of the run.
+        """
+        run = AnalysisRun(name)
+        token = _current_run.set(run)
+        profiler = self._start_profiler(profile)
+        start = time.perf_counter()
+        try:
+            yield run
+        finally:
+            run.seconds = round(time.perf_counter() - start, 6)
+            run.sample_rss()
+            if profiler is not None:
+                run.profile_report = self._stop_profiler(profiler)
+            _current_run.reset(token)
+            with self._lock:
+                self.runs.append(run)
+                self.runs_total += 1
+
+    def _start_profiler(self, mode):
+        if mode == 'pyinstrument' and _PyinstrumentProfiler is not None:
+            profiler = _PyinstrumentProfiler()
+        elif mode in ('cprofile', 'pyinstrument'):
+            profiler = cProfile.Profile()
+        else:
+            return None
+        try:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.enable()
+            else:
+                profiler.start()
+        except ValueError:
+            # another profiler is already active in this process
+            return None
+        return profiler
+
+    def _stop_profiler(self, profiler):
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(40)
+            return out.getvalue()
+        profiler.stop()
+        return profiler.output_text(unicode=True)
+
+    def get_run(self, run_id):
+        with self._lock:
+            for run in self.runs:
+                if run.id == run_id:
+                    return run
+        return None
+
+    def recent_runs(self):
+        with self._lock:
+            return [run.to_dict() for run in reversed(self.runs)]
+
+    def render_prometheus(self):
+        with self._lock:
+            stage_seconds = dict(self.stage_seconds)
+            stage_calls = dict(self.stage_calls)
+            counters = dict(self.counters)
+            runs_total = self.runs_total
+            last_run = self.runs[-1] if self.runs else None
+
+        lines = [
+            '# HELP dme_stage_seconds_total Time spent in each pipeline stage.',
+            '# TYPE dme_stage_seconds_total counter'
+        ]
+        lines += [f'dme_stage_seconds_total{{stage="{k}"}} {v:.6f}' for k, v in sorted(stage_seconds.items())]
+        lines += [
+            '# HELP dme_stage_calls_total Number of times each pipeline stage ran.',
+            '# TYPE dme_stage_calls_total counter'
+        ]
+        lines += [f'dme_stage_calls_total{{stage="{k}"}} {v}' for k, v in sorted(stage_calls.items())]
+        for name, value in sorted(counters.items()):
+            lines += [f'# TYPE dme_{name}_total counter', f'dme_{name}_total {value}']
+        lines += ['# TYPE dme_analysis_runs_total counter', f'dme_analysis_runs_total {runs_total}']
+        if last_run is not None:
+            lines += ['# HELP dme_last_run_stage_seconds Stage timings of the most recent analysis run.',
+                      '# TYPE dme_last_run_stage_seconds gauge']
+            lines += [f'dme_last_run_stage_seconds{{stage="{k}"}} {v:.6f}' for k, v in sorted(last_run.stages.items())]
+            if last_run.max_rss_bytes is not None:
+                lines += ['# TYPE dme_last_run_max_rss_bytes gauge', f'dme_last_run_max_rss_bytes {last_run.max_rss_bytes}']
+        rss = current_rss_bytes()
+        if rss is not None:
+            lines += ['# TYPE dme_process_rss_bytes gauge', f'dme_process_rss_bytes {rss}']
+        peak = peak_rss_bytes()
+        if peak is not None:
+            lines += ['# TYPE dme_process_peak_rss_bytes gauge', f'dme_process_peak_rss_bytes {peak}']
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()